@@ -25,27 +25,6 @@ IS_PROD = ENV == "production"
 BASE_DIR = dirname(abspath(__file__))
 FRONTEND_DIR = join(BASE_DIR, '..', 'frontend')
 
-# ──────────────────────────────────────────────────────────────────────────────
-# ⚙️ Inicializar Flask App
-# ──────────────────────────────────────────────────────────────────────────────
-app = Flask(
-    __name__,
-    static_folder=FRONTEND_DIR,   # sirve /frontend como estático
-    static_url_path=''            # raíz
-)
-
-# 🔐 Clave de sesión
-app.secret_key = os.environ.get('SECRET_KEY', 'captura-lse-ug')
-
-# 🍪 Cookies de sesión (seguras en prod, compatibilidad en local)
-app.config.update(
-    SESSION_COOKIE_SAMESITE="None" if IS_PROD else "Lax",
-    SESSION_COOKIE_SECURE=IS_PROD
-)
-
-# ✅ Cloud Run / proxies: respeta X-Forwarded-* (protocolo/host/ip)
-app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
-
 # ──────────────────────────────────────────────────────────────────────────────
 # 🌐 CORS
 # ──────────────────────────────────────────────────────────────────────────────
@@ -77,66 +56,101 @@ def _get_allowed_origins():
 
 ALLOWED_ORIGINS = _get_allowed_origins()
 
-CORS(
-    app,
-    resources={r"/*": {"origins": ALLOWED_ORIGINS}},
-    supports_credentials=True,
-    methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
-    expose_headers=["Content-Type", "Authorization"],
-    max_age=86400
-)
-
-# Añade headers CORS a *todas* las respuestas (incluye redirects/errores)
-@app.after_request
-def add_cors_headers(resp):
-    origin = request.headers.get("Origin")
-    if origin and origin in ALLOWED_ORIGINS:
-        resp.headers.setdefault("Access-Control-Allow-Origin", origin)
-        resp.headers.setdefault("Vary", "Origin")
-        resp.headers.setdefault("Access-Control-Allow-Credentials", "true")
-        resp.headers.setdefault("Access-Control-Allow-Methods", "GET,POST,PUT,PATCH,DELETE,OPTIONS")
-        resp.headers.setdefault("Access-Control-Allow-Headers", "Content-Type, Authorization, X-Requested-With")
-    return resp
-
-# Preflight genérico (si algún blueprint no define OPTIONS)
-@app.route("/<path:anypath>", methods=["OPTIONS"])
-def cors_preflight(anypath):
-    return ("", 204)
-
-# ──────────────────────────────────────────────────────────────────────────────
-# 🔁 Registrar rutas de todos los blueprints
-# ──────────────────────────────────────────────────────────────────────────────
-from routes import registrar_rutas
-registrar_rutas(app)
-
-# ──────────────────────────────────────────────────────────────────────────────
-# 🌐 Rutas de vistas estáticas (login / sistema)
-# ──────────────────────────────────────────────────────────────────────────────
-@app.route('/')
-def login_view():
-    return send_from_directory(FRONTEND_DIR, 'login.html')
-
-@app.route('/sistema_v2.html')
-def sistema_view():
-    if 'usuario' not in session:
-        return redirect(url_for('login_view'))
-    return send_from_directory(FRONTEND_DIR, 'sistema_v2.html')
-
-# Servir recursos estáticos del frontend
-@app.route('/<path:archivo>')
-def servir_archivos(archivo):
-    if archivo.startswith(('css/', 'js/', 'img/', 'assets/', 'favicon')):
-        return send_from_directory(FRONTEND_DIR, archivo)
-    # Fallback a login
-    return send_from_directory(FRONTEND_DIR, 'login.html')
-
-# ──────────────────────────────────────────────────────────────────────────────
-# 🩺 Healthcheck (útil para Cloud Run)
 # ──────────────────────────────────────────────────────────────────────────────
-@app.route('/health', methods=['GET'])
-def health():
-    return {"ok": True}, 200
+# 🏭 Fábrica de la app
+# ──────────────────────────────────────────────────────────────────────────────
+def create_app(roles=None):
+    """
+    Crea la app Flask con los blueprints de `roles` ("api", "video"; por defecto
+    APP_ROLES o ambos). Ver routes/__init__.py.
+    """
+    app = Flask(
+        __name__,
+        static_folder=FRONTEND_DIR,   # sirve /frontend como estático
+        static_url_path=''            # raíz
+    )
+
+    # 🔐 Clave de sesión
+    app.secret_key = os.environ.get('SECRET_KEY', 'captura-lse-ug')
+
+    # 🍪 Cookies de sesión (seguras en prod, compatibilidad en local)
+    app.config.update(
+        SESSION_COOKIE_SAMESITE="None" if IS_PROD else "Lax",
+        SESSION_COOKIE_SECURE=IS_PROD
+    )
+
+    # ✅ Cloud Run / proxies: respeta X-Forwarded-* (protocolo/host/ip)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+
+    # 🌐 CORS
+    app.config["ALLOWED_ORIGINS"] = ALLOWED_ORIGINS  # lo usa el canal WebSocket (no pasa por CORS)
+
+    CORS(
+        app,
+        resources={r"/*": {"origins": ALLOWED_ORIGINS}},
+        supports_credentials=True,
+        methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+        expose_headers=["Content-Type", "Authorization"],
+        max_age=86400
+    )
+
+    # Añade headers CORS a *todas* las respuestas (incluye redirects/errores)
+    @app.after_request
+    def add_cors_headers(resp):
+        origin = request.headers.get("Origin")
+        if origin and origin in ALLOWED_ORIGINS:
+            resp.headers.setdefault("Access-Control-Allow-Origin", origin)
+            resp.headers.setdefault("Vary", "Origin")
+            resp.headers.setdefault("Access-Control-Allow-Credentials", "true")
+            resp.headers.setdefault("Access-Control-Allow-Methods", "GET,POST,PUT,PATCH,DELETE,OPTIONS")
+            resp.headers.setdefault("Access-Control-Allow-Headers", "Content-Type, Authorization, X-Requested-With")
+        return resp
+
+    # Preflight genérico (si algún blueprint no define OPTIONS)
+    @app.route("/<path:anypath>", methods=["OPTIONS"])
+    def cors_preflight(anypath):
+        return ("", 204)
+
+    # 🔁 Registrar blueprints de los roles pedidos
+    from routes import registrar_rutas
+    from bd.pool import estadisticas as estadisticas_pool
+    from procesamiento.detectores import detectores
+    from procesamiento.calidad import gobernador
+    from web.admision import control as control_admision
+    registrar_rutas(app, roles)
+
+    # 🌐 Rutas de vistas estáticas (login / sistema)
+    @app.route('/')
+    def login_view():
+        return send_from_directory(FRONTEND_DIR, 'login.html')
+
+    @app.route('/sistema_v2.html')
+    def sistema_view():
+        if 'usuario' not in session:
+            return redirect(url_for('login_view'))
+        return send_from_directory(FRONTEND_DIR, 'sistema_v2.html')
+
+    # Servir recursos estáticos del frontend
+    @app.route('/<path:archivo>')
+    def servir_archivos(archivo):
+        if archivo.startswith(('css/', 'js/', 'img/', 'assets/', 'favicon')):
+            return send_from_directory(FRONTEND_DIR, archivo)
+        # Fallback a login
+        return send_from_directory(FRONTEND_DIR, 'login.html')
+
+    # 🩺 Healthcheck (útil para Cloud Run)
+    @app.route('/health', methods=['GET'])
+    def health():
+        return {"ok": True, "roles": list(app.config["ROLES"]), "arranque": app.config["ARRANQUE"],
+                "pool_bd": estadisticas_pool(), "detectores": detectores.estadisticas(),
+                "calidad": gobernador.estadisticas(), "admision": control_admision.estadisticas()}, 200
+
+    return app
+
+
+# gunicorn: app:app (roles desde APP_ROLES)
+app = create_app()
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 🚀 Ejecutar
@@ -0,0 +1,190 @@
+# backend/bd/buffer_frames.py
+"""
+Buffer write-behind para frames sueltos (POST /api/guardar_frame).
+
+La ruta valida y encola; un hilo del proceso junta los frames de todas las
+sesiones de captura y los escribe cada FRAMES_BUFFER_MS o al llegar a
+FRAMES_BUFFER_LOTE frames, con un único INSERT multi-fila por transacción.
+
+- Memoria acotada: con FRAMES_BUFFER_MAX frames pendientes `encolar()` devuelve
+  False y la ruta desvía el frame al spool (o 503 + Retry-After si tampoco puede).
+- Si la BD falla por conexión/tiempo el lote va al spool en disco (bd/spool.py)
+  y, mientras la BD siga degradada, los lotes siguientes también. Un lote con
+  alguna fila imposible (IntegrityError / DataError: secuencia borrada, valor
+  fuera de rango) se reescribe fila a fila y solo se descartan esas filas;
+  otros errores devuelven el lote a la cola y se reintenta con espera creciente.
+- Reenvíos: las claves (secuencia_id, num_frame) recientes se recuerdan en memoria
+  para responder "duplicado" sin tocar la BD. Es una caché por proceso: un reenvío
+  que cae en otro worker no se detecta aquí. La garantía real es el índice único
+  (ON CONFLICT DO NOTHING, ver bd/migraciones.py), que cubre ambos casos.
+- `cerrar()` vacía el buffer; se llama desde `worker_exit` de gunicorn y atexit.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import psycopg2
+
+from bd.conexion import get_connection
+from bd.esquema import incrementar_versiones
+from bd.frames import insertar_frames_lote
+from bd.spool import spool_frames, ERRORES_BD
+
+FLUSH_MS = int(os.environ.get("FRAMES_BUFFER_MS", "200") or 200)
+LOTE = int(os.environ.get("FRAMES_BUFFER_LOTE", "500") or 500)
+MAXIMO = int(os.environ.get("FRAMES_BUFFER_MAX", "20000") or 20000)
+HABILITADO = (os.environ.get("FRAMES_WRITE_BEHIND", "1") or "1").lower() not in ("0", "false", "no")
+RECIENTES_MAX = 50000  # claves (secuencia_id, num_frame) recordadas para detectar reenvíos
+
+ENCOLADO, DUPLICADO, LLENO = "encolado", "duplicado", "lleno"
+
+
+class BufferFrames:
+    def __init__(self, flush_ms: int = FLUSH_MS, lote: int = LOTE, maximo: int = MAXIMO):
+        self.flush_s = max(1, flush_ms) / 1000.0
+        self.lote = max(1, lote)
+        self.maximo = max(self.lote, maximo)
+        self._cola = deque()
+        self._cond = threading.Condition()
+        self._hilo = None
+        self._cerrando = False
+        self._conn = None
+        self._recientes = OrderedDict()
+        self.stats = {"encolados": 0, "escritos": 0, "lotes": 0, "rechazados": 0,
+                      "duplicados": 0, "descartados": 0, "errores": 0}
+
+    # ---------- API ----------
+    def encolar(self, secuencia_id: int, num_frame: int, landmarks) -> str:
+        """
+        Encola un frame ya validado. Devuelve ENCOLADO, DUPLICADO (ya visto en
+        este proceso, no se vuelve a escribir) o LLENO (buffer lleno o cerrando).
+        """
+        clave = (secuencia_id, num_frame)
+        with self._cond:
+            if clave in self._recientes:
+                self._recientes.move_to_end(clave)
+                self.stats["duplicados"] += 1
+                return DUPLICADO
+            if self._cerrando or len(self._cola) >= self.maximo:
+                self.stats["rechazados"] += 1
+                return LLENO
+            self._recientes[clave] = None
+            if len(self._recientes) > RECIENTES_MAX:
+                self._recientes.popitem(last=False)
+            self._cola.append((secuencia_id, num_frame, landmarks))
+            self.stats["encolados"] += 1
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="buffer-frames", daemon=True)
+                self._hilo.start()
+            if len(self._cola) >= self.lote:
+                self._cond.notify()
+            return ENCOLADO
+
+    def pendientes(self) -> int:
+        return len(self._cola)
+
+    def cerrar(self, timeout: float = 15.0):
+        """Deja de aceptar frames y espera a que el hilo escriba lo pendiente."""
+        with self._cond:
+            self._cerrando = True
+            self._cond.notify()
+            hilo = self._hilo
+        if hilo is not None:
+            hilo.join(timeout)
+
+    # ---------- hilo de escritura ----------
+    def _bucle(self):
+        fallos = 0
+        while True:
+            with self._cond:
+                if not self._cola and self._cerrando:
+                    break
+                if len(self._cola) < self.lote and not self._cerrando:
+                    self._cond.wait(self.flush_s)
+                n = min(len(self._cola), self.lote * 4)
+                lote = [self._cola.popleft() for _ in range(n)]
+            if not lote:
+                continue
+            try:
+                if spool_frames.degradada():
+                    spool_frames.escribir(lote)
+                else:
+                    self._escribir(lote)
+                fallos = 0
+            except ERRORES_BD as e:
+                self._descartar_conexion()
+                spool_frames.marcar_degradada()
+                try:
+                    spool_frames.escribir(lote)
+                    print(f"⚠️ buffer_frames: BD degradada ({e}); {len(lote)} frames al spool")
+                except Exception as e2:
+                    self.stats["errores"] += 1
+                    with self._cond:
+                        self._cola.extendleft(reversed(lote))
+                    print(f"❌ buffer_frames: tampoco se pudo escribir al spool: {e2}")
+                    time.sleep(1.0)
+            except Exception as e:
+                fallos += 1
+                self.stats["errores"] += 1
+                self._descartar_conexion()
+                with self._cond:
+                    self._cola.extendleft(reversed(lote))
+                print(f"❌ buffer_frames: fallo al escribir {len(lote)} frames ({e}); reintento")
+                if self._cerrando and fallos >= 3:
+                    print(f"❌ buffer_frames: se pierden {len(self._cola)} frames al cerrar")
+                    break
+                time.sleep(min(5.0, 0.2 * (2 ** fallos)))
+        self._descartar_conexion()
+
+    def _conexion(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = get_connection()
+        return self._conn
+
+    def _descartar_conexion(self):
+        try:
+            if self._conn is not None:
+                self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _escribir(self, lote):
+        conn = self._conexion()
+        try:
+            with conn.cursor() as cur:
+                insertadas = insertar_frames_lote(cur, lote)
+                incrementar_versiones(cur, {sid for sid, _, _ in lote})
+            conn.commit()
+            self.stats["escritos"] += insertadas
+            self.stats["duplicados"] += len(lote) - insertadas
+            self.stats["lotes"] += 1
+        except (psycopg2.IntegrityError, psycopg2.DataError):
+            # Alguna fila imposible (secuencia inexistente, valor que la BD no admite):
+            # fila a fila para no bloquear el resto; reencolarla la reintentaría para siempre
+            conn.rollback()
+            self._escribir_por_fila(conn, lote)
+
+    def _escribir_por_fila(self, conn, lote):
+        buenas = set()
+        with conn.cursor() as cur:
+            for fila in lote:
+                cur.execute("SAVEPOINT fila")
+                try:
+                    n = insertar_frames_lote(cur, [fila])
+                    cur.execute("RELEASE SAVEPOINT fila")
+                    buenas.add(fila[0])
+                    self.stats["escritos"] += n
+                except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT fila")
+                    self.stats["descartados"] += 1
+                    print(f"❌ buffer_frames: frame descartado (secuencia {fila[0]}, frame {fila[1]}): {e}")
+            incrementar_versiones(cur, buenas)
+        conn.commit()
+        self.stats["lotes"] += 1
+
+
+buffer_frames = BufferFrames()
+atexit.register(buffer_frames.cerrar)
@@ -0,0 +1,198 @@
+# backend/bd/checkpoints.py
+"""
+Checkpoints de las extracciones de video y limpieza de secuencias huérfanas.
+
+Las rutas de subida guardan los frames por lotes (una transacción por lote) y,
+tras cada lote confirmado, avanzan su fila en `extracciones_checkpoint`:
+último frame procesado, su t_s y frames guardados. La fila se identifica por
+(hash del archivo, ruta, clave de los parámetros pedidos) y guarda además los
+parámetros *efectivos* de la extracción (calidad, resolución, muestreo, recorte).
+
+Si la subida falla, se corta por tiempo o el worker muere, reintentar el mismo
+archivo con los mismos parámetros reutiliza la secuencia y extrae solo desde
+el frame siguiente al checkpoint, con los mismos ajustes efectivos (los frames
+ya guardados y los nuevos son homogéneos). (secuencia_id, num_frame) es único,
+así que repetir un lote que no llegó a avanzar el checkpoint no duplica nada.
+Al terminar bien el checkpoint se borra.
+
+`limpiar_huerfanas()` (hilo cada LIMPIEZA_INTERVALO_S) borra los checkpoints
+caducados y las secuencias vacías, sin checkpoint y de más de HUERFANAS_H horas
+que creó una subida (`secuencias.subida`), p.ej. de subidas o lotes cancelados
+o de workers muertos a mitad. Las creadas desde la captura o la API (y las
+anteriores a la columna) no se tocan nunca. Tampoco las que aún tienen frames
+en el spool de este host; si llegan frames de una secuencia ya borrada (spool
+de otro host), el drenado los deja en cuarentena en vez de perderlos
+(bd/spool.py).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from bd.conexion import get_connection
+
+REANUDAR = os.environ.get("VIDEO_REANUDAR", "1") != "0"
+TTL_H = float(os.environ.get("CHECKPOINT_TTL_H", "24") or 24)
+HUERFANAS_H = float(os.environ.get("SECUENCIAS_HUERFANAS_H", "6") or 6)
+LIMPIEZA_INTERVALO_S = float(os.environ.get("LIMPIEZA_INTERVALO_S", "3600") or 3600)
+
+_BLOQUE = 1024 * 1024
+
+
+def hash_archivo(ruta: str) -> str:
+    """sha256 del archivo subido (identifica el mismo video entre reintentos)."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as fh:
+        for bloque in iter(lambda: fh.read(_BLOQUE), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def clave_parametros(pedido: dict) -> str:
+    """Huella de los parámetros pedidos en el form (no de los efectivos)."""
+    return hashlib.sha1(json.dumps(pedido, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _fila(r, claves):
+    return dict(r) if isinstance(r, dict) else dict(zip(claves, r))
+
+
+def buscar(hash_origen: str, ruta: str, clave: str):
+    """Checkpoint vigente de una extracción interrumpida o None."""
+    claves = ("secuencia_id", "parametros", "ultimo_frame", "ultimo_t_s", "frames_guardados")
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.secuencia_id, c.parametros, c.ultimo_frame, c.ultimo_t_s, c.frames_guardados
+                  FROM extracciones_checkpoint c
+                  JOIN secuencias s ON s.id = c.secuencia_id
+                 WHERE c.hash_origen = %s AND c.ruta = %s AND c.clave = %s
+                   AND c.actualizado > NOW() - make_interval(secs => %s)
+            """, (hash_origen, ruta, clave, TTL_H * 3600))
+            r = cur.fetchone()
+        return _fila(r, claves) if r else None
+    except Exception as e:
+        print(f"⚠️ checkpoint: no se pudo consultar ({ruta}): {e}")
+        return None
+
+
+def crear(hash_origen: str, ruta: str, clave: str, secuencia_id: int, parametros: dict):
+    """Registra una extracción nueva con sus parámetros efectivos (un fallo solo impide reanudarla)."""
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO extracciones_checkpoint (hash_origen, ruta, clave, secuencia_id, parametros)
+                VALUES (%s, %s, %s, %s, %s::jsonb)
+                ON CONFLICT (hash_origen, ruta, clave) DO UPDATE
+                   SET secuencia_id = EXCLUDED.secuencia_id, parametros = EXCLUDED.parametros,
+                       ultimo_frame = NULL, ultimo_t_s = NULL, frames_guardados = 0, actualizado = NOW()
+            """, (hash_origen, ruta, clave, secuencia_id, json.dumps(parametros)))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ checkpoint: no se pudo registrar la secuencia {secuencia_id}: {e}")
+
+
+def rango(recorte, checkpoint):
+    """Intervalo de frames a extraer: el del recorte, empezando tras el último frame del checkpoint."""
+    if not checkpoint or checkpoint.get("ultimo_frame") is None:
+        return recorte
+    recorte = recorte or {}
+    return {"inicio_frame": max(int(checkpoint["ultimo_frame"]) + 1, recorte.get("inicio_frame") or 0),
+            "fin_frame": recorte.get("fin_frame")}
+
+
+def avanzar(secuencia_id: int, ultimo_frame: int, ultimo_t_s: float, frames_guardados: int):
+    """Avanza el checkpoint tras un lote confirmado (un fallo solo retrasa el punto de reanudación)."""
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE extracciones_checkpoint
+                   SET ultimo_frame = %s, ultimo_t_s = %s, frames_guardados = %s, actualizado = NOW()
+                 WHERE secuencia_id = %s
+            """, (int(ultimo_frame), float(ultimo_t_s), int(frames_guardados), secuencia_id))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ checkpoint: no se pudo avanzar la secuencia {secuencia_id}: {e}")
+
+
+def terminar(secuencia_id: int):
+    """Extracción completa: ya no hay nada que reanudar."""
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM extracciones_checkpoint WHERE secuencia_id = %s", (secuencia_id,))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ checkpoint: no se pudo cerrar la secuencia {secuencia_id}: {e}")
+
+
+def abandonar(secuencia_id: int, frames_guardados: int) -> bool:
+    """
+    Tras un fallo: sin frames guardados se borra la secuencia (y su checkpoint);
+    con frames se conserva para reanudar. Devuelve True si queda reanudable.
+    """
+    if frames_guardados:
+        return True
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM extracciones_checkpoint WHERE secuencia_id = %s", (secuencia_id,))
+            cur.execute("DELETE FROM frames WHERE secuencia_id = %s", (secuencia_id,))
+            cur.execute("DELETE FROM secuencias WHERE id = %s", (secuencia_id,))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ checkpoint: no se pudo borrar la secuencia vacía {secuencia_id}: {e}")
+    return False
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Limpieza
+# ──────────────────────────────────────────────────────────────────────────────
+def limpiar_huerfanas(edad_h: float = HUERFANAS_H) -> dict:
+    """
+    Borra checkpoints caducados y las secuencias vacías creadas por una subida,
+    sin checkpoint, de más de `edad_h` horas y sin frames pendientes en el spool.
+    """
+    from bd.spool import spool_frames
+
+    # Sus frames pueden estar aún en el spool (en cola o en cuarentena)
+    en_spool = sorted(spool_frames.secuencias_pendientes())
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM extracciones_checkpoint WHERE actualizado < NOW() - make_interval(secs => %s)",
+                    (TTL_H * 3600,))
+        caducados = cur.rowcount
+        cur.execute("""
+            DELETE FROM secuencias s
+             WHERE s.subida IS NOT NULL
+               AND s.fecha < NOW() - make_interval(secs => %s)
+               AND s.id <> ALL(%s)
+               AND NOT EXISTS (SELECT 1 FROM frames f WHERE f.secuencia_id = s.id)
+               AND NOT EXISTS (SELECT 1 FROM extracciones_checkpoint c WHERE c.secuencia_id = s.id)
+            RETURNING s.id
+        """, (edad_h * 3600, en_spool))
+        borradas = len(cur.fetchall())
+        conn.commit()
+    if caducados or borradas:
+        print(f"🧹 limpieza: {borradas} secuencias vacías y {caducados} checkpoints caducados borrados")
+    return {"secuencias_borradas": borradas, "checkpoints_caducados": caducados}
+
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def iniciar_limpieza():
+    """Arranca (una vez por proceso) el hilo que llama a limpiar_huerfanas periódicamente."""
+    global _hilo
+    with _hilo_lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="limpieza-secuencias", daemon=True)
+            _hilo.start()
+
+
+def _bucle():
+    while True:
+        time.sleep(LIMPIEZA_INTERVALO_S)
+        try:
+            limpiar_huerfanas()
+        except Exception as e:
+            print("❌ limpieza: falló la pasada:", e)
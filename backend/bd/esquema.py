@@ -0,0 +1,163 @@
+# backend/bd/esquema.py
+"""
+Ajustes de esquema idempotentes que necesitan las rutas nuevas.
+
+Se ejecutan una sola vez por proceso (la primera vez que alguna ruta los pide)
+con sentencias `IF NOT EXISTS`, así que son seguros en una BD ya migrada.
+Solo cambios baratos (columnas, índices pequeños); lo que recorre tablas
+grandes va en bd/migraciones.py y se lanza en el despliegue.
+"""
+import threading
+import time
+
+from bd.conexion import get_connection
+from bd.pool import ejecutar, invalidar_preparadas
+
+_DDL = [
+    # Versión por secuencia: sube con cada frame insertado o cambio de metadatos.
+    # Se usa para ETags fuertes en las rutas de lectura.
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1",
+    # Feed de cambios: id monótono global que se reasigna en cada cambio de la secuencia.
+    "CREATE SEQUENCE IF NOT EXISTS secuencias_cambio_seq",
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS cambio_id BIGINT",
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS ultimo_cambio TEXT",
+    "ALTER TABLE secuencias ALTER COLUMN cambio_id SET DEFAULT nextval('secuencias_cambio_seq')",
+    "ALTER TABLE secuencias ALTER COLUMN ultimo_cambio SET DEFAULT 'creada'",
+    "CREATE INDEX IF NOT EXISTS idx_secuencias_cambio_id ON secuencias (cambio_id)",
+    # Transacción que hizo el cambio: el feed solo sirve cambios de transacciones
+    # ya terminadas (ver bd/feed.py); cursor (cambio_xid, id)
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS cambio_xid BIGINT",
+    "ALTER TABLE secuencias ALTER COLUMN cambio_xid SET DEFAULT txid_current()",
+    "CREATE INDEX IF NOT EXISTS idx_secuencias_cambio_xid ON secuencias (cambio_xid, id)",
+    # Modalidades por defecto de la extracción multimodal ("manos", "pose,manos", ...);
+    # NULL = preset por slug (procesamiento/modalidades.py)
+    "ALTER TABLE categorias ADD COLUMN IF NOT EXISTS modalidades TEXT",
+    # Subconjunto de la malla facial guardado en los frames: {"subconjunto", "indices"}
+    # (NULL = malla completa; ver procesamiento/cara.py)
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS cara_indices JSONB",
+    # Ajustes efectivos de la extracción de video (nivel de calidad, resolución, fps...)
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS extraccion JSONB",
+    # Landmarks crudos (coordenadas de imagen) y versión de normalización de
+    # `landmarks`; permiten renormalizar sin volver a extraer (procesamiento/renormalizacion.py)
+    "ALTER TABLE frames ADD COLUMN IF NOT EXISTS crudos JSONB",
+    "ALTER TABLE frames ADD COLUMN IF NOT EXISTS norm_version SMALLINT",
+    # Ruta de subida que creó la secuencia (subir_video, subir_video_multimodal,
+    # subir_lote); NULL = creada desde la captura / API. La limpieza de secuencias
+    # huérfanas (bd/checkpoints.py) solo borra las creadas por una subida
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS subida TEXT",
+    # Checkpoints de extracción de video reanudable (bd/checkpoints.py)
+    """
+    CREATE TABLE IF NOT EXISTS extracciones_checkpoint (
+        hash_origen TEXT NOT NULL,
+        ruta TEXT NOT NULL,
+        clave TEXT NOT NULL,
+        secuencia_id INTEGER NOT NULL REFERENCES secuencias(id) ON DELETE CASCADE,
+        parametros JSONB,
+        ultimo_frame INTEGER,
+        ultimo_t_s DOUBLE PRECISION,
+        frames_guardados INTEGER NOT NULL DEFAULT 0,
+        actualizado TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (hash_origen, ruta, clave)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_extracciones_checkpoint_secuencia ON extracciones_checkpoint (secuencia_id)",
+    # Búsqueda de secuencias similares (procesamiento/similitud.py): trayectoria
+    # remuestreada y embedding (float16 / float32 en bruto), el cambio_id con el
+    # que se calcularon y la versión del cálculo
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS firma BYTEA",
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS firma_embedding BYTEA",
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS firma_cambio BIGINT",
+    "ALTER TABLE secuencias ADD COLUMN IF NOT EXISTS firma_version SMALLINT",
+    # El índice único de frames (secuencia_id, num_frame) NO va aquí: renumerar y
+    # crearlo sobre una tabla grande bloquearía la primera petición y las
+    # escrituras; es una migración explícita (python -m bd.migraciones).
+]
+
+_lock = threading.Lock()
+_listo = False
+_hechas = set()          # índices de `_DDL` ya aplicados en este proceso
+_reintento_en = 0.0      # time.monotonic() a partir del cual se vuelve a intentar
+_espera_s = 1.0          # backoff entre intentos: 1 s, 2 s, 4 s... hasta ESPERA_MAX_S
+ESPERA_MAX_S = 300.0
+
+
+def asegurar_esquema():
+    """
+    Aplica `_DDL` una vez por proceso. Nunca lanza: los fallos se registran y,
+    si la BD no respondía o alguna sentencia falló, se reintenta lo pendiente en
+    una petición posterior con espera creciente (hasta que todo se aplique).
+    """
+    global _listo, _reintento_en, _espera_s
+    if _listo or time.monotonic() < _reintento_en:
+        return
+    with _lock:
+        if _listo or time.monotonic() < _reintento_en:
+            return
+        aplicadas = 0
+        try:
+            conn = get_connection()
+            try:
+                # Cada sentencia en su transacción: un fallo no deshace las demás
+                for i, sql in enumerate(_DDL):
+                    if i in _hechas:
+                        continue
+                    try:
+                        with conn.cursor() as cur:
+                            cur.execute(sql)
+                        conn.commit()
+                        _hechas.add(i)
+                        aplicadas += 1
+                    except Exception as e:
+                        conn.rollback()
+                        print("❌ Esquema: falló", " ".join(sql.split())[:80], "->", e)
+            finally:
+                conn.close()
+        except Exception as e:
+            print("❌ No se pudo asegurar el esquema:", e)
+        if aplicadas:
+            invalidar_preparadas()  # planes preparados antes del DDL ya no valen
+        if len(_hechas) == len(_DDL):
+            _listo = True
+        else:
+            _reintento_en = time.monotonic() + _espera_s
+            print(f"⚠️ Esquema: {len(_DDL) - len(_hechas)} sentencias pendientes; reintento en {_espera_s:.0f}s")
+            _espera_s = min(ESPERA_MAX_S, _espera_s * 2)
+
+
+def incrementar_version(cur, secuencia_id: int, tipo: str = "extendida"):
+    """
+    Marca la secuencia como modificada: invalida sus ETags y la publica en el
+    feed de cambios. tipo: 'extendida' (frames nuevos) | 'actualizada' (metadatos).
+    """
+    ejecutar(cur, "incrementar_version", """
+        UPDATE secuencias
+           SET version = version + 1,
+               cambio_id = nextval('secuencias_cambio_seq'),
+               cambio_xid = txid_current(),
+               ultimo_cambio = %s
+         WHERE id = %s
+    """, (tipo, secuencia_id))
+
+
+def incrementar_versiones(cur, secuencia_ids, tipo: str = "extendida"):
+    """Igual que incrementar_version para varias secuencias en una sola sentencia."""
+    ids = sorted({int(i) for i in secuencia_ids})
+    if not ids:
+        return
+    cur.execute("""
+        UPDATE secuencias
+           SET version = version + 1,
+               cambio_id = nextval('secuencias_cambio_seq'),
+               cambio_xid = txid_current(),
+               ultimo_cambio = %s
+         WHERE id = ANY(%s)
+    """, (tipo, ids))
+
+
+def version_secuencia(cur, secuencia_id: int):
+    """Devuelve la versión actual de la secuencia o None si no existe."""
+    ejecutar(cur, "version_secuencia", "SELECT version FROM secuencias WHERE id = %s", (secuencia_id,))
+    r = cur.fetchone()
+    if not r:
+        return None
+    return r[0] if isinstance(r, (list, tuple)) else r.get("version")
@@ -0,0 +1,75 @@
+# backend/bd/feed.py
+"""
+Lectura del feed de cambios de `secuencias` (GET /api/cambios y los índices
+en memoria de similitud.py / handshape.py).
+
+`cambio_id` sale de nextval() dentro de la transacción del escritor, pero solo
+se ve al hacer COMMIT, y varios escritores (flush del buffer, drenado del
+spool, lotes de subida) confirman en cualquier orden: un cursor
+`cambio_id > token` se salta un cambio que confirme tarde con un id menor.
+
+Por eso cada cambio guarda también `cambio_xid` (txid_current() del
+escritor) y el cursor es el par (cambio_xid, id): solo se sirven los cambios
+con xid < xmin del snapshot actual (toda transacción anterior a xmin ya
+terminó, así que nada puede aparecer después por debajo del cursor) y, al
+agotar la página, el token pasa a ser (xmin, 0). Una transacción larga
+retrasa el feed hasta que termina, pero no se pierde nada.
+
+Token: "<xid>.<id>". Se aceptan los tokens enteros antiguos (cambio_id): se
+sirve desde ese cambio_id y se devuelve un token nuevo.
+"""
+
+
+def _campo(fila, clave, idx):
+    return fila[clave] if isinstance(fila, dict) else fila[idx]
+
+
+def xmin_actual(cur) -> int:
+    """xid más antiguo aún en curso: todo cambio con xid menor ya está confirmado (o abortado)."""
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin")
+    return int(_campo(cur.fetchone(), "xmin", 0))
+
+
+def token_inicial(cur) -> str:
+    """Token para empezar a seguir el feed desde ahora (arranque tras una carga completa)."""
+    return f"{xmin_actual(cur)}.0"
+
+
+def parsear_token(token):
+    """"<xid>.<id>" -> ("xid", xid, id); entero antiguo -> ("cambio_id", n, 0). ValueError si no vale."""
+    token = str(token).strip()
+    if "." in token:
+        xid, sid = token.split(".", 1)
+        return "xid", max(0, int(xid)), max(0, int(sid))
+    return "cambio_id", max(0, int(token)), 0
+
+
+def leer_cambios(cur, token, limite: int, columnas: str = "s.id", joins: str = ""):
+    """
+    Secuencias cambiadas desde `token`, en orden del cursor, como mucho `limite`.
+    `columnas` / `joins`: lo que se quiera leer de cada secuencia (alias `s`).
+    Devuelve (filas, token_siguiente, mas). ValueError si el token no es válido.
+    """
+    modo, a, b = parsear_token(token)
+    xmin = xmin_actual(cur)
+    if modo == "xid":
+        filtro, orden, params = "(s.cambio_xid, s.id) > (%s, %s)", "s.cambio_xid, s.id", [a, b]
+    else:
+        filtro, orden, params = "s.cambio_id > %s", "s.cambio_id", [a]
+    cur.execute(f"""
+        SELECT {columnas}, s.cambio_id AS _cambio_id, s.cambio_xid AS _cambio_xid
+          FROM secuencias s
+          {joins}
+         WHERE COALESCE(s.cambio_xid, 0) < %s AND {filtro}
+         ORDER BY {orden}
+         LIMIT %s
+    """, [xmin] + params + [limite + 1])
+    filas = cur.fetchall() or []
+    mas = len(filas) > limite
+    filas = filas[:limite]
+    if not mas:
+        return filas, f"{xmin}.0", False
+    ultima = filas[-1]
+    if modo == "xid":
+        return filas, f"{int(_campo(ultima, '_cambio_xid', -1))}.{int(_campo(ultima, 'id', 0))}", True
+    return filas, str(int(_campo(ultima, "_cambio_id", -2))), True
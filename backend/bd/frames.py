@@ -0,0 +1,97 @@
+# backend/bd/frames.py
+"""
+Inserción de frames en lote (una sola sentencia multi-fila por llamada).
+
+(secuencia_id, num_frame) es la clave de idempotencia de un frame (índice único
+`ux_frames_secuencia_num`, ver bd/migraciones.py): reenviar el mismo frame no crea
+filas nuevas. Sin conflict target en `ON CONFLICT DO NOTHING` el INSERT sigue
+funcionando aunque el índice no exista todavía.
+
+Las filas son (secuencia_id, num_frame, landmarks) o, desde las rutas de video,
+(secuencia_id, num_frame, landmarks, crudos, norm_version): los landmarks crudos
+en coordenadas de imagen y la versión de normalización que produjo `landmarks`
+(ver procesamiento/normalizacion.py). Las filas sin crudos (captura en vivo)
+siguen usando el INSERT de tres columnas.
+"""
+import json
+from contextlib import nullcontext
+
+from psycopg2.extras import execute_values
+
+
+def _medir(perf, etapa):
+    # perf: Cronometro de procesamiento/perf.py (opcional)
+    return nullcontext() if perf is None else perf.medir(etapa)
+
+
+def _valores_unicos(filas):
+    """
+    Serializa y deja una sola fila por (secuencia_id, num_frame) (gana la última).
+    Devuelve (valores, con_crudos); con crudos cada valor lleva 5 columnas.
+    """
+    unicas = {}
+    for sid, nf, lmk, *resto in filas:
+        unicas[(int(sid), int(nf))] = (lmk, *resto)
+    con_crudos = any(len(v) > 1 and v[1] is not None for v in unicas.values())
+    valores = []
+    for (sid, nf), (lmk, *resto) in unicas.items():
+        fila = (sid, nf, json.dumps(lmk, ensure_ascii=False))
+        if con_crudos:
+            crudos, version = (resto + [None, None])[:2]
+            fila += (json.dumps(crudos) if crudos is not None else None, version)
+        valores.append(fila)
+    return valores, con_crudos
+
+
+def insertar_frames_lote(cur, filas, page_size: int = 500, perf=None) -> int:
+    """
+    filas: iterable de (secuencia_id, num_frame, landmarks) con landmarks ya
+    validados (lista/dict serializable). Los duplicados se ignoran.
+    Devuelve el nº de filas realmente insertadas.
+    """
+    with _medir(perf, "serializar"):
+        valores, con_crudos = _valores_unicos(filas)
+    if not valores:
+        return 0
+    columnas = "secuencia_id, num_frame, landmarks" + (", crudos, norm_version" if con_crudos else "")
+    with _medir(perf, "bd"):
+        insertadas = execute_values(
+            cur,
+            f"INSERT INTO frames ({columnas}) VALUES %s "
+            "ON CONFLICT DO NOTHING RETURNING id",
+            valores,
+            page_size=page_size,
+            fetch=True,
+        )
+    return len(insertadas)
+
+
+def insertar_frames_sin_duplicados(cur, filas, page_size: int = 500) -> int:
+    """
+    Como insertar_frames_lote pero además omite secuencias inexistentes (en vez
+    de fallar por la FK). Pensado para reintentos diferidos (p.ej. drenar el spool).
+    """
+    valores, con_crudos = _valores_unicos(filas)
+    if not valores:
+        return 0
+    if con_crudos:
+        columnas, select, alias = (", crudos, norm_version", ", v.crudos::jsonb, v.nv::smallint",
+                                   "v(sid, nf, lmk, crudos, nv)")
+    else:
+        columnas, select, alias = "", "", "v(sid, nf, lmk)"
+    insertadas = execute_values(
+        cur,
+        f"""
+        INSERT INTO frames (secuencia_id, num_frame, landmarks{columnas})
+        SELECT v.sid, v.nf, v.lmk::jsonb{select}
+        FROM (VALUES %s) AS {alias}
+        WHERE EXISTS (SELECT 1 FROM secuencias s WHERE s.id = v.sid)
+          AND NOT EXISTS (SELECT 1 FROM frames f WHERE f.secuencia_id = v.sid AND f.num_frame = v.nf)
+        ON CONFLICT DO NOTHING
+        RETURNING id
+        """,
+        valores,
+        page_size=page_size,
+        fetch=True,
+    )
+    return len(insertadas)
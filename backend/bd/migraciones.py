@@ -0,0 +1,122 @@
+# backend/bd/migraciones.py
+"""
+Migraciones explícitas: las que son demasiado caras para asegurar_esquema()
+(que corre en la primera petición de cada proceso). Se lanzan a mano o en el
+despliegue, con el mismo entorno que el backend:
+
+    cd backend && python -m bd.migraciones
+
+Son idempotentes; relanzarlas no hace nada si ya se aplicaron.
+
+frames_unicos
+    Índice único ux_frames_secuencia_num (secuencia_id, num_frame), que da la
+    idempotencia de frames (reenvíos, spool, lotes repetidos). Primero
+    renumera los num_frame repetidos de datos antiguos (capturas reanudadas que
+    volvían a empezar en 0) al final de su secuencia, en orden de id, por
+    lotes de secuencias con un COMMIT cada uno; luego crea el índice con
+    CREATE UNIQUE INDEX CONCURRENTLY, sin bloquear las escrituras de frames.
+    Si una construcción anterior quedó inválida (se cortó o encontró un
+    duplicado nuevo), se borra y se repite la pasada.
+    Hasta que existe el índice, los INSERT con ON CONFLICT DO NOTHING no
+    deduplican y guardar_frame con si_existe=reemplazar falla.
+"""
+import time
+
+from bd.conexion import get_connection
+
+LOTE_SECUENCIAS = 500
+INTENTOS = 3
+
+
+def _campo(fila, clave, idx):
+    return fila[clave] if isinstance(fila, dict) else fila[idx]
+
+
+def _estado_indice(cur, nombre: str):
+    """None si no existe; True/False según sea válido."""
+    cur.execute("""
+        SELECT i.indisvalid AS valido
+          FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+         WHERE c.relname = %s
+    """, (nombre,))
+    r = cur.fetchone()
+    return None if not r else bool(_campo(r, "valido", 0))
+
+
+def _renumerar_repetidos(conn) -> int:
+    """Renumera los (secuencia_id, num_frame) repetidos; un COMMIT por lote de secuencias."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT secuencia_id FROM (
+                SELECT secuencia_id FROM frames GROUP BY secuencia_id, num_frame HAVING COUNT(*) > 1
+            ) d ORDER BY secuencia_id
+        """)
+        secuencias = [int(_campo(r, "secuencia_id", 0)) for r in cur.fetchall()]
+    conn.commit()
+    total = 0
+    for i in range(0, len(secuencias), LOTE_SECUENCIAS):
+        lote = secuencias[i:i + LOTE_SECUENCIAS]
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH rep AS (
+                  SELECT id, secuencia_id,
+                         ROW_NUMBER() OVER (PARTITION BY secuencia_id, num_frame ORDER BY id) AS rn
+                  FROM frames WHERE secuencia_id = ANY(%(ids)s)
+                ), extra AS (
+                  SELECT id, secuencia_id,
+                         ROW_NUMBER() OVER (PARTITION BY secuencia_id ORDER BY id) AS k
+                  FROM rep WHERE rn > 1
+                ), mx AS (
+                  SELECT secuencia_id, MAX(num_frame) AS mx
+                  FROM frames WHERE secuencia_id = ANY(%(ids)s) GROUP BY secuencia_id
+                )
+                UPDATE frames f
+                   SET num_frame = mx.mx + extra.k
+                  FROM extra JOIN mx ON mx.secuencia_id = extra.secuencia_id
+                 WHERE f.id = extra.id
+            """, {"ids": lote})
+            total += cur.rowcount
+        conn.commit()
+    return total
+
+
+def frames_unicos() -> dict:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            estado = _estado_indice(cur, "ux_frames_secuencia_num")
+        conn.commit()
+        if estado:
+            return {"indice": "ya existía", "renumerados": 0}
+        renumerados = 0
+        for intento in range(1, INTENTOS + 1):
+            renumerados += _renumerar_repetidos(conn)
+            # CONCURRENTLY no puede ir dentro de una transacción
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    if _estado_indice(cur, "ux_frames_secuencia_num") is False:
+                        cur.execute("DROP INDEX CONCURRENTLY IF EXISTS ux_frames_secuencia_num")
+                    try:
+                        cur.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_frames_secuencia_num "
+                                    "ON frames (secuencia_id, num_frame)")
+                        return {"indice": "creado", "renumerados": renumerados, "intentos": intento}
+                    except Exception as e:
+                        # Un duplicado escrito durante la construcción deja el índice inválido
+                        print(f"⚠️ migración frames_unicos: intento {intento} falló: {e}")
+                        cur.execute("DROP INDEX CONCURRENTLY IF EXISTS ux_frames_secuencia_num")
+            finally:
+                conn.autocommit = False
+        raise RuntimeError(f"no se pudo crear ux_frames_secuencia_num tras {INTENTOS} intentos")
+    finally:
+        conn.close()
+
+
+MIGRACIONES = [("frames_unicos", frames_unicos)]
+
+
+if __name__ == "__main__":
+    for nombre, fn in MIGRACIONES:
+        t0 = time.perf_counter()
+        print(f"🛠️ migración {nombre}...")
+        print(f"✅ {nombre}: {fn()} en {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,209 @@
+# backend/bd/pool.py
+"""
+Pool de conexiones por proceso + registro de sentencias preparadas.
+
+Las rutas calientes (guardar_frame, detalle del historial, peek/frames) abren
+conexión con `conexion()` en vez de `get_connection()`: la conexión vuelve al
+pool al salir del bloque (commit si no hubo excepción, rollback si la hubo) y
+se reutiliza en la siguiente petición del mismo worker.
+
+Sobre esas conexiones `ejecutar(cur, nombre, sql, params)` hace `PREPARE` la
+primera vez que una conexión ve la sentencia y `EXECUTE` las siguientes, así
+PostgreSQL no vuelve a parsear/planificar las consultas pequeñas y frecuentes.
+Con una conexión que no es del pool (o DB_PREPARADAS=0) es un `cur.execute`.
+
+Invalidación: `invalidar_preparadas()` (la llama bd/esquema.py tras aplicar DDL)
+sube una generación; cada conexión hace `DEALLOCATE ALL` antes de su siguiente
+sentencia. Si un cambio de esquema hecho desde fuera rompe un plan
+("cached plan must not change result type") la conexión se limpia al devolverla.
+"""
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from bd.conexion import get_connection
+
+POOL_IDLE = int(os.environ.get("DB_POOL_IDLE", "8") or 8)          # conexiones ociosas retenidas
+POOL_MAX_IDLE_S = float(os.environ.get("DB_POOL_MAX_IDLE_S", "300") or 300)
+PREPARADAS = (os.environ.get("DB_PREPARADAS", "1") or "1").lower() not in ("0", "false", "no")
+
+_ERRORES_CONEXION = (psycopg2.OperationalError, psycopg2.InterfaceError)
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+stats = {"conexiones_creadas": 0, "reutilizadas": 0, "descartadas": 0,
+         "preparadas": 0, "hits": 0, "invalidaciones": 0}
+
+_generacion = 0
+
+
+class ConexionPool(psycopg2.extensions.connection):
+    """Conexión con su propio registro de sentencias preparadas."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = {}          # nombre -> sql original
+        self.generacion = _generacion
+        self.limpiar = False          # DEALLOCATE ALL pendiente (tras un error de plan)
+        self.devuelta_en = time.monotonic()
+
+
+def invalidar_preparadas():
+    """Tras un cambio de esquema: todas las conexiones descartan sus sentencias preparadas."""
+    global _generacion
+    _generacion += 1
+    stats["invalidaciones"] += 1
+
+
+def _a_posicional(sql: str):
+    """'... %s ... %s' -> ('... $1 ... $2', 2)."""
+    n = 0
+
+    def _sub(m):
+        nonlocal n
+        if m.group(0) == "%%":
+            return "%"
+        n += 1
+        return f"${n}"
+
+    return _PLACEHOLDER.sub(_sub, sql), n
+
+
+def ejecutar(cur, nombre: str, sql: str, params=()):
+    """
+    cur.execute(sql, params) vía sentencia preparada `nombre` (identificador SQL
+    válido, único por texto de sentencia). Devuelve el cursor.
+    """
+    conn = cur.connection
+    if not PREPARADAS or not isinstance(conn, ConexionPool):
+        cur.execute(sql, params)
+        return cur
+
+    previa = conn.preparadas.get(nombre) if conn.generacion == _generacion else None
+    if previa != sql:
+        try:
+            if conn.generacion != _generacion:
+                cur.execute("DEALLOCATE ALL")
+                conn.preparadas.clear()
+                conn.generacion = _generacion
+            elif previa is not None:
+                cur.execute(f"DEALLOCATE {nombre}")
+                conn.preparadas.pop(nombre, None)
+            texto, _ = _a_posicional(sql)
+            cur.execute(f"PREPARE {nombre} AS {texto}")
+        except psycopg2.Error:
+            # Registro y servidor pueden haber quedado desalineados: se limpia al devolver
+            conn.limpiar = True
+            raise
+        conn.preparadas[nombre] = sql
+        stats["preparadas"] += 1
+    else:
+        stats["hits"] += 1
+
+    params = tuple(params or ())
+    try:
+        if params:
+            cur.execute(f"EXECUTE {nombre} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cur.execute(f"EXECUTE {nombre}")
+    except psycopg2.errors.FeatureNotSupported:
+        # "cached plan must not change result type": el esquema cambió por fuera
+        conn.limpiar = True
+        stats["invalidaciones"] += 1
+        raise
+    return cur
+
+
+class _Pool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._libres = []
+        self._pid = os.getpid()
+
+    def obtener(self):
+        ahora = time.monotonic()
+        with self._lock:
+            if self._pid != os.getpid():   # tras fork: las conexiones heredadas no son nuestras
+                self._libres, self._pid = [], os.getpid()
+            while self._libres:
+                conn = self._libres.pop()
+                if conn.closed or ahora - conn.devuelta_en > POOL_MAX_IDLE_S:
+                    self._cerrar(conn)
+                    continue
+                stats["reutilizadas"] += 1
+                return conn
+        conn = get_connection(connection_factory=ConexionPool)
+        stats["conexiones_creadas"] += 1
+        return conn
+
+    def devolver(self, conn, rota: bool = False):
+        if rota or conn.closed:
+            self._cerrar(conn)
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.limpiar:
+                with conn.cursor() as cur:
+                    cur.execute("DEALLOCATE ALL")
+                conn.commit()
+                conn.preparadas.clear()
+                conn.limpiar = False
+        except Exception:
+            self._cerrar(conn)
+            return
+        conn.devuelta_en = time.monotonic()
+        with self._lock:
+            if len(self._libres) < POOL_IDLE and self._pid == os.getpid():
+                self._libres.append(conn)
+                return
+        self._cerrar(conn)
+
+    def _cerrar(self, conn):
+        stats["descartadas"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def libres(self) -> int:
+        return len(self._libres)
+
+
+_pool = _Pool()
+
+
+@contextmanager
+def conexion():
+    """
+    with conexion() as conn, conn.cursor() as cur: ...
+    Commit al salir sin excepción, rollback si la hubo; la conexión vuelve al pool
+    (o se descarta si falló por conexión/tiempo).
+    """
+    conn = _pool.obtener()
+    rota = False
+    try:
+        yield conn
+        conn.commit()
+    except _ERRORES_CONEXION:
+        rota = True
+        raise
+    except BaseException:
+        try:
+            conn.rollback()
+        except Exception:
+            rota = True
+        raise
+    finally:
+        _pool.devolver(conn, rota)
+
+
+def estadisticas() -> dict:
+    total = stats["preparadas"] + stats["hits"]
+    return {**stats, "libres": _pool.libres(),
+            "ratio_hits": round(stats["hits"] / total, 3) if total else None}
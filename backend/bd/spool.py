@@ -0,0 +1,384 @@
+# backend/bd/spool.py
+"""
+Spool local en disco para no perder frames cuando PostgreSQL va lento o cae.
+
+Las rutas de ingesta escriben aquí (en vez de fallar) mientras la BD está
+degradada. El spool es un log append-only en segmentos:
+
+    <FRAMES_SPOOL_DIR>/seg-<pid>-<ms>-<n>.abierto    segmento en escritura
+                                            .listo      cerrado, pendiente de drenar
+                                            .<pid>.drenando   reclamado por un proceso
+                                            .fallido    en cuarentena (ver abajo)
+
+Cada registro es  b"SF" + len(uint32) + crc32(uint32) + JSON([[sid, nf, lmk(, crudos, norm_version)], ...]).
+Una cola rota (corte a mitad de escritura) o un CRC inválido cortan la lectura
+del segmento en ese punto. Un hilo reproductor drena los segmentos `.listo`
+en bloque cuando la BD responde; la inserción ignora (secuencia_id, num_frame)
+ya existentes, así que repetir un segmento tras una caída no duplica filas.
+
+Si el INSERT del segmento falla por los datos (un valor que la BD no admite),
+se repite fila a fila con SAVEPOINT: las filas buenas se insertan y solo las
+que fallan van a un segmento `seg-...-datos.fallido`, así que un frame malo no
+arrastra a los de otras secuencias del mismo segmento. Un segmento que falla
+por otra cosa que no es de conexión (p.ej. un registro ilegible) se reintenta
+hasta MAX_FALLOS veces y luego se renombra entero a `.fallido`:
+deja de reintentarse y de contar como pendiente (si no, la limpieza de
+secuencias huérfanas de bd/checkpoints.py no correría nunca). Los `.fallido`
+quedan en el directorio para revisarlos a mano.
+
+Los frames de secuencias que ya no existen (borradas mientras sus frames
+esperaban aquí, p.ej. en el spool de otro host) no se descartan en silencio:
+van a un segmento `seg-...-sin_secuencia.fallido` con el mismo formato.
+"""
+import glob
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+import psycopg2
+
+from bd.conexion import get_connection
+from bd.esquema import asegurar_esquema, incrementar_versiones
+from bd.frames import insertar_frames_lote, insertar_frames_sin_duplicados
+
+SPOOL_DIR = os.environ.get("FRAMES_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "lse_spool")
+SEGMENTO_MAX = int(os.environ.get("FRAMES_SPOOL_SEGMENTO_BYTES", str(4 * 1024 * 1024)))
+FSYNC = (os.environ.get("FRAMES_SPOOL_FSYNC", "1") or "1") not in ("0", "false", "no")
+DEGRADADA_S = 5.0      # tras un fallo, cuánto tiempo se escribe directo al spool
+ROTAR_S = 1.0          # antigüedad máxima del segmento abierto antes de cerrarlo
+INTERVALO_S = 2.0      # periodo del reproductor
+MAX_FALLOS = int(os.environ.get("FRAMES_SPOOL_MAX_FALLOS", "5") or 5)
+
+_MAGIC = b"SF"
+_CABECERA = struct.Struct("<2sII")
+
+# Errores de BD que justifican desviar al spool (conexión/tiempo), no de datos
+ERRORES_BD = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def _pid_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        return True
+    return True
+
+
+def _registro(filas) -> bytes:
+    datos = json.dumps(filas, ensure_ascii=False).encode("utf-8")
+    return _CABECERA.pack(_MAGIC, len(datos), zlib.crc32(datos) & 0xFFFFFFFF) + datos
+
+
+def leer_segmento(ruta: str):
+    """Devuelve (filas, registros_ok, cola_rota) de un segmento."""
+    filas, ok, rota = [], 0, False
+    with open(ruta, "rb") as fh:
+        while True:
+            cab = fh.read(_CABECERA.size)
+            if not cab:
+                break
+            if len(cab) < _CABECERA.size:
+                rota = True
+                break
+            magic, largo, crc = _CABECERA.unpack(cab)
+            datos = fh.read(largo)
+            if magic != _MAGIC or len(datos) < largo or (zlib.crc32(datos) & 0xFFFFFFFF) != crc:
+                rota = True
+                break
+            filas.extend(json.loads(datos.decode("utf-8")))
+            ok += 1
+    return filas, ok, rota
+
+
+class SpoolFrames:
+    def __init__(self, directorio: str = SPOOL_DIR):
+        self.dir = directorio
+        self._lock = threading.Lock()
+        self._fh = None
+        self._ruta = None
+        self._abierto_en = 0.0
+        self._n = 0
+        self._degradada_hasta = 0.0
+        self._hilo = None
+        self.stats = {"frames_escritos": 0, "frames_drenados": 0, "segmentos_drenados": 0,
+                      "registros_corruptos": 0, "errores_drenado": 0, "segmentos_fallidos": 0,
+                      "frames_sin_secuencia": 0, "frames_en_cuarentena": 0}
+        self._fallos = {}   # segmento -> nº de fallos de datos seguidos (en este proceso)
+
+    # ---------- estado de la BD ----------
+    def degradada(self) -> bool:
+        return time.monotonic() < self._degradada_hasta
+
+    def marcar_degradada(self):
+        self._degradada_hasta = time.monotonic() + DEGRADADA_S
+        self.iniciar()
+
+    # ---------- escritura ----------
+    def escribir(self, filas):
+        """Añade [(secuencia_id, num_frame, landmarks[, crudos, norm_version]), ...] como un registro durable."""
+        filas = [[int(sid), int(nf), *resto] for sid, nf, *resto in filas]
+        if not filas:
+            return
+        registro = _registro(filas)
+        with self._lock:
+            if self._fh is None:
+                self._abrir_segmento()
+            self._fh.write(registro)
+            self._fh.flush()
+            if FSYNC:
+                os.fsync(self._fh.fileno())
+            self.stats["frames_escritos"] += len(filas)
+            if self._fh.tell() >= SEGMENTO_MAX:
+                self._cerrar_segmento()
+        self.iniciar()
+
+    def _segmentos(self):
+        """Segmentos aún no drenados (incluye el abierto); sin los `.fallido`."""
+        return [r for r in glob.glob(os.path.join(self.dir, "seg-*")) if not r.endswith(".fallido")]
+
+    def pendientes(self) -> int:
+        """Nº de segmentos aún no drenados (incluye el abierto)."""
+        return len(self._segmentos())
+
+    def fallidos(self) -> int:
+        """Nº de segmentos en cuarentena."""
+        return len(glob.glob(os.path.join(self.dir, "seg-*.fallido")))
+
+    def secuencias_pendientes(self) -> set:
+        """Secuencias con frames en el spool de este host (sin drenar o en cuarentena)."""
+        sids = set()
+        if not os.path.isdir(self.dir):
+            return sids
+        for ruta in glob.glob(os.path.join(self.dir, "seg-*")):
+            # Si se renombra entre el glob y la lectura (rotación, reclamo), se lee con su nombre nuevo
+            base = os.path.join(self.dir, os.path.basename(ruta).split(".")[0])
+            for candidata in [ruta] + glob.glob(base + ".*"):
+                try:
+                    filas, _, _ = leer_segmento(candidata)
+                except FileNotFoundError:
+                    continue
+                except Exception:
+                    break  # registro ilegible: lo que haya antes no se puede atribuir
+                sids.update(int(f[0]) for f in filas)
+                break
+        return sids
+
+    def _cuarentena(self, filas, origen: str, motivo: str):
+        """Guarda `filas` en un segmento `.fallido` aparte, para revisarlas a mano."""
+        ruta = os.path.join(self.dir, f"{os.path.basename(origen).split('.')[0]}-{motivo}.fallido")
+        with open(ruta, "ab") as fh:
+            fh.write(_registro([list(f) for f in filas]))
+            fh.flush()
+            if FSYNC:
+                os.fsync(fh.fileno())
+        print(f"❌ spool: {len(filas)} frames de {os.path.basename(origen)} en cuarentena ({motivo}): "
+              f"{os.path.basename(ruta)}")
+
+    def _abrir_segmento(self):
+        os.makedirs(self.dir, exist_ok=True)
+        self._n += 1
+        self._ruta = os.path.join(self.dir, f"seg-{os.getpid()}-{int(time.time() * 1000)}-{self._n}.abierto")
+        self._fh = open(self._ruta, "ab")
+        self._abierto_en = time.monotonic()
+
+    def _cerrar_segmento(self):
+        if self._fh is None:
+            return
+        try:
+            self._fh.close()
+            os.replace(self._ruta, self._ruta[:-len(".abierto")] + ".listo")
+        finally:
+            self._fh = None
+            self._ruta = None
+
+    # ---------- reproductor ----------
+    def iniciar(self):
+        """Arranca el hilo reproductor (idempotente)."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._bucle, name="spool-frames", daemon=True)
+            self._hilo.start()
+
+    def hay_pendientes_en_disco(self) -> bool:
+        return os.path.isdir(self.dir) and bool(self._segmentos())
+
+    def _bucle(self):
+        while True:
+            time.sleep(INTERVALO_S)
+            try:
+                self.drenar()
+            except Exception as e:
+                print("❌ spool: error drenando:", e)
+
+    def drenar(self) -> int:
+        """Cierra el segmento abierto si es viejo y drena todos los `.listo`. Devuelve frames drenados."""
+        with self._lock:
+            if self._fh is not None and time.monotonic() - self._abierto_en >= ROTAR_S:
+                self._cerrar_segmento()
+        self._recuperar_huerfanos()
+
+        total = 0
+        for ruta in sorted(glob.glob(os.path.join(self.dir, "seg-*.listo"))):
+            reclamada = ruta[:-len(".listo")] + f".{os.getpid()}.drenando"
+            try:
+                os.replace(ruta, reclamada)
+            except FileNotFoundError:
+                continue  # otro proceso la reclamó
+            try:
+                total += self._drenar_segmento(reclamada)
+                os.remove(reclamada)
+                self._fallos.pop(ruta, None)
+                self.stats["segmentos_drenados"] += 1
+                self._degradada_hasta = 0.0
+            except Exception as e:
+                self.stats["errores_drenado"] += 1
+                if isinstance(e, ERRORES_BD):
+                    os.replace(reclamada, ruta)
+                    self.marcar_degradada()
+                    break
+                fallos = self._fallos[ruta] = self._fallos.get(ruta, 0) + 1
+                if fallos >= MAX_FALLOS:
+                    self._fallos.pop(ruta, None)
+                    os.replace(reclamada, ruta[:-len(".listo")] + ".fallido")
+                    self.stats["segmentos_fallidos"] += 1
+                    print(f"❌ spool: {os.path.basename(ruta)} falló {fallos} veces; en cuarentena (.fallido): {e}")
+                else:
+                    os.replace(reclamada, ruta)
+                    print(f"❌ spool: no se pudo drenar {os.path.basename(ruta)} "
+                          f"(intento {fallos}/{MAX_FALLOS}): {e}")
+        return total
+
+    def _drenar_segmento(self, ruta: str) -> int:
+        filas, _, rota = leer_segmento(ruta)
+        if rota:
+            self.stats["registros_corruptos"] += 1
+            print(f"⚠️ spool: {os.path.basename(ruta)} tiene cola corrupta; se ignora el resto")
+        if not filas:
+            return 0
+        asegurar_esquema()
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM secuencias WHERE id = ANY(%s)", (sorted({int(f[0]) for f in filas}),))
+                existentes = {int(r["id"] if isinstance(r, dict) else r[0]) for r in cur.fetchall()}
+                huerfanas = [f for f in filas if int(f[0]) not in existentes]
+                filas = [f for f in filas if int(f[0]) in existentes]
+                if huerfanas:
+                    # Antes del COMMIT: si algo falla después, como mucho quedan repetidas en la cuarentena
+                    self._cuarentena(huerfanas, ruta, "sin_secuencia")
+                    self.stats["frames_sin_secuencia"] += len(huerfanas)
+                cur.execute("SAVEPOINT segmento")
+                try:
+                    insertadas = insertar_frames_sin_duplicados(cur, filas) if filas else 0
+                    cur.execute("RELEASE SAVEPOINT segmento")
+                except ERRORES_BD:
+                    raise
+                except psycopg2.Error:
+                    cur.execute("ROLLBACK TO SAVEPOINT segmento")
+                    insertadas = self._insertar_por_fila(cur, filas, ruta)
+                incrementar_versiones(cur, existentes)
+            conn.commit()
+        finally:
+            conn.close()
+        self.stats["frames_drenados"] += insertadas
+        return insertadas
+
+    def _insertar_por_fila(self, cur, filas, origen: str) -> int:
+        """Inserta fila a fila con SAVEPOINT; las que fallan por sus datos van a cuarentena."""
+        insertadas, malas, error = 0, [], None
+        for fila in filas:
+            cur.execute("SAVEPOINT fila")
+            try:
+                insertadas += insertar_frames_sin_duplicados(cur, [fila])
+                cur.execute("RELEASE SAVEPOINT fila")
+            except ERRORES_BD:
+                raise
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT fila")
+                malas.append(fila)
+                error = e
+        if malas:
+            self._cuarentena(malas, origen, "datos")
+            self.stats["frames_en_cuarentena"] += len(malas)
+            print(f"❌ spool: último error de datos: {error}")
+        return insertadas
+
+    def _recuperar_huerfanos(self):
+        """Segmentos abiertos/reclamados por procesos que ya no existen vuelven a `.listo`."""
+        for ruta in glob.glob(os.path.join(self.dir, "seg-*")):
+            base = os.path.basename(ruta)
+            partes = base.split(".")
+            try:
+                if base.endswith(".abierto"):
+                    pid = int(base.split("-")[1])
+                    destino = ruta[:-len(".abierto")] + ".listo"
+                elif base.endswith(".drenando"):
+                    pid = int(partes[-2])
+                    destino = os.path.join(self.dir, partes[0] + ".listo")
+                else:
+                    continue
+            except (ValueError, IndexError):
+                continue
+            if pid != os.getpid() and not _pid_vivo(pid):
+                try:
+                    os.replace(ruta, destino)
+                except FileNotFoundError:
+                    pass
+
+
+spool_frames = SpoolFrames()
+
+
+def _escribir_spool(filas, perf=None):
+    t0 = time.perf_counter()
+    spool_frames.escribir(filas)
+    if perf is not None:
+        perf.sumar("spool", time.perf_counter() - t0)
+
+
+def guardar_frames_o_spool(filas, secuencia_ids, perf=None) -> bool:
+    """
+    Inserta `filas` en una transacción propia. Si la BD falla por conexión/tiempo
+    (o ya está marcada como degradada) las escribe en el spool y devuelve False;
+    True si quedaron confirmadas en la BD.
+    perf: Cronometro opcional (etapas serializar / bd / spool).
+    """
+    filas = list(filas)
+    if not filas:
+        return True
+    if spool_frames.degradada():
+        _escribir_spool(filas, perf)
+        return False
+    conn = None
+    try:
+        # "bd" del INSERT lo mide insertar_frames_lote; aquí conexión + versión + COMMIT
+        t0 = time.perf_counter()
+        conn = get_connection()
+        t_conexion = time.perf_counter() - t0
+        with conn.cursor() as cur:
+            insertar_frames_lote(cur, filas, perf=perf)
+            t0 = time.perf_counter()
+            incrementar_versiones(cur, secuencia_ids)
+        conn.commit()
+        if perf is not None:
+            perf.sumar("bd", t_conexion + time.perf_counter() - t0)
+        return True
+    except ERRORES_BD:
+        spool_frames.marcar_degradada()
+        _escribir_spool(filas, perf)
+        return False
+    finally:
+        try:
+            if conn is not None:
+                conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,35 @@
+# backend/gunicorn.conf.py
+# Hooks de gunicorn (el resto de opciones va en el CMD del Dockerfile).
+import threading
+
+
+def post_worker_init(worker):
+    """Precalienta los detectores MediaPipe en segundo plano (no retrasa el arranque)."""
+    roles = getattr(getattr(worker, "wsgi", None), "config", {}).get("ROLES", ())
+    if "video" not in roles:
+        return  # worker solo-API: no se carga mediapipe
+    try:
+        from procesamiento.detectores import detectores
+        threading.Thread(target=detectores.precalentar, name="precalentar-detectores",
+                         daemon=True).start()
+    except Exception as e:
+        worker.log.warning("No se pudieron precalentar los detectores: %s", e)
+
+
+def worker_exit(server, worker):
+    """Vacía el buffer write-behind de frames antes de que el worker termine."""
+    try:
+        from bd.buffer_frames import buffer_frames
+        buffer_frames.cerrar()
+    except Exception as e:
+        server.log.warning("No se pudo vaciar buffer_frames: %s", e)
+    try:
+        from procesamiento.detectores import detectores
+        detectores.cerrar_todos()
+    except Exception as e:
+        server.log.warning("No se pudieron cerrar los detectores: %s", e)
+    try:
+        from procesamiento import lote
+        lote.cerrar()
+    except Exception as e:
+        server.log.warning("No se pudo cerrar el pool de procesos de lote: %s", e)
@@ -0,0 +1,268 @@
+# backend/procesamiento/calidad.py
+"""
+Calidad de extracción adaptada a la carga (subidas de video).
+
+Cada extracción toma un turno del gobernador (`with gobernador.turno() as nivel`
+o entrar()/salir()) y recibe un nivel 0-3 según las extracciones ya en curso en
+el proceso y la carga de CPU del sistema (loadavg / nº de CPUs). Cada nivel
+degrada un escalón:
+
+  nivel  model_complexity  resolución de inferencia  fps máx.
+    0          1                 la pedida              el pedido
+    1          1                 x0.75                  10
+    2          0                 x0.5                   8
+    3          0                 x0.5                   5
+
+Así, en una ráfaga cada subida tarda algo parecido a una sola en vez de
+ralentizarse todas a la vez. Los ajustes efectivos quedan en
+`secuencias.extraccion` (JSONB).
+
+Con CALIDAD_REPROCESAR=1, las subidas multimodales degradadas guardan el video
+y un hilo las vuelve a extraer a calidad completa cuando el proceso está
+ocioso (nivel 0 y sin extracciones en curso), sustituyendo sus frames.
+Cada tarea se reclama con un rename a `.<pid>.procesando` (un solo worker la
+procesa; las de procesos muertos se recuperan) y el hilo arranca también al
+registrar las rutas si quedaron tareas de antes de un reinicio.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+ACTIVA = os.environ.get("CALIDAD_ADAPTATIVA", "1") != "0"
+ACTIVOS_POR_NIVEL = max(1, int(os.environ.get("CALIDAD_ACTIVOS_POR_NIVEL", "2") or 2))
+REPROCESAR = os.environ.get("CALIDAD_REPROCESAR", "0") == "1"
+REPROCESO_DIR = os.environ.get("CALIDAD_REPROCESO_DIR") or os.path.join(tempfile.gettempdir(), "lse_reproceso")
+INTERVALO_S = 10.0
+LADO_BASE = 1280   # si se pidió resolución original, se degrada desde aquí
+
+NIVELES = (
+    {"model_complexity": 1, "escala_lado": 1.0, "fps_max": None},
+    {"model_complexity": 1, "escala_lado": 0.75, "fps_max": 10},
+    {"model_complexity": 0, "escala_lado": 0.5, "fps_max": 8},
+    {"model_complexity": 0, "escala_lado": 0.5, "fps_max": 5},
+)
+# carga (loadavg 1 min / CPUs) a partir de la cual se sube a cada nivel
+_UMBRALES_CPU = (0.8, 1.0, 1.3)
+
+
+def _carga_cpu() -> float:
+    try:
+        return os.getloadavg()[0] / float(os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0  # sin loadavg (Windows): solo cuenta la cola
+
+
+class Gobernador:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.activos = 0
+        self.stats = {"turnos": 0, "degradados": 0, "por_nivel": [0] * len(NIVELES)}
+
+    def nivel(self, en_cola=None) -> int:
+        if not ACTIVA:
+            return 0
+        en_cola = self.activos if en_cola is None else en_cola
+        por_cola = min(len(NIVELES) - 1, en_cola // ACTIVOS_POR_NIVEL)
+        carga = _carga_cpu()
+        por_cpu = sum(1 for u in _UMBRALES_CPU if carga >= u)
+        return max(por_cola, por_cpu)
+
+    def entrar(self) -> int:
+        """Cuenta una extracción activa más y devuelve su nivel (llamar a salir() al terminar)."""
+        with self._lock:
+            nivel = self.nivel(self.activos)
+            self.activos += 1
+            self.stats["turnos"] += 1
+            self.stats["por_nivel"][nivel] += 1
+            if nivel:
+                self.stats["degradados"] += 1
+        return nivel
+
+    def salir(self):
+        with self._lock:
+            self.activos -= 1
+
+    @contextmanager
+    def turno(self):
+        nivel = self.entrar()
+        try:
+            yield nivel
+        finally:
+            self.salir()
+
+    def estadisticas(self) -> dict:
+        return {**self.stats, "por_nivel": list(self.stats["por_nivel"]), "activos": self.activos,
+                "nivel_actual": self.nivel(), "carga_cpu": round(_carga_cpu(), 2)}
+
+
+gobernador = Gobernador()
+
+
+def aplicar(nivel: int, max_lado: int, muestreo: dict):
+    """Ajustes pedidos -> (model_complexity, max_lado, muestreo) del nivel."""
+    n = NIVELES[nivel]
+    muestreo = dict(muestreo)
+    if nivel:
+        max_lado = int(round((max_lado or LADO_BASE) * n["escala_lado"]))
+        tope = n["fps_max"]
+        muestreo["target_fps"] = min(muestreo["target_fps"], tope)
+        muestreo["fps_max"] = min(muestreo["fps_max"], float(tope))
+        muestreo["fps_min"] = min(muestreo["fps_min"], muestreo["fps_max"])
+    return n["model_complexity"], max_lado, muestreo
+
+
+def efectivos(nivel: int, complejidad: int, max_lado: int, muestreo: dict, **extra) -> dict:
+    """Valor de secuencias.extraccion."""
+    return {"nivel": nivel, "model_complexity": complejidad, "max_lado": max_lado,
+            "muestreo": muestreo, **extra}
+
+
+def registrar(secuencia_id: int, ajustes: dict):
+    """Guarda los ajustes efectivos en la secuencia (un fallo no rompe la subida)."""
+    from bd.conexion import get_connection
+
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE secuencias SET extraccion = %s WHERE id = %s",
+                        (json.dumps(ajustes), secuencia_id))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ calidad: no se pudo registrar la extracción de {secuencia_id}: {e}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Reproceso a calidad completa en ocioso (solo multimodal)
+# ──────────────────────────────────────────────────────────────────────────────
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def encolar_reproceso(ruta_video: str, secuencia_id: int, opciones: dict) -> bool:
+    """Mueve el video a REPROCESO_DIR con sus opciones de calidad completa. True si quedó encolado."""
+    if not REPROCESAR:
+        return False
+    try:
+        os.makedirs(REPROCESO_DIR, exist_ok=True)
+        destino = os.path.join(REPROCESO_DIR, f"{int(secuencia_id)}{os.path.splitext(ruta_video)[1]}")
+        shutil.move(ruta_video, destino)
+        with open(destino + ".json", "w", encoding="utf-8") as fh:
+            json.dump({"secuencia_id": int(secuencia_id), "video": destino,
+                       "opciones": dict(opciones, modalidades=list(opciones["modalidades"]),
+                                        cara_puntos=(list(opciones["cara_puntos"])
+                                                     if opciones.get("cara_puntos") else None))}, fh)
+    except Exception as e:
+        print(f"⚠️ calidad: no se pudo encolar el reproceso de {secuencia_id}: {e}")
+        return False
+    iniciar_reproceso()
+    return True
+
+
+def _pid_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        return True
+    return True
+
+
+def _pendientes() -> list:
+    return sorted(p for p in os.listdir(REPROCESO_DIR) if p.endswith(".json")) \
+        if os.path.isdir(REPROCESO_DIR) else []
+
+
+def _recuperar_huerfanos():
+    """Tareas reclamadas por procesos que ya no existen vuelven a `.json`."""
+    if not os.path.isdir(REPROCESO_DIR):
+        return
+    for nombre in os.listdir(REPROCESO_DIR):
+        if not nombre.endswith(".procesando"):
+            continue
+        partes = nombre.split(".")
+        try:
+            pid = int(partes[-2])
+        except (ValueError, IndexError):
+            continue
+        if pid != os.getpid() and not _pid_vivo(pid):
+            try:
+                os.replace(os.path.join(REPROCESO_DIR, nombre),
+                           os.path.join(REPROCESO_DIR, ".".join(partes[:-2])))
+            except FileNotFoundError:
+                pass
+
+
+def hay_reprocesos_pendientes() -> bool:
+    """Quedan tareas en REPROCESO_DIR (p. ej. de antes de un reinicio)."""
+    _recuperar_huerfanos()
+    return bool(_pendientes())
+
+
+def iniciar_reproceso():
+    """Lanza el hilo de reproceso si no está corriendo (idempotente)."""
+    global _hilo
+    with _hilo_lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="reproceso-calidad", daemon=True)
+            _hilo.start()
+
+
+def _bucle():
+    while True:
+        time.sleep(INTERVALO_S)
+        _recuperar_huerfanos()
+        pendientes = _pendientes()
+        if not pendientes:
+            return  # se relanza con el siguiente encolado
+        if gobernador.activos or gobernador.nivel(0):
+            continue
+        # Varios workers de gunicorn comparten el directorio: la tarea se reclama
+        # con un rename atómico (como los segmentos del spool) y solo la procesa
+        # quien lo consigue
+        ruta = os.path.join(REPROCESO_DIR, pendientes[0])
+        reclamada = f"{ruta}.{os.getpid()}.procesando"
+        try:
+            os.replace(ruta, reclamada)
+        except FileNotFoundError:
+            continue
+        _reprocesar(reclamada)
+
+
+def _reprocesar(ruta_json: str):
+    """`ruta_json`: la tarea ya reclamada (`<video>.json.<pid>.procesando`)."""
+    from bd.conexion import get_connection
+    from bd.esquema import incrementar_version
+    from bd.frames import insertar_frames_lote
+    from procesamiento.lote import extraer_archivo
+    from procesamiento.normalizacion import NORMALIZACION_VERSION
+
+    try:
+        with open(ruta_json, encoding="utf-8") as fh:
+            tarea = json.load(fh)
+        sid, video, opciones = tarea["secuencia_id"], tarea["video"], tarea["opciones"]
+        with gobernador.turno():
+            res = extraer_archivo(video, opciones)
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM frames WHERE secuencia_id = %s", (sid,))
+            insertar_frames_lote(cur, [(sid, nf, p, c, NORMALIZACION_VERSION) for nf, p, c in res["frames"]])
+            cur.execute("UPDATE secuencias SET extraccion = %s WHERE id = %s",
+                        (json.dumps(efectivos(0, opciones.get("model_complexity", 1), opciones.get("max_lado", 0),
+                                              opciones["muestreo"], reprocesada=True)), sid))
+            incrementar_version(cur, sid, "actualizada")
+            conn.commit()
+        print(f"✅ calidad: secuencia {sid} reprocesada a calidad completa ({len(res['frames'])} frames)")
+    except Exception as e:
+        print(f"❌ calidad: falló el reproceso de {ruta_json}: {e}")
+    finally:
+        video = ruta_json[:ruta_json.rindex(".json.")]
+        for p in (ruta_json, video):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
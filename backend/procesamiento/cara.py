@@ -0,0 +1,62 @@
+# backend/procesamiento/cara.py
+"""
+Subconjuntos de la malla facial (468/478 puntos) que se guardan por frame.
+
+La cara es con diferencia lo más pesado de cada fila multimodal. Los rasgos no
+manuales de la LSE salen de cejas, ojos, labios y mandíbula, así que por
+defecto se guarda solo "lse_nmf" (113 puntos). La normalización se hace sobre
+la malla completa (usa los puntos 0 / 33 / 263) y el recorte después.
+
+En `secuencias.cara_indices` queda {"subconjunto": nombre, "indices": [...],
+"crudos": [...]}: la posición i del array "face" de cada frame es el punto
+indices[i] de la malla, y la posición i de la cara en `frames.crudos` es el
+punto crudos[i] (el subconjunto más las REFERENCIAS, para poder renormalizar).
+"""
+from __future__ import annotations
+
+import os
+
+# Índices de la malla de MediaPipe (FACEMESH_* de mediapipe.solutions.face_mesh)
+LABIOS = (61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 185, 40, 39, 37, 0, 267, 269, 270, 409,
+          78, 95, 88, 178, 87, 14, 317, 402, 318, 324, 308, 191, 80, 81, 82, 13, 312, 311, 310, 415)
+OJO_IZQ = (263, 249, 390, 373, 374, 380, 381, 382, 362, 466, 388, 387, 386, 385, 384, 398)
+OJO_DER = (33, 7, 163, 144, 145, 153, 154, 155, 133, 246, 161, 160, 159, 158, 157, 173)
+CEJA_IZQ = (276, 283, 282, 295, 285, 300, 293, 334, 296, 336)
+CEJA_DER = (46, 53, 52, 65, 55, 70, 63, 105, 66, 107)
+MANDIBULA = (234, 93, 132, 58, 172, 136, 150, 149, 176, 148, 152, 377, 400, 378, 379, 365, 397,
+             288, 361, 323, 454)
+
+SUBCONJUNTOS = {
+    "completa": None,
+    "lse_nmf": tuple(sorted(set(LABIOS + OJO_IZQ + OJO_DER + CEJA_IZQ + CEJA_DER + MANDIBULA))),
+    "ojos_cejas": tuple(sorted(set(OJO_IZQ + OJO_DER + CEJA_IZQ + CEJA_DER))),
+    "labios": tuple(sorted(LABIOS)),
+}
+
+POR_DEFECTO = os.environ.get("CARA_SUBCONJUNTO", "lse_nmf")
+
+# Puntos que usa normalizar_caras (centro y escala inter-ocular)
+REFERENCIAS = (0, 33, 263)
+
+
+def resolver(nombre=None):
+    """Nombre del form/env -> (nombre, índices o None = malla completa). ValueError si no existe."""
+    nombre = (nombre or POR_DEFECTO or "completa").strip().lower()
+    if nombre not in SUBCONJUNTOS:
+        raise ValueError(f"Subconjunto de cara desconocido: {nombre} "
+                         f"(disponibles: {', '.join(SUBCONJUNTOS)})")
+    return nombre, SUBCONJUNTOS[nombre]
+
+
+def indices_crudos(indices):
+    """Puntos de la malla guardados en crudo: el subconjunto más las referencias (None = malla completa)."""
+    if indices is None:
+        return None
+    return tuple(sorted(set(indices) | set(REFERENCIAS)))
+
+
+def mapa(nombre: str, indices):
+    """Valor de secuencias.cara_indices (None para la malla completa)."""
+    if indices is None:
+        return None
+    return {"subconjunto": nombre, "indices": list(indices), "crudos": list(indices_crudos(indices))}
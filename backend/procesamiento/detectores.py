@@ -0,0 +1,214 @@
+# backend/procesamiento/detectores.py
+"""
+Pool por proceso de detectores MediaPipe (Hands / Pose / Holistic).
+
+Construir un detector carga los modelos de disco e inicializa el grafo, y los
+que no se cierran dejan memoria nativa viva. Las rutas de subida piden uno con
+`prestar(tipo, **config)`: se reutiliza una instancia libre con la misma
+configuración (o se crea), se resetea al devolverla (el tracking entre frames
+no pasa de un video a otro) y se cierra con `close()` cuando sale del pool.
+
+- DETECTORES_MAX: máximo de instancias vivas por proceso. Al llegar al tope se
+  desaloja (y cierra) la libre usada hace más tiempo; si todas están en uso se
+  espera DETECTORES_ESPERA_S y, pasado ese tiempo, se crea una temporal que se
+  cierra al devolverla.
+- DETECTORES_PRECALENTAR: configuraciones por defecto a crear al arrancar el
+  worker ("hands,holistic"; vacío lo desactiva). Ver gunicorn.conf.py.
+- Si el procesamiento lanza una excepción la instancia se cierra en vez de volver.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# mediapipe (y con él numpy/protobuf) se importa en el primer uso, no al cargar
+# el módulo: un worker solo-API nunca lo paga (ver routes/__init__.py).
+_mp = None
+_mp_ok = None
+
+
+def disponible() -> bool:
+    """True si mediapipe se puede importar (lo importa la primera vez)."""
+    global _mp, _mp_ok
+    if _mp_ok is None:
+        try:
+            import mediapipe
+            _mp, _mp_ok = mediapipe, True
+        except Exception:
+            _mp_ok = False
+    return _mp_ok
+
+MAX_INSTANCIAS = int(os.environ.get("DETECTORES_MAX", "4") or 4)
+ESPERA_S = float(os.environ.get("DETECTORES_ESPERA_S", "10") or 10)
+PRECALENTAR = os.environ.get("DETECTORES_PRECALENTAR", "hands,holistic")
+
+# Configuraciones que usan las rutas de subida (y las que se precalientan)
+CONFIG_HANDS = dict(static_image_mode=False, max_num_hands=1, model_complexity=1,
+                    min_detection_confidence=0.5, min_tracking_confidence=0.5)
+CONFIG_HOLISTIC = dict(static_image_mode=False, model_complexity=1, refine_face_landmarks=True,
+                       enable_segmentation=False, min_detection_confidence=0.5,
+                       min_tracking_confidence=0.5)
+# Extracción multimodal sin cara (ver procesamiento/modalidades.py)
+CONFIG_MANOS_DOS = dict(CONFIG_HANDS, max_num_hands=2)
+CONFIG_POSE = dict(static_image_mode=False, model_complexity=1, smooth_landmarks=True,
+                   enable_segmentation=False, min_detection_confidence=0.5,
+                   min_tracking_confidence=0.5)
+_POR_DEFECTO = {"hands": CONFIG_HANDS, "holistic": CONFIG_HOLISTIC, "pose": CONFIG_POSE}
+
+
+def _construir(tipo: str, config: dict):
+    if tipo == "hands":
+        return _mp.solutions.hands.Hands(**config)
+    if tipo == "holistic":
+        return _mp.solutions.holistic.Holistic(**config)
+    if tipo == "pose":
+        return _mp.solutions.pose.Pose(**config)
+    raise ValueError(f"Detector desconocido: {tipo}")
+
+
+def _cerrar(det):
+    try:
+        det.close()
+    except Exception:
+        pass
+
+
+class PoolDetectores:
+    def __init__(self, maximo: int = MAX_INSTANCIAS):
+        self.maximo = max(1, maximo)
+        self._cond = threading.Condition()
+        self._libres = {}        # clave -> [(detector, último uso)]
+        self._vivos = 0
+        self.stats = {"creados": 0, "reutilizados": 0, "cerrados": 0, "temporales": 0, "esperas": 0}
+
+    @staticmethod
+    def _clave(tipo: str, config: dict):
+        return (tipo, tuple(sorted(config.items())))
+
+    @contextmanager
+    def prestar(self, tipo: str, **config):
+        """with pool.prestar("hands", **CONFIG_HANDS) as hands: hands.process(rgb) ..."""
+        if not disponible():
+            raise RuntimeError("MediaPipe no está instalado")
+        clave = self._clave(tipo, config)
+        det, temporal = self._obtener(clave, tipo, config)
+        try:
+            yield det
+        except BaseException:
+            self._descartar(det, temporal)
+            raise
+        self._devolver(clave, det, temporal)
+
+    # ---------- internos ----------
+    def _obtener(self, clave, tipo, config):
+        limite = time.monotonic() + ESPERA_S
+        temporal = False
+        with self._cond:
+            while True:
+                libres = self._libres.get(clave)
+                if libres:
+                    self.stats["reutilizados"] += 1
+                    return libres.pop()[0], False
+                if self._vivos < self.maximo or self._desalojar_uno():
+                    self._vivos += 1
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self.stats["temporales"] += 1
+                    temporal = True
+                    break
+                self.stats["esperas"] += 1
+                self._cond.wait(restante)
+        if temporal:
+            return self._crear(tipo, config, contar=False), True
+        try:
+            return self._crear(tipo, config), False
+        except BaseException:
+            with self._cond:
+                self._vivos -= 1
+                self._cond.notify()
+            raise
+
+    def _crear(self, tipo, config, contar: bool = True):
+        det = _construir(tipo, config)
+        if contar:
+            self.stats["creados"] += 1
+        return det
+
+    def _desalojar_uno(self) -> bool:
+        """Cierra la instancia libre menos usada recientemente (con el lock tomado)."""
+        candidata = None
+        for clave, libres in self._libres.items():
+            for i, (_, usado) in enumerate(libres):
+                if candidata is None or usado < candidata[2]:
+                    candidata = (clave, i, usado)
+        if candidata is None:
+            return False
+        clave, i, _ = candidata
+        det, _ = self._libres[clave].pop(i)
+        if not self._libres[clave]:
+            del self._libres[clave]
+        self._vivos -= 1
+        self.stats["cerrados"] += 1
+        _cerrar(det)
+        return True
+
+    def _devolver(self, clave, det, temporal: bool):
+        if temporal:
+            self._descartar(det, True)
+            return
+        try:
+            det.reset()   # descarta el estado de tracking del video anterior
+        except Exception:
+            self._descartar(det, False)
+            return
+        with self._cond:
+            self._libres.setdefault(clave, []).append((det, time.monotonic()))
+            self._cond.notify()
+
+    def _descartar(self, det, temporal: bool):
+        _cerrar(det)
+        with self._cond:
+            self.stats["cerrados"] += 1
+            if not temporal:
+                self._vivos -= 1
+                self._cond.notify()
+
+    # ---------- ciclo de vida ----------
+    def precalentar(self, tipos=None):
+        """Crea (y ejecuta una vez sobre un frame vacío) las configuraciones por defecto."""
+        tipos = tipos if tipos is not None else [t.strip() for t in PRECALENTAR.split(",") if t.strip()]
+        if not tipos or not disponible():
+            return
+        import numpy as np
+        vacio = np.zeros((64, 64, 3), dtype=np.uint8)
+        for tipo in tipos:
+            config = _POR_DEFECTO.get(tipo)
+            if config is None:
+                continue
+            try:
+                with self.prestar(tipo, **config) as det:
+                    det.process(vacio)
+            except Exception as e:
+                print(f"⚠️ detectores: no se pudo precalentar {tipo}: {e}")
+
+    def cerrar_todos(self):
+        with self._cond:
+            libres, self._libres = self._libres, {}
+            for lista in libres.values():
+                for det, _ in lista:
+                    self._vivos -= 1
+                    self.stats["cerrados"] += 1
+                    _cerrar(det)
+
+    def estadisticas(self) -> dict:
+        with self._cond:
+            return {**self.stats, "vivos": self._vivos,
+                    "libres": sum(len(v) for v in self._libres.values())}
+
+
+detectores = PoolDetectores()
+atexit.register(detectores.cerrar_todos)
@@ -0,0 +1,405 @@
+# backend/procesamiento/handshape.py
+"""
+Índice k-NN de formas de mano para signos estáticos (POST /api/handshape/buscar).
+
+Letras y números (categorías `letra` / `numero`) son sobre todo una forma de
+mano fija, así que se indexa cada frame por separado: sus 21 puntos
+normalizados (normalizar_manos) como un vector de 63 float32. Las manos
+izquierdas se reflejan (y -> -y tras normalizar, que equivale a reflejar en x
+antes, porque la rotación es en xy) para comparar formas sin importar la mano.
+Los frames de /subir_video no llevan lateralidad y se toman como derecha.
+
+  - PCA: con al menos PCA_MIN vectores se reducen a PCA_DIM componentes
+    (HANDSHAPE_PCA_DIM=0 lo desactiva). La matriz en memoria es N x PCA_DIM float32.
+  - IVF: con al menos IVF_MIN vectores se agrupan con k-means en ~sqrt(N)
+    listas; una consulta solo mira las NPROBE listas de centroide más cercano.
+    Por debajo, búsqueda exhaustiva (un producto matriz-vector).
+  - Se vuelve a entrenar (PCA si aún no había, listas siempre) cuando el
+    índice duplica el tamaño con el que se entrenó.
+
+Un hilo del proceso (`iniciar()`) hace la carga inicial desde `frames` y luego,
+cada REFRESCO_S, recarga las secuencias del feed de cambios (bd/feed.py) y
+quita las borradas; las consultas no tocan la BD. Ese hilo es el único que
+modifica el índice: lee la BD y entrena (SVD + k-means) sin el lock, sobre
+copias, y solo lo toma para instalar el resultado.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from bd import feed
+from bd.conexion import get_connection
+from bd.esquema import asegurar_esquema
+from procesamiento.normalizacion import a_array, normalizar_manos
+
+CATEGORIAS = ("letra", "numero")
+RASGOS = 63
+
+PCA_DIM = int(os.environ.get("HANDSHAPE_PCA_DIM", "24") or 0)
+PCA_MIN = int(os.environ.get("HANDSHAPE_PCA_MIN", "2000") or 2000)
+IVF_MIN = int(os.environ.get("HANDSHAPE_IVF_MIN", "20000") or 20000)
+NPROBE = int(os.environ.get("HANDSHAPE_NPROBE", "8") or 8)
+REFRESCO_S = float(os.environ.get("HANDSHAPE_REFRESCO_S", "5") or 5)
+LOTE = 5000
+KMEANS_ITER = 10
+KMEANS_MUESTRA = 64     # vectores de entrenamiento por lista
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Vectores
+# ──────────────────────────────────────────────────────────────────────────────
+def vectores(manos, izquierdas) -> np.ndarray:
+    """
+    manos: lista de arrays (21, 3); izquierdas: bool por mano -> (n, 63)
+    float32 normalizados, con las izquierdas reflejadas.
+    """
+    if not manos:
+        return np.zeros((0, RASGOS), dtype=np.float32)
+    arr = normalizar_manos(np.stack(manos).astype(np.float32))
+    arr[np.asarray(izquierdas, dtype=bool), :, 1] *= -1.0
+    return arr.reshape(len(manos), RASGOS)
+
+
+def _mano(puntos):
+    if not isinstance(puntos, list) or len(puntos) < 21:
+        return None
+    try:
+        return a_array(puntos[:21])
+    except (KeyError, TypeError):
+        return None
+
+
+def _kmeans(X: np.ndarray, k: int, rng) -> np.ndarray:
+    centros = X[rng.choice(len(X), k, replace=False)].copy()
+    for _ in range(KMEANS_ITER):
+        asignacion = _mas_cercano(X, centros)
+        for c in range(k):
+            miembros = X[asignacion == c]
+            centros[c] = miembros.mean(axis=0) if len(miembros) else X[rng.integers(len(X))]
+    return centros
+
+
+def _mas_cercano(X: np.ndarray, centros: np.ndarray, trozo: int = 65536) -> np.ndarray:
+    """Índice del centro más cercano de cada fila (por trozos para acotar memoria)."""
+    cc = (centros * centros).sum(1)
+    salida = np.empty(len(X), dtype=np.int32)
+    for i in range(0, len(X), trozo):
+        salida[i:i + trozo] = np.argmin(cc[None, :] - 2.0 * X[i:i + trozo] @ centros.T, axis=1)
+    return salida
+
+
+def _campo(fila, clave, idx):
+    return fila[clave] if isinstance(fila, dict) else fila[idx]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Índice
+# ──────────────────────────────────────────────────────────────────────────────
+class IndiceHandshape:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.listo = False
+        self.error = None
+        self._n = 0
+        self._X = np.zeros((0, RASGOS), dtype=np.float32)
+        self._sec = np.zeros(0, dtype=np.int64)
+        self._nf = np.zeros(0, dtype=np.int32)
+        self._cat = np.zeros(0, dtype=np.int8)   # posición en CATEGORIAS
+        self._activo = np.zeros(0, dtype=bool)
+        self._filas_sec = {}       # secuencia_id -> [filas]
+        self._meta = {}            # secuencia_id -> (categoria_slug, subcategoria, nombre)
+        self._media = None         # PCA
+        self._componentes = None
+        self._varianza = None
+        self._centros = None       # IVF
+        self._lista = np.zeros(0, dtype=np.int32)
+        self._miembros = []
+        self._cache = []
+        self._entrenado_con = 0
+        self._ultimo_cambio = None
+        self._rng = np.random.default_rng(0)
+
+    # -- espacio reducido -----------------------------------------------------
+    @staticmethod
+    def _proyectar(V: np.ndarray, media, componentes) -> np.ndarray:
+        if componentes is None:
+            return V.astype(np.float32, copy=False)
+        return ((V - media) @ componentes).astype(np.float32)
+
+    def _reducir(self, V: np.ndarray) -> np.ndarray:
+        """Al espacio del índice actual; con el lock tomado (o desde el hilo del índice)."""
+        return self._proyectar(V, self._media, self._componentes)
+
+    def _entrenar(self, X, sec, nf, cat) -> dict:
+        """
+        PCA (si toca y aún no hay) + listas IVF sobre una copia de las filas
+        activas. Sin lock: devuelve el estado que instala _instalar().
+        """
+        media, componentes, varianza = self._media, self._componentes, self._varianza
+        if componentes is None and PCA_DIM and len(X) >= PCA_MIN and X.shape[1] > PCA_DIM:
+            muestra = X[self._rng.choice(len(X), min(len(X), 50000), replace=False)]
+            media = muestra.mean(axis=0)
+            _, s, vt = np.linalg.svd(muestra - media, full_matrices=False)
+            componentes = vt[:PCA_DIM].T.astype(np.float32)
+            varianza = float((s[:PCA_DIM] ** 2).sum() / max((s ** 2).sum(), 1e-12))
+            X = self._proyectar(X, media, componentes)
+        n = len(X)
+        centros, miembros, lista = None, [], np.zeros(n, dtype=np.int32)
+        if n >= IVF_MIN:
+            listas = max(16, int(math.sqrt(n)))
+            muestra = X[self._rng.choice(n, min(n, listas * KMEANS_MUESTRA), replace=False)]
+            centros = _kmeans(muestra, listas, self._rng)
+            lista = _mas_cercano(X, centros)
+            orden = np.argsort(lista, kind="stable")
+            cortes = np.searchsorted(lista[orden], np.arange(listas + 1))
+            miembros = [orden[cortes[c]:cortes[c + 1]].tolist() for c in range(listas)]
+        return {"_X": X, "_sec": sec, "_nf": nf, "_cat": cat, "_lista": lista, "_media": media,
+                "_componentes": componentes, "_varianza": varianza, "_centros": centros, "_miembros": miembros}
+
+    def _instalar(self, modelo: dict):
+        """Sustituye matriz compactada, PCA y listas por las de _entrenar(). Con el lock tomado."""
+        for nombre, valor in modelo.items():
+            setattr(self, nombre, valor)
+        self._n = len(self._X)
+        self._activo = np.ones(self._n, dtype=bool)
+        self._filas_sec = {}
+        for fila, sid in enumerate(self._sec.tolist()):
+            self._filas_sec.setdefault(sid, []).append(fila)
+        self._cache = [None] * len(self._miembros)
+        self._entrenado_con = self._n
+
+    # -- altas / bajas --------------------------------------------------------
+    def _crecer(self, n: int):
+        cap = max(4096, len(self._sec) * 2)
+        while cap < n:
+            cap *= 2
+        for nombre in ("_X", "_sec", "_nf", "_cat", "_activo", "_lista"):
+            viejo = getattr(self, nombre)
+            nuevo = np.zeros((cap,) + viejo.shape[1:], dtype=viejo.dtype)
+            nuevo[:self._n] = viejo[:self._n]
+            setattr(self, nombre, nuevo)
+
+    def _quitar_secuencia(self, sid: int):
+        for fila in self._filas_sec.pop(sid, ()):
+            self._activo[fila] = False
+        self._meta.pop(sid, None)
+
+    def _agregar(self, V: np.ndarray, sids, nfs):
+        if not len(V):
+            return
+        R = self._reducir(V)
+        if self._n + len(R) > len(self._sec):
+            self._crecer(self._n + len(R))
+        filas = np.arange(self._n, self._n + len(R))
+        self._X[filas], self._sec[filas], self._nf[filas] = R, sids, nfs
+        self._cat[filas] = [CATEGORIAS.index(self._meta[int(s)][0]) if int(s) in self._meta else -1 for s in sids]
+        self._activo[filas] = True
+        for fila, sid in zip(filas.tolist(), sids):
+            self._filas_sec.setdefault(int(sid), []).append(fila)
+        if self._centros is not None:
+            listas = _mas_cercano(R, self._centros)
+            self._lista[filas] = listas
+            for fila, c in zip(filas.tolist(), listas.tolist()):
+                self._miembros[c].append(fila)
+                self._cache[c] = None
+        self._n += len(R)
+
+    # -- lectura de la BD -----------------------------------------------------
+    @staticmethod
+    def _leer(cur, secuencia_ids=None, desde_id: int = 0):
+        """Un lote de frames de letras/números: (filas, último f.id) — filas (sid, nf, mano, izquierda)."""
+        filtro = "AND f.secuencia_id = ANY(%s)" if secuencia_ids is not None else ""
+        params = [list(CATEGORIAS), desde_id] + ([list(secuencia_ids)] if secuencia_ids is not None else []) + [LOTE]
+        cur.execute(f"""
+            SELECT f.id, f.secuencia_id, f.num_frame,
+                   CASE WHEN jsonb_typeof(f.landmarks) = 'array' THEN f.landmarks
+                        ELSE f.landmarks->'right_hand' END AS derecha,
+                   CASE WHEN jsonb_typeof(f.landmarks) = 'object' THEN f.landmarks->'left_hand' END AS izquierda
+              FROM frames f
+              JOIN secuencias s ON s.id = f.secuencia_id
+              JOIN categorias c ON c.id = s.categoria_id
+             WHERE c.slug = ANY(%s) AND f.id > %s {filtro}
+             ORDER BY f.id
+             LIMIT %s
+        """, params)
+        filas = cur.fetchall()
+        salida = []
+        for r in filas:
+            sid, nf = int(_campo(r, "secuencia_id", 1)), int(_campo(r, "num_frame", 2))
+            for clave, idx, izquierda in (("derecha", 3, False), ("izquierda", 4, True)):
+                mano = _mano(_campo(r, clave, idx))
+                if mano is not None:
+                    salida.append((sid, nf, mano, izquierda))
+        return salida, (int(_campo(filas[-1], "id", 0)) if filas else None)
+
+    @staticmethod
+    def _leer_meta(cur, secuencia_ids) -> dict:
+        cur.execute("""
+            SELECT s.id, c.slug, s.subcategoria, s.nombre
+              FROM secuencias s
+              JOIN categorias c ON c.id = s.categoria_id
+             WHERE s.id = ANY(%s) AND c.slug = ANY(%s)
+        """, (list(secuencia_ids), list(CATEGORIAS)))
+        return {int(_campo(r, "id", 0)): (_campo(r, "slug", 1), _campo(r, "subcategoria", 2), _campo(r, "nombre", 3))
+                for r in cur.fetchall()}
+
+    def _leer_todo(self, cur, secuencia_ids=None):
+        manos, izquierdas, sids, nfs = [], [], [], []
+        desde = 0
+        while True:
+            filas, desde = self._leer(cur, secuencia_ids, desde)
+            for sid, nf, mano, izquierda in filas:
+                sids.append(sid), nfs.append(nf), manos.append(mano), izquierdas.append(izquierda)
+            if desde is None:
+                break
+        return vectores(manos, izquierdas), sids, nfs
+
+    # -- carga / refresco -----------------------------------------------------
+    def cargar(self):
+        t0 = time.perf_counter()
+        asegurar_esquema()
+        with get_connection() as conn, conn.cursor() as cur:
+            # Token antes de leer: lo que cambie durante la carga vuelve a llegar por el feed
+            token = feed.token_inicial(cur)
+            V, sids, nfs = self._leer_todo(cur)
+            meta = self._leer_meta(cur, set(sids)) if sids else {}
+        cat = np.array([CATEGORIAS.index(meta[s][0]) if s in meta else -1 for s in sids], dtype=np.int8)
+        modelo = self._entrenar(V, np.asarray(sids, dtype=np.int64), np.asarray(nfs, dtype=np.int32), cat)
+        with self._lock:
+            self._meta = meta
+            self._instalar(modelo)
+            self._ultimo_cambio = token
+            self.listo = True
+        print(f"✋ handshape: {self._n} manos de {len(meta)} secuencias indexadas en "
+              f"{time.perf_counter() - t0:.1f}s ({self.estadisticas()['modo']})")
+
+    def refrescar(self):
+        """Recarga las secuencias cambiadas desde el último token y quita las borradas."""
+        with get_connection() as conn, conn.cursor() as cur:
+            cambiadas, token, mas = set(), self._ultimo_cambio, True
+            while mas:
+                filas, token, mas = feed.leer_cambios(cur, token, LOTE)
+                cambiadas.update(int(_campo(r, "id", 0)) for r in filas)
+            meta = self._leer_meta(cur, cambiadas) if cambiadas else {}
+            V, sids, nfs = self._leer_todo(cur, set(meta)) if meta else (np.zeros((0, RASGOS)), [], [])
+            with self._lock:
+                indexadas = list(self._meta)
+            cur.execute("SELECT id FROM secuencias WHERE id = ANY(%s)", (indexadas,))
+            existentes = {int(_campo(r, "id", 0)) for r in cur.fetchall()}
+        copia = None
+        with self._lock:
+            for sid in cambiadas | (set(indexadas) - existentes):
+                self._quitar_secuencia(sid)
+            self._meta.update(meta)
+            self._agregar(V, sids, nfs)
+            self._ultimo_cambio = token
+            if self._n >= max(min(PCA_MIN, IVF_MIN), 2 * self._entrenado_con):
+                vivas = np.flatnonzero(self._activo[:self._n])
+                copia = (self._X[vivas], self._sec[vivas], self._nf[vivas], self._cat[vivas])
+        if copia is not None:
+            # Las consultas siguen con el modelo anterior mientras tanto; como solo
+            # este hilo modifica el índice, la copia sigue al día al instalarla
+            modelo = self._entrenar(*copia)
+            with self._lock:
+                self._instalar(modelo)
+
+    # -- consulta -------------------------------------------------------------
+    def _candidatas(self, q: np.ndarray) -> np.ndarray:
+        if self._centros is None:
+            return np.arange(self._n)
+        sondas = np.argsort(((self._centros - q) ** 2).sum(1))[:NPROBE]
+        partes = []
+        for c in sondas.tolist():
+            if self._cache[c] is None:
+                self._cache[c] = np.asarray(self._miembros[c], dtype=np.int64)
+            partes.append(self._cache[c])
+        return np.concatenate(partes) if partes else np.zeros(0, dtype=np.int64)
+
+    def buscar(self, mano: np.ndarray, izquierda: bool = False, k: int = 5, categoria: str = None) -> dict:
+        """
+        mano: (21, 3) en cualquier sistema de coordenadas (se normaliza aquí).
+        Las k secuencias más cercanas (mejor frame de cada una) y los votos por
+        subcategoria (la letra / el número).
+        """
+        v = vectores([mano], [izquierda])
+        with self._lock:
+            # Con el lock: PCA y matriz cambian juntas al instalar un entrenamiento
+            q = self._reducir(v)[0]
+            filas = self._candidatas(q)
+            validas = self._activo[filas]
+            if categoria:
+                validas &= self._cat[filas] == CATEGORIAS.index(categoria)
+            filas = filas[validas]
+            d = ((self._X[filas] - q) ** 2).sum(1)
+            sec, nf = self._sec[filas], self._nf[filas]
+            meta = self._meta
+            exploradas = len(d)
+            # Varios frames por secuencia: se toma su mejor frame
+            orden = np.argsort(d, kind="stable")
+            _, primeras = np.unique(sec[orden], return_index=True)
+            mejores = orden[np.sort(primeras)][:k]
+            resultados = []
+            for i in mejores.tolist():
+                slug, subcategoria, nombre = meta.get(int(sec[i]), (None, None, None))
+                resultados.append({"secuencia_id": int(sec[i]), "num_frame": int(nf[i]), "nombre": nombre,
+                                   "categoria_slug": slug, "subcategoria": subcategoria,
+                                   "distancia": round(float(np.sqrt(d[i])), 5)})
+        votos = {}
+        for r in resultados:
+            v = votos.setdefault(r["subcategoria"], {"subcategoria": r["subcategoria"], "votos": 0,
+                                                     "distancia_min": r["distancia"]})
+            v["votos"] += 1
+        return {"resultados": resultados, "exploradas": exploradas,
+                "votos": sorted(votos.values(), key=lambda v: (-v["votos"], v["distancia_min"]))}
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "listo": self.listo,
+                "error": self.error,
+                "manos": int(self._activo[:self._n].sum()),
+                "secuencias": len(self._meta),
+                "dim": int(self._X.shape[1]),
+                "pca_varianza": None if self._varianza is None else round(self._varianza, 4),
+                "listas": 0 if self._centros is None else len(self._centros),
+                "modo": "ivf" if self._centros is not None else "exhaustivo",
+                "ultimo_cambio": self._ultimo_cambio,
+            }
+
+
+indice = IndiceHandshape()
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def iniciar():
+    """Arranca (una vez por proceso) el hilo que carga y mantiene el índice."""
+    global _hilo
+    with _hilo_lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="indice-handshape", daemon=True)
+            _hilo.start()
+
+
+def _bucle():
+    while not indice.listo:
+        try:
+            indice.cargar()
+            indice.error = None
+        except Exception as e:
+            indice.error = str(e)
+            print("❌ handshape: falló la carga del índice:", e)
+            time.sleep(REFRESCO_S * 6)
+    while True:
+        time.sleep(REFRESCO_S)
+        try:
+            indice.refrescar()
+        except Exception as e:
+            print("❌ handshape: falló el refresco:", e)
@@ -0,0 +1,128 @@
+# backend/procesamiento/lote.py
+"""
+Extracción multimodal de muchos videos en un pool de procesos acotado.
+
+Cada video se procesa entero en un proceso hijo (`extraer_archivo`): decodifica,
+ejecuta MediaPipe y normaliza la secuencia completa, y devuelve los payloads de
+sus frames. El proceso padre (la ruta /api/subir_lote) es el único que habla
+con la BD, así que los hijos no heredan conexiones ni hilos del worker.
+
+- LOTE_PROCESOS: tamaño del pool (por defecto nº de CPUs - 1, mínimo 1).
+- Los hijos se crean con "spawn" (el worker de gunicorn tiene hilos y hacer
+  fork con hilos vivos puede heredar locks tomados) y se reutilizan entre
+  peticiones: cargar mediapipe y los modelos se paga una vez por hijo.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+
+PROCESOS = int(os.environ.get("LOTE_PROCESOS", "0") or 0) or max(1, (os.cpu_count() or 2) - 1)
+
+_pool = None
+_lock = threading.Lock()
+
+
+def pool():
+    """ProcessPoolExecutor compartido por el worker (se crea en el primer uso)."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            _pool = ProcessPoolExecutor(max_workers=PROCESOS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def cerrar():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(cerrar)
+
+
+def extraer_archivo(ruta: str, opciones: dict) -> dict:
+    """
+    Extrae un video (en un proceso hijo del pool) y devuelve
+    {"frames": [(num_frame, payload, crudos)], "detecciones", "duracion_segundos",
+     "muestreo", "recorte", "presupuesto", "perf"}. Las excepciones llegan al padre vía el Future.
+
+    opciones: modalidades (tupla), cara (nombre), cara_puntos, muestreo (dict),
+    max_lado, recortar, model_complexity (opcional).
+    También se usa en el propio worker para reprocesar (procesamiento/calidad.py).
+    """
+    import multiprocessing
+    import cv2
+    from procesamiento import modalidades as mods
+    from procesamiento.cara import indices_crudos
+    from procesamiento.normalizacion import normalizar_multimodal, a_crudos
+    from procesamiento.perf import Cronometro
+    from procesamiento.recorte import intervalo_activo
+    from procesamiento.video import frames, duracion_s, con_presupuesto, MAX_DURACION_S
+
+    if multiprocessing.parent_process() is not None:
+        cv2.setNumThreads(1)  # en el pool el paralelismo lo dan los procesos, no OpenCV
+    modalidades = tuple(opciones["modalidades"])
+    cron = Cronometro()
+    cap = cv2.VideoCapture(ruta)
+    try:
+        if not cap.isOpened():
+            raise RuntimeError("No se pudo abrir el video")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if duracion_s(cap, fps) > MAX_DURACION_S:
+            raise RuntimeError(f"Video demasiado largo (máx. {MAX_DURACION_S:.0f} s)")
+        recorte = None
+        if opciones.get("recortar"):
+            with cron.medir("recorte"):
+                recorte = intervalo_activo(ruta, fps)
+        stats_muestreo = {}
+        presupuesto = {}
+        detecciones = {"pose": 0, "face": 0, "hands": 0}
+        capturados = []   # (num_frame, meta, crudo)
+        with mods.extractor(modalidades, opciones.get("model_complexity")) as procesar:
+            for idx, t_s, rgb in con_presupuesto(frames(cap, fps, opciones["muestreo"], opciones.get("max_lado", 0),
+                                                        stats=stats_muestreo, recorte=recorte, perf=cron),
+                                                 presupuesto):
+                with cron.medir("mediapipe"):
+                    crudo = procesar(rgb)
+                if "pose" in crudo:
+                    detecciones["pose"] += 1
+                if "face" in crudo:
+                    detecciones["face"] += 1
+                if "left_hand" in crudo or "right_hand" in crudo:
+                    detecciones["hands"] += 1
+                if crudo:
+                    capturados.append((idx, {"t_s": t_s, "fps_native": float(fps),
+                                             "modalidades": list(modalidades),
+                                             "cara": opciones.get("cara")}, crudo))
+        try:
+            duracion = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        except Exception:
+            duracion = 0.0
+    finally:
+        cap.release()
+
+    # La secuencia entera se normaliza en un solo lote por modalidad
+    with cron.medir("normalizar"):
+        payloads = normalizar_multimodal([c for _, _, c in capturados], opciones.get("cara_puntos"))
+        cara_crudos = indices_crudos(opciones.get("cara_puntos"))
+        for (_, meta, _), payload in zip(capturados, payloads):
+            payload["meta"] = meta
+        frames_guardar = [(nf, payload, a_crudos(crudo, cara_crudos))
+                          for (nf, _, crudo), payload in zip(capturados, payloads)]
+    return {
+        "frames": frames_guardar,
+        "detecciones": detecciones,
+        "duracion_segundos": round(float(duracion), 2),
+        "muestreo": stats_muestreo,
+        "recorte": recorte or {"aplicado": False},
+        "presupuesto": presupuesto,
+        "perf": cron.resumen(frames=len(cron.muestras.get("mediapipe", ()))),
+    }
@@ -0,0 +1,168 @@
+# backend/procesamiento/modalidades.py
+"""
+Selección de modalidades para la extracción multimodal.
+
+Cada modalidad pedida decide qué modelos se ejecutan:
+  - con "face"               -> Holistic (cara refinada, pose y manos)
+  - con "pose" y sin "face"  -> Pose (+ Hands si se piden manos), sin malla facial
+  - solo manos               -> Hands (dos manos)
+
+Valores aceptados en el form `modalidades`: un preset ("manos", "manos_pose",
+"completo") o una lista "pose,face,manos" (también left_hand / right_hand).
+Sin valor se usa `categorias.modalidades` y, si está vacío, el preset por
+defecto del slug (`POR_CATEGORIA`); lo demás va a "completo".
+
+    with extractor(modalidades) as procesar:
+        crudo = procesar(rgb)   # {modalidad: array (K, 3)} solo con lo detectado
+
+Importa numpy (vía normalizacion): las rutas lo cargan dentro del handler.
+"""
+from __future__ import annotations
+
+from contextlib import ExitStack, contextmanager
+
+from procesamiento.detectores import (detectores, CONFIG_HOLISTIC, CONFIG_MANOS_DOS, CONFIG_POSE)
+from procesamiento.normalizacion import MODALIDADES, a_array
+
+MANOS = ("left_hand", "right_hand")
+
+PRESETS = {
+    "manos": MANOS,
+    "manos_pose": ("pose",) + MANOS,
+    "completo": MODALIDADES,
+}
+
+POR_CATEGORIA = {
+    "letra": "manos",
+    "numero": "manos",
+    "palabra": "manos_pose",
+    "saludo": "manos_pose",
+    "expresion_facial": "completo",
+}
+
+_ALIAS = {"manos": MANOS, "hands": MANOS, "mano": MANOS, "cara": ("face",)}
+
+# Muñecas en la pose de MediaPipe (izquierda / derecha del sujeto)
+_MUNECA_POSE = {"left_hand": 15, "right_hand": 16}
+
+
+def parsear(valor):
+    """Preset o lista separada por comas -> tupla ordenada de modalidades, o None si no vale."""
+    if not valor:
+        return None
+    valor = str(valor).strip().lower()
+    if valor in PRESETS:
+        return PRESETS[valor]
+    elegidas = set()
+    for parte in valor.split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if parte in _ALIAS:
+            elegidas.update(_ALIAS[parte])
+        elif parte in MODALIDADES:
+            elegidas.add(parte)
+        else:
+            return None
+    # Una mano suelta implica las dos: el detector no elige lado
+    if elegidas & set(MANOS):
+        elegidas.update(MANOS)
+    return tuple(m for m in MODALIDADES if m in elegidas) or None
+
+
+def por_defecto(categoria_slug=None, configuradas=None):
+    """Modalidades de la categoría (columna categorias.modalidades) o del preset del slug."""
+    return (parsear(configuradas)
+            or PRESETS[POR_CATEGORIA.get(categoria_slug or "", "completo")])
+
+
+def nombre_extractor(modalidades) -> str:
+    if "face" in modalidades:
+        return "holistic"
+    if "pose" in modalidades:
+        return "pose_hands"
+    return "hands"
+
+
+def _lado_por_etiqueta(etiqueta: str) -> str:
+    # Hands etiqueta suponiendo imagen espejada (selfie); un video sin espejar
+    # tiene los lados invertidos respecto al sujeto (que es lo que da Holistic).
+    return "right_hand" if etiqueta == "Left" else "left_hand"
+
+
+def _manos(res, pose=None) -> dict:
+    """Resultado de Hands -> {left_hand/right_hand: array}. Con pose, cada mano va a la muñeca más cercana."""
+    salida = {}
+    if not res.multi_hand_landmarks:
+        return salida
+    etiquetas = getattr(res, "multi_handedness", None) or []
+    for i, lms in enumerate(res.multi_hand_landmarks):
+        arr = a_array(lms.landmark)
+        if pose is not None and len(pose) > 16:
+            muneca = arr[0, :2]
+            lado = min(_MUNECA_POSE, key=lambda m: float(((pose[_MUNECA_POSE[m], :2] - muneca) ** 2).sum()))
+        elif i < len(etiquetas):
+            lado = _lado_por_etiqueta(etiquetas[i].classification[0].label)
+        else:
+            lado = MANOS[i % 2]
+        if lado in salida:
+            lado = MANOS[1] if lado == MANOS[0] else MANOS[0]
+        salida[lado] = arr
+    return salida
+
+
+def _con_complejidad(config: dict, complejidad) -> dict:
+    """Copia de `config` con otro model_complexity (Hands solo admite 0/1)."""
+    if complejidad is None:
+        return config
+    tope = 1 if config is CONFIG_MANOS_DOS else 2
+    return dict(config, model_complexity=max(0, min(int(complejidad), tope)))
+
+
+@contextmanager
+def extractor(modalidades, complejidad=None):
+    """
+    Presta del pool los detectores necesarios y entrega procesar(rgb) -> crudo.
+    complejidad: model_complexity a usar (None = la de la configuración por defecto).
+    """
+    tipo = nombre_extractor(modalidades)
+    with ExitStack() as pila:
+        if tipo == "holistic":
+            holistic = pila.enter_context(detectores.prestar(
+                "holistic", **_con_complejidad(CONFIG_HOLISTIC, complejidad)))
+
+            def procesar(rgb):
+                res = holistic.process(rgb)
+                crudo = {}
+                for modalidad, lms in (("pose", res.pose_landmarks),
+                                       ("face", res.face_landmarks),
+                                       ("left_hand", res.left_hand_landmarks),
+                                       ("right_hand", res.right_hand_landmarks)):
+                    if lms and modalidad in modalidades:
+                        crudo[modalidad] = a_array(lms.landmark)
+                return crudo
+
+        elif tipo == "pose_hands":
+            pose = pila.enter_context(detectores.prestar("pose", **_con_complejidad(CONFIG_POSE, complejidad)))
+            hands = None
+            if MANOS[0] in modalidades:
+                hands = pila.enter_context(detectores.prestar(
+                    "hands", **_con_complejidad(CONFIG_MANOS_DOS, complejidad)))
+
+            def procesar(rgb):
+                crudo = {}
+                res_pose = pose.process(rgb)
+                if res_pose.pose_landmarks:
+                    crudo["pose"] = a_array(res_pose.pose_landmarks.landmark)
+                if hands is not None:
+                    crudo.update(_manos(hands.process(rgb), crudo.get("pose")))
+                return crudo
+
+        else:
+            hands = pila.enter_context(detectores.prestar(
+                "hands", **_con_complejidad(CONFIG_MANOS_DOS, complejidad)))
+
+            def procesar(rgb):
+                return _manos(hands.process(rgb))
+
+        yield procesar
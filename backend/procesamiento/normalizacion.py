@@ -0,0 +1,215 @@
+# backend/procesamiento/normalizacion.py
+"""
+Normalización de landmarks en lote.
+
+Todas las funciones trabajan sobre arrays float32 de forma (T, K, 3): T frames
+de una secuencia (o de un trozo) con K puntos (x, y, z). El centrado, la escala
+y la rotación se aplican con broadcasting sobre todos los frames a la vez y la
+conversión a JSON (`a_dicts`) se hace una sola vez al final, en vez de
+array -> lista de dicts por cada frame.
+
+Criterios (los mismos que se usaban frame a frame):
+  - mano (21): centro en la muñeca (0), escala |0->9| (palma), rota 0->5 al eje X
+  - pose (33): centro en la cadera media (23, 24), escala por ancho de hombros
+    (11-12, en xy), rota la línea de hombros al eje X
+  - cara (468/478): centro en la nariz (0), escala inter-ocular (33-263, en xy), sin rotación
+Si la referencia de escala es ~0 se usa la norma de todo el frame; si también
+es ~0 el frame solo se centra.
+
+Junto a cada frame normalizado se guardan sus landmarks crudos (coordenadas de
+imagen, `frames.crudos`) y la versión de estos criterios (`frames.norm_version`).
+Al cambiar cualquier criterio hay que subir NORMALIZACION_VERSION y ejecutar
+`python -m procesamiento.renormalizacion`, que recalcula los frames desde los
+crudos sin volver a decodificar ni pasar MediaPipe.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+_EPS = 1e-6
+
+NORMALIZACION_VERSION = 1
+DECIMALES_CRUDOS = 5   # coordenadas de imagen en [0, 1]: 1e-5 es menos de un píxel
+LADO_MALLA = 468
+
+
+def a_array(landmarks) -> np.ndarray:
+    """Landmarks de MediaPipe (objetos con .x .y .z) o dicts -> array (K, 3) float32."""
+    if not landmarks:
+        return np.zeros((0, 3), dtype=np.float32)
+    if isinstance(landmarks[0], dict):
+        return np.array([(p["x"], p["y"], p.get("z", 0.0)) for p in landmarks], dtype=np.float32)
+    return np.array([(p.x, p.y, getattr(p, "z", 0.0)) for p in landmarks], dtype=np.float32)
+
+
+def apilar(frames: Iterable[np.ndarray]) -> np.ndarray:
+    """Lista de arrays (K, 3) con el mismo K -> (T, K, 3) float32."""
+    frames = list(frames)
+    if not frames:
+        return np.zeros((0, 0, 3), dtype=np.float32)
+    return np.stack(frames).astype(np.float32, copy=False)
+
+
+def a_dicts(arr: np.ndarray) -> List[List[Dict[str, float]]]:
+    """(T, K, 3) -> [[{"x","y","z"}, ...], ...] (una lista de puntos por frame)."""
+    return [[{"x": x, "y": y, "z": z} for x, y, z in frame] for frame in arr.tolist()]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Piezas comunes (broadcast sobre T)
+# ──────────────────────────────────────────────────────────────────────────────
+def _escalar(arr: np.ndarray, escala: np.ndarray, respaldo: np.ndarray) -> np.ndarray:
+    """Divide cada frame por su escala (T,), usando `respaldo` donde escala ~ 0."""
+    escala = np.where(escala > _EPS, escala, respaldo)
+    escala = np.where(escala > _EPS, escala, 1.0).astype(np.float32)
+    return arr / escala[:, None, None]
+
+
+def _rotar_al_eje_x(arr: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Rota (en xy) cada frame para que su vector v (T, 2) quede sobre +X."""
+    ang = np.arctan2(v[:, 1], v[:, 0])
+    c = np.cos(-ang).astype(np.float32)[:, None]
+    s = np.sin(-ang).astype(np.float32)[:, None]
+    x, y = arr[..., 0].copy(), arr[..., 1].copy()
+    arr[..., 0] = c * x - s * y
+    arr[..., 1] = s * x + c * y
+    return arr
+
+
+def _norma_frame(arr: np.ndarray) -> np.ndarray:
+    """Norma L2 de todos los puntos de cada frame -> (T,)."""
+    return np.sqrt(np.einsum("tkd,tkd->t", arr, arr))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Por modalidad
+# ──────────────────────────────────────────────────────────────────────────────
+def normalizar_manos(arr: np.ndarray) -> np.ndarray:
+    """(T, 21, 3) -> (T, 21, 3). Con menos de 21 puntos se devuelve igual."""
+    if arr.ndim != 3 or arr.shape[0] == 0 or arr.shape[1] < 21:
+        return arr
+    arr = arr - arr[:, 0:1, :]
+    arr = _escalar(arr, np.linalg.norm(arr[:, 9, :], axis=1), _norma_frame(arr))
+    return _rotar_al_eje_x(arr, arr[:, 5, :2])
+
+
+def normalizar_poses(arr: np.ndarray) -> np.ndarray:
+    """(T, 33, 3) -> (T, 33, 3). Con menos de 25 puntos (sin caderas) se devuelve igual."""
+    if arr.ndim != 3 or arr.shape[0] == 0 or arr.shape[1] < 25:
+        return arr
+    arr = arr - (arr[:, 23:24, :] + arr[:, 24:25, :]) / 2.0
+    hombros = arr[:, 12, :2] - arr[:, 11, :2]
+    arr = _escalar(arr, np.linalg.norm(hombros, axis=1), _norma_frame(arr[..., :2]))
+    return _rotar_al_eje_x(arr, hombros)
+
+
+def normalizar_caras(arr: np.ndarray) -> np.ndarray:
+    """(T, K, 3) -> (T, K, 3). Sin los puntos 33/263 escala por la norma xy del frame."""
+    if arr.ndim != 3 or arr.shape[0] == 0 or arr.shape[1] == 0:
+        return arr
+    arr = arr - arr[:, 0:1, :]
+    respaldo = _norma_frame(arr[..., :2])
+    if arr.shape[1] > 263:
+        escala = np.linalg.norm(arr[:, 263, :2] - arr[:, 33, :2], axis=1)
+    else:
+        escala = respaldo
+    return _escalar(arr, escala, respaldo)
+
+
+NORMALIZADORES = {
+    "pose": normalizar_poses,
+    "face": normalizar_caras,
+    "left_hand": normalizar_manos,
+    "right_hand": normalizar_manos,
+}
+
+
+def normalizar_lista(arrays: List[np.ndarray], modalidad: str, puntos=None) -> List[List[Dict[str, float]]]:
+    """
+    Normaliza una lista de frames (K, 3) de una modalidad y devuelve la lista de
+    dicts de cada uno, en el mismo orden. Los frames con el mismo K se procesan
+    juntos (la cara puede venir con 468 o 478 puntos).
+    `puntos`: índices a conservar tras normalizar (subconjunto de cara, ver cara.py).
+    ValueError si algún frame no tiene todos esos puntos: guardar la malla entera
+    dejaría las posiciones desalineadas con secuencias.cara_indices.
+    """
+    fn = NORMALIZADORES[modalidad]
+    salida: List[List[Dict[str, float]]] = [[] for _ in arrays]
+    grupos: Dict[int, List[int]] = {}
+    for i, a in enumerate(arrays):
+        grupos.setdefault(a.shape[0], []).append(i)
+    for indices in grupos.values():
+        normalizados = fn(apilar(arrays[i] for i in indices))
+        if puntos is not None:
+            if normalizados.shape[1] <= max(puntos):
+                raise ValueError(f"{modalidad}: {normalizados.shape[1]} puntos por frame, el subconjunto "
+                                 f"necesita {max(puntos) + 1} (índices de cara_indices desalineados)")
+            normalizados = normalizados[:, list(puntos), :]
+        for i, pts in zip(indices, a_dicts(normalizados)):
+            salida[i] = pts
+    return salida
+
+
+MODALIDADES = ("pose", "face", "left_hand", "right_hand")
+
+
+def normalizar_multimodal(frames: List[Dict[str, np.ndarray]], puntos_cara=None) -> List[Dict[str, list]]:
+    """
+    frames: [{modalidad: array (K, 3)}, ...] (solo las modalidades detectadas).
+    Devuelve [{"pose": [...], "face": [...], "left_hand": [...], "right_hand": [...]}, ...]
+    con [] en las modalidades ausentes; cada modalidad se normaliza en lote.
+    `puntos_cara`: índices de la malla facial a guardar (None = todos).
+    """
+    salida = [{m: [] for m in MODALIDADES} for _ in frames]
+    for modalidad in MODALIDADES:
+        posiciones = [i for i, f in enumerate(frames) if modalidad in f]
+        if not posiciones:
+            continue
+        normalizados = normalizar_lista([frames[i][modalidad] for i in posiciones], modalidad,
+                                        puntos_cara if modalidad == "face" else None)
+        for i, pts in zip(posiciones, normalizados):
+            salida[i][modalidad] = pts
+    return salida
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Landmarks crudos (frames.crudos)
+# ──────────────────────────────────────────────────────────────────────────────
+def _a_lista(arr: np.ndarray) -> list:
+    return np.round(arr.astype(np.float64), DECIMALES_CRUDOS).tolist()
+
+
+def a_crudos(frame: Dict[str, np.ndarray], indices_cara=None) -> Dict[str, list]:
+    """
+    {modalidad: array (K, 3)} en coordenadas de imagen -> {modalidad: [[x, y, z], ...]}.
+    `indices_cara`: puntos de la malla a guardar (cara.indices_crudos; None = todos).
+    """
+    salida = {}
+    for modalidad, arr in frame.items():
+        if modalidad == "face" and indices_cara is not None and arr.shape[0] > max(indices_cara):
+            arr = arr[list(indices_cara)]
+        salida[modalidad] = _a_lista(arr)
+    return salida
+
+
+def crudos_mano(arr: np.ndarray) -> Dict[str, list]:
+    """Mano (21, 3) de /subir_video -> valor de frames.crudos."""
+    return {"mano": _a_lista(arr)}
+
+
+def desde_crudos(crudos: Dict[str, list], indices_cara=None) -> Dict[str, np.ndarray]:
+    """
+    Inversa de a_crudos. Una cara parcial se recoloca en una malla de 468 puntos
+    (ceros fuera de `indices_cara`), que es lo que espera normalizar_caras.
+    """
+    frame = {}
+    for modalidad, pts in crudos.items():
+        arr = np.asarray(pts, dtype=np.float32).reshape(-1, 3)
+        if modalidad == "face" and indices_cara is not None and len(indices_cara) == arr.shape[0]:
+            malla = np.zeros((max(LADO_MALLA, max(indices_cara) + 1), 3), dtype=np.float32)
+            malla[list(indices_cara)] = arr
+            arr = malla
+        frame[modalidad] = arr
+    return frame
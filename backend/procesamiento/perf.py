@@ -0,0 +1,141 @@
+# backend/procesamiento/perf.py
+"""
+Tiempos por etapa de las extracciones de video.
+
+Cada subida lleva un `Cronometro`; las piezas del pipeline suman en él lo que
+tarda cada llamada de su etapa:
+
+  decodificar  cap.read()/grab() hasta el frame muestreado (video.py)
+  movimiento   diferencia de frames del muestreo adaptativo (video.py)
+  convertir    resize + cvtColor a RGB (video.py / ROI de subir_video)
+  mediapipe    process() del detector
+  normalizar   normalización vectorizada del lote
+  serializar   json.dumps de landmarks/crudos (bd/frames.py)
+  bd           INSERT + versión + COMMIT (bd/spool.py); spool si la BD cae
+  recorte      pre-pasada de recorte (recorte.py)
+
+`resumen()` da por etapa el total, nº de llamadas y percentiles (ms), y va en
+la respuesta como "perf". Al terminar, `registro.agregar(ruta, cron)` lo
+acumula en el proceso (ventana de las últimas MUESTRAS llamadas por etapa),
+que sirve GET /api/metrics/perf.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+MUESTRAS = int(os.environ.get("PERF_MUESTRAS", "2048") or 2048)
+
+
+def _percentil(ordenados, q: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(q * (len(ordenados) - 1))))]
+
+
+def _resumir(muestras) -> dict:
+    """Lista de duraciones (s) -> {total_s, n, p50_ms, p95_ms, p99_ms, max_ms}."""
+    ordenados = sorted(muestras)
+    return {
+        "total_s": round(sum(ordenados), 3),
+        "n": len(ordenados),
+        "p50_ms": round(_percentil(ordenados, 0.50) * 1000, 2),
+        "p95_ms": round(_percentil(ordenados, 0.95) * 1000, 2),
+        "p99_ms": round(_percentil(ordenados, 0.99) * 1000, 2),
+        "max_ms": round((ordenados[-1] if ordenados else 0.0) * 1000, 2),
+    }
+
+
+class Cronometro:
+    """Duraciones por etapa de una extracción. Lo usan a la vez los hilos del pipeline."""
+
+    def __init__(self, muestras: dict = None):
+        self._lock = threading.Lock()
+        self.muestras = {k: list(v) for k, v in (muestras or {}).items()}
+        self.t0 = time.perf_counter()
+
+    def sumar(self, etapa: str, segundos: float):
+        with self._lock:
+            self.muestras.setdefault(etapa, []).append(segundos)
+
+    @contextmanager
+    def medir(self, etapa: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(etapa, time.perf_counter() - t0)
+
+    def resumen(self, **extra) -> dict:
+        with self._lock:
+            etapas = {k: _resumir(v) for k, v in self.muestras.items()}
+        return {"total_s": round(time.perf_counter() - self.t0, 3), "etapas": etapas, **extra}
+
+    def linea(self) -> str:
+        """Resumen de una línea para el log: etapa=total_s, de la más cara a la más barata."""
+        with self._lock:
+            totales = sorted(((k, sum(v)) for k, v in self.muestras.items()), key=lambda kv: -kv[1])
+        return " ".join(f"{k}={s:.2f}s" for k, s in totales)
+
+
+def medir(perf, etapa: str):
+    """`perf.medir(etapa)` o un contexto vacío si no hay cronómetro."""
+    return nullcontext() if perf is None else perf.medir(etapa)
+
+
+class Registro:
+    """Agregado del proceso por ruta y etapa (ventana deslizante de llamadas)."""
+
+    def __init__(self, muestras: int = MUESTRAS):
+        self._lock = threading.Lock()
+        self._max = muestras
+        self._rutas = {}
+
+    def agregar(self, ruta: str, cron: Cronometro, total_s: float = None):
+        with cron._lock:
+            muestras = {k: list(v) for k, v in cron.muestras.items()}
+        total_s = time.perf_counter() - cron.t0 if total_s is None else total_s
+        with self._lock:
+            r = self._rutas.setdefault(ruta, {"peticiones": 0, "total": deque(maxlen=self._max),
+                                              "etapas": {}, "acumulado_s": {}})
+            r["peticiones"] += 1
+            r["total"].append(total_s)
+            for etapa, valores in muestras.items():
+                r["etapas"].setdefault(etapa, deque(maxlen=self._max)).extend(valores)
+                r["acumulado_s"][etapa] = r["acumulado_s"].get(etapa, 0.0) + sum(valores)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            copia = {ruta: (r["peticiones"], list(r["total"]), {k: list(v) for k, v in r["etapas"].items()},
+                            dict(r["acumulado_s"]))
+                     for ruta, r in self._rutas.items()}
+        salida = {}
+        for ruta, (peticiones, totales, etapas, acumulado) in copia.items():
+            salida[ruta] = {
+                "peticiones": peticiones,
+                "peticion": _resumir(totales),
+                "etapas": {k: dict(_resumir(v), acumulado_s=round(acumulado.get(k, 0.0), 3))
+                           for k, v in etapas.items()},
+            }
+        return {"pid": os.getpid(), "ventana": self._max, "rutas": salida}
+
+
+registro = Registro()
+
+
+def finalizar(ruta: str, cron: Cronometro, etapas: dict = None, etiqueta: str = "") -> dict:
+    """
+    Cierra una extracción: la acumula en `registro`, deja una línea en el log y
+    devuelve el "perf" de la respuesta. `etapas` es lo que devuelve
+    ejecutar_etapas (tiempo ocupado de cada hilo del pipeline).
+    """
+    etapas = etapas or {}
+    resumen = cron.resumen(frames=etapas.get("items", 0),
+                           hilos={k: etapas[k] for k in ("decodificar_s", "inferir_s", "persistir_s")
+                                  if k in etapas})
+    registro.agregar(ruta, cron, resumen["total_s"])
+    print(f"⏱️ {ruta}{etiqueta}: {resumen['frames']} frames en {resumen['total_s']:.2f}s · {cron.linea()}")
+    return resumen
@@ -0,0 +1,121 @@
+# backend/procesamiento/pipeline.py
+"""
+Ejecución en tres etapas con colas acotadas: decodificar -> inferir -> persistir.
+
+    stats = ejecutar_etapas(producir, inferir, persistir, al_terminar=volcar)
+
+- `producir()` (hilo propio) genera los items de entrada, p.ej. frames RGB.
+- `inferir(item)` corre en el hilo que llama (el detector MediaPipe se usa
+  siempre desde el mismo hilo); devuelve un resultado o None para descartarlo.
+- `persistir(resultado)` (hilo propio) acumula/escribe; `al_terminar()` se
+  llama en ese hilo tras el último resultado, solo si nada falló.
+
+OpenCV y psycopg2 sueltan el GIL durante la decodificación y la E/S, así que
+las tres etapas se solapan y el tiempo total tiende al de la más lenta.
+Las colas (CAPACIDAD) hacen de backpressure: si la BD va lenta la inferencia
+se frena y, tras ella, la decodificación, sin acumular frames en memoria.
+Cualquier excepción cancela las demás etapas y se relanza en el hilo que llama.
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+
+CAPACIDAD = int(os.environ.get("PIPELINE_CAPACIDAD", "8") or 8)
+
+_FIN = object()
+_ESPERA_S = 0.1
+
+
+def ejecutar_etapas(producir, inferir, persistir, al_terminar=None, capacidad: int = CAPACIDAD) -> dict:
+    """Ejecuta las tres etapas y devuelve tiempos ocupados por etapa (s) y nº de items."""
+    cancelado = threading.Event()
+    errores = []
+    entrada = queue.Queue(maxsize=max(1, capacidad))
+    salida = queue.Queue(maxsize=max(1, capacidad))
+    stats = {"decodificar_s": 0.0, "inferir_s": 0.0, "persistir_s": 0.0,
+             "items": 0, "resultados": 0}
+
+    def _fallo(e):
+        errores.append(e)
+        cancelado.set()
+
+    def _poner(q, item) -> bool:
+        while not cancelado.is_set():
+            try:
+                q.put(item, timeout=_ESPERA_S)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _tomar(q):
+        while not cancelado.is_set():
+            try:
+                return q.get(timeout=_ESPERA_S)
+            except queue.Empty:
+                continue
+        return _FIN
+
+    def _decodificar():
+        try:
+            it = iter(producir())
+            while True:
+                t0 = time.perf_counter()
+                item = next(it, _FIN)
+                stats["decodificar_s"] += time.perf_counter() - t0
+                if item is _FIN or not _poner(entrada, item):
+                    break
+                stats["items"] += 1
+        except BaseException as e:
+            _fallo(e)
+        finally:
+            _poner(entrada, _FIN)
+
+    def _persistir():
+        try:
+            while True:
+                res = _tomar(salida)
+                if res is _FIN:
+                    break
+                t0 = time.perf_counter()
+                persistir(res)
+                stats["persistir_s"] += time.perf_counter() - t0
+            if al_terminar is not None and not cancelado.is_set():
+                t0 = time.perf_counter()
+                al_terminar()
+                stats["persistir_s"] += time.perf_counter() - t0
+        except BaseException as e:
+            _fallo(e)
+
+    t_total = time.perf_counter()
+    hilo_dec = threading.Thread(target=_decodificar, name="pipeline-decodificar", daemon=True)
+    hilo_per = threading.Thread(target=_persistir, name="pipeline-persistir", daemon=True)
+    hilo_dec.start()
+    hilo_per.start()
+    try:
+        while True:
+            item = _tomar(entrada)
+            if item is _FIN:
+                break
+            t0 = time.perf_counter()
+            res = inferir(item)
+            stats["inferir_s"] += time.perf_counter() - t0
+            if res is None:
+                continue
+            stats["resultados"] += 1
+            if not _poner(salida, res):
+                break
+    except BaseException as e:
+        _fallo(e)
+    finally:
+        _poner(salida, _FIN)
+        hilo_dec.join()
+        hilo_per.join()
+
+    if errores:
+        raise errores[0]
+    stats["total_s"] = time.perf_counter() - t_total
+    return {k: (round(v, 3) if isinstance(v, float) else v) for k, v in stats.items()}
@@ -0,0 +1,102 @@
+# backend/procesamiento/recorte.py
+"""
+Pre-pasada rápida que busca el intervalo con actividad (manos a la vista).
+
+Las grabaciones suelen empezar y terminar con segundos sin signar. Antes de la
+extracción completa se mira si hay mano cada PASO_S segundos, a LADO_PX y con
+Hands ligero (model_complexity=0, imagen estática):
+  - hacia delante desde el inicio hasta la primera mano;
+  - hacia atrás desde el final (con seeks) hasta la última.
+Solo se decodifica lo que queda fuera del intervalo. Se añade un paso más
+MARGEN_S a cada lado para no comerse el arranque del signo.
+
+Si no aparece ninguna mano no se recorta (el video se procesa entero).
+"""
+from __future__ import annotations
+
+import os
+
+from procesamiento.detectores import detectores
+from procesamiento.video import a_rgb, frames_muestreados
+
+RECORTE = os.environ.get("VIDEO_RECORTE", "1") != "0"
+PASO_S = float(os.environ.get("VIDEO_RECORTE_PASO_S", "0.33") or 0.33)
+MARGEN_S = float(os.environ.get("VIDEO_RECORTE_MARGEN_S", "0.3") or 0.3)
+LADO_PX = 256
+
+CONFIG_PRESENCIA = dict(static_image_mode=True, max_num_hands=2, model_complexity=0,
+                        min_detection_confidence=0.5)
+
+
+def _ultima_mano(cap, hay_mano, total: int, primero: int, paso: int):
+    """Frame de la última mano buscando hacia atrás; None si el backend no permite seek."""
+    import cv2
+
+    pos = total - 1
+    while pos > primero:
+        if not cap.set(cv2.CAP_PROP_POS_FRAMES, pos):
+            return None
+        ok, frame = cap.read()
+        if ok and hay_mano(a_rgb(frame, LADO_PX)):
+            return pos
+        pos -= paso
+    return primero
+
+
+def intervalo_activo(ruta: str, fps: float, paso_s: float = PASO_S, margen_s: float = MARGEN_S):
+    """
+    Devuelve {aplicado, inicio_frame, fin_frame, inicio_s, fin_s, recortado_s, pre_s}
+    o None si no hay mano en todo el video (o la pre-pasada falla: no bloquea la subida).
+    """
+    try:
+        return _intervalo(ruta, fps, paso_s, margen_s)
+    except Exception as e:
+        print("⚠️ Recorte: pre-pasada fallida, se procesa el video entero:", e)
+        return None
+
+
+def _intervalo(ruta, fps, paso_s, margen_s):
+    import time
+    import cv2
+
+    t0 = time.perf_counter()
+    fps = fps or 30.0
+    paso = max(1, int(round(fps * paso_s)))
+    margen = paso + int(round(fps * margen_s))
+    cap = cv2.VideoCapture(ruta)
+    try:
+        if not cap.isOpened():
+            return None
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        with detectores.prestar("hands", **CONFIG_PRESENCIA) as hands:
+            def hay_mano(rgb) -> bool:
+                return bool(hands.process(rgb).multi_hand_landmarks)
+
+            primero = None
+            for idx, _, rgb in frames_muestreados(cap, paso, max_lado=LADO_PX, fps=fps):
+                if hay_mano(rgb):
+                    primero = idx
+                    break
+            if primero is None:
+                return None
+            ultimo = _ultima_mano(cap, hay_mano, total, primero, paso) if total > 0 else None
+    finally:
+        cap.release()
+
+    inicio = max(0, primero - margen)
+    if ultimo is not None:
+        fin = min(total - 1, ultimo + margen)
+        recortados = total - (fin - inicio + 1)
+    else:
+        # Sin nº de frames o sin seek: solo se recorta el inicio
+        fin = total - 1 if total > 0 else None
+        recortados = inicio
+    return {
+        "aplicado": True,
+        "inicio_frame": inicio,
+        "fin_frame": fin,
+        "inicio_s": round(inicio / fps, 3),
+        "fin_s": round(fin / fps, 3) if fin is not None else None,
+        "recortado_s": round(max(0, recortados) / fps, 2),
+        "pre_s": round(time.perf_counter() - t0, 3),
+    }
@@ -0,0 +1,131 @@
+# backend/procesamiento/renormalizacion.py
+"""
+Renormalización en bloque desde los landmarks crudos guardados (frames.crudos).
+
+Al cambiar un criterio de normalizacion.py se sube NORMALIZACION_VERSION y se
+ejecuta, con el mismo entorno que el backend:
+
+    cd backend && python -m procesamiento.renormalizacion [--secuencia ID ...] [--lote 2000]
+
+Recorre los frames con crudos cuya norm_version no es la actual en orden de id
+(paginación por clave, un COMMIT por lote: se puede cortar y relanzar), aplica
+los normalizadores vectorizados por lote y reescribe `landmarks` con un solo
+UPDATE ... FROM (VALUES ...) por lote. Las secuencias tocadas suben de versión
+(ETag / feed de cambios). Los frames sin crudos (captura en vivo, datos
+anteriores a esta columna) no se tocan.
+"""
+from __future__ import annotations
+
+import json
+import time
+
+from psycopg2.extras import execute_values
+
+from bd.conexion import get_connection
+from bd.esquema import asegurar_esquema, incrementar_versiones
+from procesamiento.normalizacion import (NORMALIZACION_VERSION, a_dicts, apilar, desde_crudos,
+                                         normalizar_manos, normalizar_multimodal)
+
+LOTE = 2000
+
+
+def _campo(fila, clave, idx):
+    return fila[clave] if isinstance(fila, dict) else fila[idx]
+
+
+def _indices_cara(cara_indices):
+    """secuencias.cara_indices -> (índices guardados en landmarks, índices guardados en crudos)."""
+    if not cara_indices:
+        return None, None
+    indices = tuple(cara_indices.get("indices") or ()) or None
+    crudos = tuple(cara_indices.get("crudos") or ()) or indices
+    return indices, crudos
+
+
+def renormalizar_filas(filas) -> list:
+    """
+    filas: [(id, landmarks, crudos, cara_indices)] -> [(id, landmarks_nuevos)].
+    Los frames de /subir_video (landmarks = lista de 21 puntos, crudos {"mano"})
+    se normalizan juntos; los multimodales, agrupados por subconjunto de cara.
+    """
+    salida = []
+    manos = [(fid, c["mano"]) for fid, lmk, c, _ in filas if isinstance(lmk, list) and "mano" in c]
+    if manos:
+        normalizados = a_dicts(normalizar_manos(apilar(desde_crudos({"mano": pts})["mano"] for _, pts in manos)))
+        salida.extend((fid, pts) for (fid, _), pts in zip(manos, normalizados))
+
+    grupos = {}
+    for fid, lmk, crudos, cara_indices in filas:
+        if isinstance(lmk, dict):
+            grupos.setdefault(_indices_cara(cara_indices), []).append((fid, lmk, crudos))
+    for (indices, indices_crudos), grupo in grupos.items():
+        payloads = normalizar_multimodal([desde_crudos(c, indices_crudos) for _, _, c in grupo], indices)
+        for (fid, anterior, _), payload in zip(grupo, payloads):
+            # meta y cualquier otra clave que no sea de una modalidad se conservan
+            payload.update({k: v for k, v in anterior.items() if k not in payload})
+            salida.append((fid, payload))
+    return salida
+
+
+def renormalizar(secuencia_ids=None, lote: int = LOTE, version: int = NORMALIZACION_VERSION) -> dict:
+    """Renormaliza los frames pendientes; devuelve {"frames", "secuencias", "lotes", "segundos"}."""
+    asegurar_esquema()
+    t0 = time.perf_counter()
+    stats = {"frames": 0, "secuencias": 0, "lotes": 0}
+    tocadas = set()
+    ultimo_id = 0
+    filtro = "AND f.secuencia_id = ANY(%s)" if secuencia_ids else ""
+    conn = get_connection()
+    try:
+        while True:
+            with conn.cursor() as cur:
+                params = [version, ultimo_id] + ([list(map(int, secuencia_ids))] if secuencia_ids else []) + [lote]
+                cur.execute(f"""
+                    SELECT f.id, f.secuencia_id, f.landmarks, f.crudos, s.cara_indices
+                      FROM frames f
+                      JOIN secuencias s ON s.id = f.secuencia_id
+                     WHERE f.crudos IS NOT NULL
+                       AND f.norm_version IS DISTINCT FROM %s
+                       AND f.id > %s
+                       {filtro}
+                     ORDER BY f.id
+                     LIMIT %s
+                """, params)
+                filas = cur.fetchall()
+                if not filas:
+                    break
+                ultimo_id = _campo(filas[-1], "id", 0)
+                nuevas = renormalizar_filas([
+                    (_campo(r, "id", 0), _campo(r, "landmarks", 2), _campo(r, "crudos", 3), _campo(r, "cara_indices", 4))
+                    for r in filas
+                ])
+                if nuevas:
+                    execute_values(cur, """
+                        UPDATE frames f
+                           SET landmarks = v.lmk::jsonb, norm_version = %s
+                          FROM (VALUES %%s) AS v(id, lmk)
+                         WHERE f.id = v.id
+                    """ % int(version), [(fid, json.dumps(lmk, ensure_ascii=False)) for fid, lmk in nuevas],
+                        page_size=lote)
+                sids = {_campo(r, "secuencia_id", 1) for r in filas}
+                incrementar_versiones(cur, sids, "actualizada")
+            conn.commit()
+            tocadas |= sids
+            stats["frames"] += len(nuevas)
+            stats["lotes"] += 1
+            print(f"🔁 renormalización: lote {stats['lotes']} ({stats['frames']} frames, hasta id {ultimo_id})")
+    finally:
+        conn.close()
+    stats["secuencias"] = len(tocadas)
+    stats["segundos"] = round(time.perf_counter() - t0, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Renormaliza frames desde sus landmarks crudos.")
+    parser.add_argument("--secuencia", type=int, action="append", help="solo estas secuencias (repetible)")
+    parser.add_argument("--lote", type=int, default=LOTE, help="frames por lote / COMMIT")
+    args = parser.parse_args()
+    print(f"✅ renormalización v{NORMALIZACION_VERSION}:", renormalizar(args.secuencia, max(1, args.lote)))
@@ -0,0 +1,94 @@
+# backend/procesamiento/roi.py
+"""
+Seguimiento de la región de la mano entre frames (solo extracción de mano).
+
+Con la caja de la mano del frame anterior se recorta un cuadrado con margen
+alrededor; MediaPipe procesa solo ese recorte (menos píxeles que convertir y
+reescalar). Si en el recorte no aparece la mano, se vuelve al frame completo
+y, si tampoco, se olvida la caja. Los landmarks del recorte se devuelven en
+coordenadas normalizadas del frame completo (`a_frame_completo`).
+
+El detector sigue en modo tracking (la detección de palma solo corre cuando
+se pierde la mano). Ese tracking parte de la región normalizada de la llamada
+anterior, así que el recorte debe ser el mismo sistema de coordenadas entre
+llamadas: la ventana es "pegajosa" y solo se recoloca cuando la mano se acerca
+a su borde o se queda pequeña dentro de ella. Quien llama resetea el detector
+cuando cambia la geometría (ventana nueva o paso a frame completo); ver
+`geometria`.
+"""
+from __future__ import annotations
+
+MARGEN = 0.6        # margen a cada lado, en fracción del lado de la caja
+MIN_LADO_PX = 96    # recorte mínimo (manos muy pequeñas / lejanas)
+MAX_AREA = 0.6      # si el recorte cubre más que esto del frame, no compensa
+HOLGURA = 0.12      # distancia mínima caja-borde de la ventana, en fracción de su lado
+MIN_OCUPACION = 0.3 # si la caja ocupa menos de esto del lado de la ventana, se reajusta
+
+
+class RoiMano:
+    def __init__(self, margen: float = MARGEN, min_lado_px: int = MIN_LADO_PX):
+        self.margen = margen
+        self.min_lado_px = min_lado_px
+        self.caja = None     # (x0, y0, x1, y1) en píxeles del frame completo
+        self.ventana = None  # recorte vigente; se conserva mientras la mano quepa holgada
+        self.stats = {"roi": 0, "completo": 0, "perdidas": 0, "ventanas": 0}
+
+    def region(self, ancho: int, alto: int):
+        """Recorte (x0, y0, x1, y1) en píxeles para el frame actual, o None = frame completo."""
+        if self.caja is None:
+            self.ventana = None
+            return None
+        if self.ventana is None or not self._holgada(self.ventana, ancho, alto):
+            self.ventana = self._nueva(ancho, alto)
+            if self.ventana is not None:
+                self.stats["ventanas"] += 1
+        return self.ventana
+
+    def _holgada(self, ventana, ancho: int, alto: int) -> bool:
+        """La caja actual sigue bien dentro de `ventana` (los lados pegados al frame no cuentan)."""
+        x0, y0, x1, y1 = self.caja
+        rx0, ry0, rx1, ry1 = ventana
+        lado = max(rx1 - rx0, ry1 - ry0)
+        h = HOLGURA * lado
+        if max(x1 - x0, y1 - y0) < MIN_OCUPACION * lado:
+            return False
+        return ((rx0 == 0 or x0 - rx0 >= h) and (ry0 == 0 or y0 - ry0 >= h)
+                and (rx1 == ancho or rx1 - x1 >= h) and (ry1 == alto or ry1 - y1 >= h))
+
+    def _nueva(self, ancho: int, alto: int):
+        x0, y0, x1, y1 = self.caja
+        lado = max(x1 - x0, y1 - y0) * (1.0 + 2.0 * self.margen)
+        lado = max(lado, float(self.min_lado_px))
+        cx, cy = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+        rx0, ry0 = max(0, int(cx - lado / 2.0)), max(0, int(cy - lado / 2.0))
+        rx1, ry1 = min(ancho, int(cx + lado / 2.0) + 1), min(alto, int(cy + lado / 2.0) + 1)
+        if rx1 - rx0 < 16 or ry1 - ry0 < 16:
+            return None
+        if (rx1 - rx0) * (ry1 - ry0) > MAX_AREA * ancho * alto:
+            return None
+        return rx0, ry0, rx1, ry1
+
+    def actualizar(self, pts, ancho: int, alto: int):
+        """pts: array (21, 3) normalizado al frame completo, o None si se perdió la mano."""
+        if pts is None or len(pts) == 0:
+            self.caja = None
+            return
+        xs = pts[:, 0] * ancho
+        ys = pts[:, 1] * alto
+        self.caja = (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+
+
+def geometria(region):
+    """Clave del sistema de coordenadas de una llamada al detector (recorte o frame completo)."""
+    return region if region is not None else "completo"
+
+
+def a_frame_completo(arr, region, ancho: int, alto: int):
+    """(K, 3) normalizado al recorte -> normalizado al frame completo (z escala como x)."""
+    x0, y0, x1, y1 = region
+    w, h = float(x1 - x0), float(y1 - y0)
+    out = arr.copy()   # numpy llega con el array; el módulo no lo importa
+    out[:, 0] = (x0 + arr[:, 0] * w) / ancho
+    out[:, 1] = (y0 + arr[:, 1] * h) / alto
+    out[:, 2] = arr[:, 2] * (w / ancho)
+    return out
@@ -0,0 +1,490 @@
+# backend/procesamiento/similitud.py
+"""
+Búsqueda de secuencias similares (GET /api/secuencias/<id>/similares).
+
+Cada secuencia se resume a partir de sus landmarks normalizados, usando solo
+manos (21 puntos, xy) y la parte alta de la pose (hombros, codos, muñecas, xy),
+en 96 valores por frame:
+
+  firma      trayectoria remuestreada a PASOS frames (PASOS x 96, float16)
+  embedding  trayectoria a PASOS_EMB frames proyectada a DIM valores con una
+             proyección aleatoria fija y normalizada (L2), float32
+
+Ambas se guardan en `secuencias` junto al cambio_id con el que se calcularon,
+así que solo se recalculan las secuencias nuevas o modificadas. En memoria
+solo vive la matriz de embeddings (N x DIM float32: ~25 MB para 50k
+secuencias). La búsqueda:
+
+  1. poda: similitud coseno contra toda la matriz (un producto matriz-vector)
+     y se quedan los `candidatos` mejores;
+  2. reordenación: DTW con banda de Sakoe-Chiba entre la firma de la consulta
+     y las de los candidatos, vectorizado sobre el lote de candidatos.
+
+Un hilo del proceso (`iniciar()`) hace la carga inicial y luego, cada
+REFRESCO_S, lee el feed de cambios (bd/feed.py, como /api/cambios) y calcula
+las firmas nuevas; las consultas no esperan a la BD ni al cálculo. Las
+lecturas y el cálculo se hacen fuera del lock del índice, que solo se toma
+para incorporar el resultado. Las secuencias que aún no tienen firma al
+arrancar se calculan de LOTE_FIRMAS en LOTE_FIRMAS por refresco; para
+calcularlas todas de una vez:
+
+    cd backend && python -m procesamiento.similitud
+
+Los frames de /subir_video (una sola mano, sin lateralidad) ocupan el hueco de
+la mano derecha.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from bd import feed
+from bd.conexion import get_connection
+from bd.esquema import asegurar_esquema
+
+FIRMA_VERSION = 1
+PASOS = 32
+PASOS_EMB = 8
+DIM = 128
+BANDA = 0.15            # radio de Sakoe-Chiba como fracción de PASOS
+SEMILLA = 20240601
+
+REFRESCO_S = float(os.environ.get("SIMILITUD_REFRESCO_S", "5") or 5)
+LOTE_FIRMAS = int(os.environ.get("SIMILITUD_LOTE_FIRMAS", "200") or 200)
+CANDIDATOS = int(os.environ.get("SIMILITUD_CANDIDATOS", "64") or 64)
+
+_POSE = (11, 12, 13, 14, 15, 16)
+# (posición en la trayectoria, nº de puntos) de mano izquierda, mano derecha y pose
+_HUECOS = ((0, 21), (21, 21), (42, len(_POSE)))
+PUNTOS = 21 + 21 + len(_POSE)
+RASGOS = PUNTOS * 2
+
+_PROYECCION = (np.random.default_rng(SEMILLA)
+               .standard_normal((PASOS_EMB * RASGOS, DIM)).astype(np.float32) / np.sqrt(DIM))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Firma y embedding
+# ──────────────────────────────────────────────────────────────────────────────
+def _xy(puntos, n: int, indices=None):
+    if not isinstance(puntos, list) or len(puntos) < (max(indices) + 1 if indices else n):
+        return None
+    sel = puntos if indices is None else [puntos[i] for i in indices]
+    try:
+        return [(p["x"], p["y"]) for p in sel[:n]]
+    except (KeyError, TypeError):
+        return None
+
+
+def trayectoria(frames) -> np.ndarray | None:
+    """
+    frames: [(mano_izq, mano_der, pose)] en orden de num_frame (listas de dicts
+    o None) -> (F, RASGOS) float32. Los frames sin ninguna parte se descartan y
+    los huecos de una parte se rellenan con su última (o primera) detección.
+    None si la secuencia no tiene manos ni pose.
+    """
+    X = np.full((len(frames), PUNTOS, 2), np.nan, dtype=np.float32)
+    for t, partes in enumerate(frames):
+        for (inicio, n), pts, indices in zip(_HUECOS, partes, (None, None, _POSE)):
+            xy = _xy(pts, n, indices)
+            if xy is not None:
+                X[t, inicio:inicio + n] = xy
+    presentes = np.stack([~np.isnan(X[:, inicio, 0]) for inicio, _ in _HUECOS], axis=1)  # (F, 3)
+    X, presentes = X[presentes.any(axis=1)], presentes[presentes.any(axis=1)]
+    if not len(X):
+        return None
+    pos = np.arange(len(X))
+    for (inicio, n), p in zip(_HUECOS, presentes.T):
+        if not p.any():
+            X[:, inicio:inicio + n] = 0.0
+        elif not p.all():
+            idx = np.maximum.accumulate(np.where(p, pos, -1))
+            idx[idx < 0] = int(np.argmax(p))
+            X[:, inicio:inicio + n] = X[idx, inicio:inicio + n]
+    return X.reshape(len(X), RASGOS)
+
+
+def remuestrear(X: np.ndarray, pasos: int) -> np.ndarray:
+    """(F, D) -> (pasos, D) por interpolación lineal en el eje temporal."""
+    if len(X) == 1:
+        return np.repeat(X, pasos, axis=0)
+    pos = np.linspace(0.0, len(X) - 1, pasos)
+    i0 = np.floor(pos).astype(np.int64)
+    i1 = np.minimum(i0 + 1, len(X) - 1)
+    w = (pos - i0)[:, None].astype(np.float32)
+    return X[i0] * (1.0 - w) + X[i1] * w
+
+
+def embedding(X: np.ndarray) -> np.ndarray:
+    """Trayectoria (F, RASGOS) -> vector (DIM,) float32 de norma 1."""
+    v = remuestrear(X, PASOS_EMB).reshape(-1) @ _PROYECCION
+    return (v / max(float(np.linalg.norm(v)), 1e-6)).astype(np.float32)
+
+
+def firma_y_embedding(frames):
+    """frames de una secuencia -> (firma (PASOS, RASGOS) float16, embedding) o (None, None)."""
+    X = trayectoria(frames)
+    if X is None:
+        return None, None
+    return remuestrear(X, PASOS).astype(np.float16), embedding(X)
+
+
+def dtw_lote(consulta: np.ndarray, candidatos: np.ndarray, banda: float = BANDA) -> np.ndarray:
+    """
+    DTW con banda de Sakoe-Chiba entre consulta (N, D) y cada candidato de
+    (B, M, D), distancia euclídea por frame. Cada celda de la programación
+    dinámica se calcula a la vez para los B candidatos. Devuelve (B,) el coste
+    del camino óptimo dividido por N + M.
+    """
+    q = consulta.astype(np.float32)
+    C = candidatos.astype(np.float32)
+    B, M, _ = C.shape
+    N = len(q)
+    if not B:
+        return np.zeros(0, dtype=np.float32)
+    cuad = (q * q).sum(1)[None, :, None] + (C * C).sum(2)[:, None, :] - 2.0 * np.einsum("nd,bmd->bnm", q, C)
+    costo = np.sqrt(np.maximum(cuad, 0.0))                                   # (B, N, M)
+    radio = max(1, int(round(banda * max(N, M))), abs(N - M))
+    D = np.full((B, N + 1, M + 1), np.inf, dtype=np.float32)
+    D[:, 0, 0] = 0.0
+    for i in range(1, N + 1):
+        for j in range(max(1, i - radio), min(M, i + radio) + 1):
+            D[:, i, j] = costo[:, i - 1, j - 1] + np.minimum(np.minimum(D[:, i - 1, j], D[:, i, j - 1]),
+                                                             D[:, i - 1, j - 1])
+    return D[:, N, M] / float(N + M)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Lectura / escritura en BD
+# ──────────────────────────────────────────────────────────────────────────────
+def _campo(fila, clave, idx):
+    return fila[clave] if isinstance(fila, dict) else fila[idx]
+
+
+def _frames_secuencias(cur, secuencia_ids) -> dict:
+    """{secuencia_id: [(mano_izq, mano_der, pose)]}; de cada frame solo se leen esas partes."""
+    cur.execute("""
+        SELECT f.secuencia_id,
+               CASE WHEN jsonb_typeof(f.landmarks) = 'array'
+                    THEN jsonb_build_array(NULL, f.landmarks, NULL)
+                    ELSE jsonb_build_array(f.landmarks->'left_hand', f.landmarks->'right_hand', f.landmarks->'pose')
+               END AS partes
+          FROM frames f
+         WHERE f.secuencia_id = ANY(%s)
+         ORDER BY f.secuencia_id, f.num_frame
+    """, (list(secuencia_ids),))
+    salida = {int(s): [] for s in secuencia_ids}
+    for r in cur.fetchall():
+        salida[int(_campo(r, "secuencia_id", 0))].append(_campo(r, "partes", 1))
+    return salida
+
+
+def calcular_firmas(cur, pendientes) -> dict:
+    """
+    pendientes: [(secuencia_id, cambio_id, categoria_id)] -> las guarda en
+    `secuencias` y devuelve {secuencia_id: (embedding o None, categoria_id)}.
+    Una secuencia sin manos ni pose queda con firma vacía (no se recalcula
+    hasta que cambie).
+    """
+    if not pendientes:
+        return {}
+    frames = _frames_secuencias(cur, [p[0] for p in pendientes])
+    filas, salida = [], {}
+    for sid, cambio_id, categoria_id in pendientes:
+        firma, emb = firma_y_embedding(frames.get(int(sid)) or [])
+        salida[int(sid)] = (emb, categoria_id)
+        filas.append((b"" if firma is None else firma.tobytes(), b"" if emb is None else emb.tobytes(),
+                      cambio_id, FIRMA_VERSION, int(sid)))
+    cur.executemany("""
+        UPDATE secuencias
+           SET firma = %s, firma_embedding = %s, firma_cambio = %s, firma_version = %s
+         WHERE id = %s
+    """, filas)
+    return salida
+
+
+def _firma(valor) -> np.ndarray | None:
+    datos = bytes(valor or b"")
+    return np.frombuffer(datos, dtype=np.float16).reshape(PASOS, RASGOS) if datos else None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Índice en memoria
+# ──────────────────────────────────────────────────────────────────────────────
+class IndiceSimilitud:
+    """Matriz de embeddings del proceso, con altas / cambios incrementales."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresco_lock = threading.Lock()   # un solo refresco a la vez (hilo / CLI)
+        self.listo = False
+        self.error = None
+        self._emb = np.zeros((0, DIM), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._cat = np.zeros(0, dtype=np.int64)
+        self._activo = np.zeros(0, dtype=bool)
+        self._n = 0
+        self._pos = {}
+        self._pendientes = []
+        self._ultimo_cambio = None
+
+    # -- matriz ---------------------------------------------------------------
+    def _crecer(self, n: int):
+        cap = max(1024, len(self._ids) * 2)
+        while cap < n:
+            cap *= 2
+        for nombre, relleno in (("_emb", 0.0), ("_ids", 0), ("_cat", -1), ("_activo", False)):
+            viejo = getattr(self, nombre)
+            nuevo = np.full((cap,) + viejo.shape[1:], relleno, dtype=viejo.dtype)
+            nuevo[:self._n] = viejo[:self._n]
+            setattr(self, nombre, nuevo)
+
+    def _poner(self, sid: int, emb, categoria_id):
+        fila = self._pos.get(sid)
+        if emb is None:
+            if fila is not None:
+                self._activo[fila] = False
+            return
+        if fila is None:
+            if self._n >= len(self._ids):
+                self._crecer(self._n + 1)
+            fila = self._pos[sid] = self._n
+            self._n += 1
+        self._emb[fila] = emb
+        self._ids[fila] = sid
+        self._cat[fila] = -1 if categoria_id is None else int(categoria_id)
+        self._activo[fila] = True
+
+    def quitar(self, secuencia_ids):
+        with self._lock:
+            for sid in secuencia_ids:
+                fila = self._pos.get(int(sid))
+                if fila is not None:
+                    self._activo[fila] = False
+
+    # -- carga / refresco -----------------------------------------------------
+    @staticmethod
+    def _pendiente(r):
+        return _campo(r, "id", 0), _campo(r, "cambio_id", 1), _campo(r, "categoria_id", 2)
+
+    def cargar(self):
+        """Carga inicial: embeddings ya calculados y lista de secuencias sin firma al día."""
+        t0 = time.perf_counter()
+        asegurar_esquema()
+        with get_connection() as conn, conn.cursor() as cur:
+            # Token antes de leer: lo que cambie durante la carga vuelve a llegar por el feed
+            token = feed.token_inicial(cur)
+            cur.execute("""
+                SELECT id, categoria_id, firma_embedding
+                  FROM secuencias
+                 WHERE firma_version = %s AND firma_cambio IS NOT DISTINCT FROM cambio_id
+                   AND octet_length(firma_embedding) > 0
+            """, (FIRMA_VERSION,))
+            filas = [(int(_campo(r, "id", 0)), np.frombuffer(bytes(_campo(r, "firma_embedding", 2)), dtype=np.float32),
+                      _campo(r, "categoria_id", 1)) for r in cur.fetchall()]
+            cur.execute("""
+                SELECT id, cambio_id, categoria_id
+                  FROM secuencias
+                 WHERE firma_embedding IS NULL
+                    OR firma_version IS DISTINCT FROM %s
+                    OR firma_cambio IS DISTINCT FROM cambio_id
+                 ORDER BY id DESC
+            """, (FIRMA_VERSION,))
+            pendientes = [self._pendiente(r) for r in cur.fetchall()]
+        with self._lock:
+            if filas:
+                self._crecer(self._n + len(filas))
+            for sid, emb, categoria_id in filas:
+                self._poner(sid, emb, categoria_id)
+            self._pendientes = pendientes
+            self._ultimo_cambio = token
+            self.listo = True
+        print(f"🔎 similitud: {len(filas)} secuencias en el índice, {len(pendientes)} sin firma "
+              f"({time.perf_counter() - t0:.1f}s)")
+
+    def refrescar(self, lote: int = LOTE_FIRMAS) -> int:
+        """Incorpora cambios del feed y hasta `lote` secuencias sin firma. Devuelve cuántas calculó."""
+        with self._refresco_lock:
+            with self._lock:
+                token = self._ultimo_cambio
+            with get_connection() as conn, conn.cursor() as cur:
+                filas, token, _ = feed.leer_cambios(cur, token, lote, columnas="s.id, s.cambio_id, s.categoria_id")
+                nuevos = [self._pendiente(r) for r in filas]
+                # _pendientes solo lo tocan la carga y el refresco, que no se solapan
+                cola = {int(p[0]): p for p in self._pendientes[:max(0, lote - len(nuevos))]}
+                cola.update({int(p[0]): p for p in nuevos})
+                calculadas = calcular_firmas(cur, list(cola.values()))
+                conn.commit()
+            with self._lock:
+                for sid, (emb, categoria_id) in calculadas.items():
+                    self._poner(sid, emb, categoria_id)
+                self._pendientes = self._pendientes[max(0, lote - len(nuevos)):]
+                self._ultimo_cambio = token
+            return len(calculadas)
+
+    def indexar(self, secuencia_id: int):
+        """Calcula y registra ya la firma de una secuencia (consulta sobre una aún pendiente)."""
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT id, cambio_id, categoria_id FROM secuencias WHERE id = %s", (secuencia_id,))
+            r = cur.fetchone()
+            if not r:
+                return False
+            calculadas = calcular_firmas(cur, [(_campo(r, "id", 0), _campo(r, "cambio_id", 1),
+                                                _campo(r, "categoria_id", 2))])
+            conn.commit()
+        with self._lock:
+            for sid, (emb, categoria_id) in calculadas.items():
+                self._poner(sid, emb, categoria_id)
+        return True
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {"listo": self.listo, "error": self.error,
+                    "secuencias": int(self._activo[:self._n].sum()), "pendientes": len(self._pendientes),
+                    "ultimo_cambio": self._ultimo_cambio}
+
+    # -- consulta -------------------------------------------------------------
+    def podar(self, secuencia_id: int, candidatos: int, categoria_id=None):
+        """Embedding de la consulta + los `candidatos` ids más parecidos (coseno), o None si no está."""
+        with self._lock:
+            fila = self._pos.get(int(secuencia_id))
+            if fila is None or not self._activo[fila]:
+                return None
+            q = self._emb[fila].copy()
+            mascara = self._activo[:self._n].copy()
+            mascara[fila] = False
+            if categoria_id is not None:
+                mascara &= self._cat[:self._n] == int(categoria_id)
+            filas = np.flatnonzero(mascara)
+            sims = self._emb[filas] @ q if len(filas) else np.zeros(0, dtype=np.float32)
+            ids = self._ids[filas]
+        if len(filas) > candidatos:
+            mejores = np.argpartition(-sims, candidatos - 1)[:candidatos]
+            ids, sims = ids[mejores], sims[mejores]
+        orden = np.argsort(-sims)
+        return ids[orden], sims[orden]
+
+
+indice = IndiceSimilitud()
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def iniciar():
+    """Arranca (una vez por proceso) el hilo que carga y mantiene el índice."""
+    global _hilo
+    with _hilo_lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_bucle, name="indice-similitud", daemon=True)
+            _hilo.start()
+
+
+def _bucle():
+    while not indice.listo:
+        try:
+            indice.cargar()
+            indice.error = None
+        except Exception as e:
+            indice.error = str(e)
+            print("❌ similitud: falló la carga del índice:", e)
+            time.sleep(REFRESCO_S * 6)
+    while True:
+        time.sleep(REFRESCO_S)
+        try:
+            indice.refrescar()
+        except Exception as e:
+            print("❌ similitud: falló el refresco:", e)
+
+
+def _ms(tiempos: dict) -> dict:
+    return {etapa: round(s * 1000, 2) for etapa, s in tiempos.items()}
+
+
+def buscar_similares(secuencia_id: int, k: int = 10, candidatos: int = CANDIDATOS,
+                     misma_categoria: bool = False):
+    """
+    Las `k` secuencias más parecidas a `secuencia_id` por DTW, tras podar con
+    el embedding: {"resultados", "candidatos", "sin_firma", "tiempos_ms"}.
+    None si la secuencia no existe. El índice lo mantiene el hilo de
+    `iniciar()`; aquí no se refresca.
+    """
+    sid = int(secuencia_id)
+    tiempos = {}
+    t0 = t = time.perf_counter()
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT categoria_id FROM secuencias WHERE id = %s", (sid,))
+        r = cur.fetchone()
+    if not r:
+        return None
+    categoria = _campo(r, "categoria_id", 0) if misma_categoria else None
+    poda = indice.podar(sid, max(k, candidatos), categoria)
+    if poda is None and indice.indexar(sid):
+        # Aún no estaba en el índice (nueva, modificada o pendiente de la carga)
+        poda = indice.podar(sid, max(k, candidatos), categoria)
+    tiempos["poda"] = time.perf_counter() - t
+    if poda is None:
+        return {"resultados": [], "candidatos": 0, "sin_firma": True, "tiempos_ms": _ms(tiempos)}
+    ids, sims = poda
+
+    t = time.perf_counter()
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT s.id, s.nombre, s.subcategoria, s.firma, c.slug AS categoria_slug, c.nombre AS categoria_nombre
+              FROM secuencias s
+              LEFT JOIN categorias c ON c.id = s.categoria_id
+             WHERE s.id = ANY(%s)
+        """, ([sid] + [int(i) for i in ids],))
+        filas = {int(_campo(r, "id", 0)): r for r in cur.fetchall()}
+    firmas = {i: _firma(_campo(r, "firma", 3)) for i, r in filas.items()}
+    tiempos["bd"] = time.perf_counter() - t
+
+    consulta = firmas.get(sid)
+    if consulta is None:
+        return {"resultados": [], "candidatos": 0, "sin_firma": True, "tiempos_ms": _ms(tiempos)}
+    vivos = [(int(i), float(s)) for i, s in zip(ids, sims) if firmas.get(int(i)) is not None]
+    # Candidatos borrados (o ya sin firma) desde la última carga
+    indice.quitar([int(i) for i in ids if firmas.get(int(i)) is None])
+
+    t = time.perf_counter()
+    lote = (np.stack([firmas[i] for i, _ in vivos]) if vivos
+            else np.zeros((0, PASOS, RASGOS), dtype=np.float16))
+    distancias = dtw_lote(consulta, lote)
+    tiempos["dtw"] = time.perf_counter() - t
+
+    resultados = []
+    for pos in np.argsort(distancias, kind="stable")[:k]:
+        i, sim = vivos[pos]
+        fila = filas[i]
+        resultados.append({
+            "secuencia_id": i,
+            "nombre": _campo(fila, "nombre", 1),
+            "categoria": {"slug": _campo(fila, "categoria_slug", 4), "nombre": _campo(fila, "categoria_nombre", 5),
+                          "subcategoria": _campo(fila, "subcategoria", 2)},
+            "distancia": round(float(distancias[pos]), 5),
+            "similitud_embedding": round(sim, 5),
+        })
+    tiempos["total"] = time.perf_counter() - t0
+    return {"resultados": resultados, "candidatos": len(vivos), "sin_firma": False, "tiempos_ms": _ms(tiempos)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calcula las firmas de similitud pendientes.")
+    parser.add_argument("--lote", type=int, default=500, help="secuencias por lote / COMMIT")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    indice.cargar()
+    total = 0
+    while True:
+        hechas = indice.refrescar(lote=max(1, args.lote))
+        total += hechas
+        if not hechas:
+            break
+        print(f"🔎 similitud: {total} firmas calculadas")
+    print(f"✅ similitud v{FIRMA_VERSION}: {total} firmas en {time.perf_counter() - t0:.1f}s",
+          indice.estadisticas())
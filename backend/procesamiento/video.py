@@ -0,0 +1,215 @@
+# backend/procesamiento/video.py
+"""Lectura de video para las rutas de subida (cv2 se importa al usarla)."""
+from __future__ import annotations
+
+import os
+import time
+
+# Lado mayor (px) de la imagen que recibe MediaPipe. Los landmarks salen
+# normalizados a [0, 1], así que reducir la imagen no cambia sus coordenadas;
+# MediaPipe reescala internamente a 224-256 px de todas formas.
+MAX_LADO_MANOS = int(os.environ.get("INFERENCIA_MAX_LADO", "640") or 0)
+MAX_LADO_HOLISTIC = int(os.environ.get("INFERENCIA_MAX_LADO_HOLISTIC", "960") or 0)
+
+# Muestreo: "fijo" (target_fps) o "adaptativo" (entre fps_min y fps_max según
+# el movimiento, medido por diferencia de frames a baja resolución)
+MUESTREO = os.environ.get("VIDEO_MUESTREO", "adaptativo")
+FPS_MIN = float(os.environ.get("VIDEO_FPS_MIN", "2") or 2)
+FPS_MAX = float(os.environ.get("VIDEO_FPS_MAX", "15") or 15)
+UMBRAL_MOVIMIENTO = float(os.environ.get("VIDEO_UMBRAL_MOVIMIENTO", "3.0") or 3.0)  # media |Δ| en 0-255
+_LADO_MOVIMIENTO = 64
+
+# Presupuesto por petición: videos más largos se rechazan (413) y la extracción
+# se corta al llegar a MAX_FRAMES muestreados o PRESUPUESTO_S segundos
+MAX_DURACION_S = float(os.environ.get("VIDEO_MAX_DURACION_S", "600") or 600)
+MAX_FRAMES = int(os.environ.get("VIDEO_MAX_FRAMES", "3000") or 3000)
+PRESUPUESTO_S = float(os.environ.get("VIDEO_PRESUPUESTO_S", "240") or 240)
+
+
+def max_lado_desde_form(valor, por_defecto: int) -> int:
+    """Form 'inferencia_px': 0 = resolución original; se acota a [160, 3840]."""
+    try:
+        v = int(str(valor).strip())
+    except Exception:
+        return por_defecto
+    return 0 if v <= 0 else max(160, min(3840, v))
+
+
+def redimensionar(img, max_lado: int):
+    """Reduce (sin deformar) para que el lado mayor no pase de max_lado; 0 = sin cambios."""
+    import cv2
+
+    h, w = img.shape[:2]
+    lado = max(h, w)
+    if not max_lado or lado <= max_lado:
+        return img
+    f = max_lado / float(lado)
+    return cv2.resize(img, (max(1, round(w * f)), max(1, round(h * f))), interpolation=cv2.INTER_AREA)
+
+
+def a_rgb(bgr, max_lado: int = 0):
+    """Redimensiona primero y convierte después: la conversión de color cuesta por píxel."""
+    import cv2
+
+    return cv2.cvtColor(redimensionar(bgr, max_lado), cv2.COLOR_BGR2RGB)
+
+
+def muestreo_desde_form(form, target_fps: int) -> dict:
+    """Form 'muestreo' (fijo|adaptativo), 'fps_min', 'fps_max' -> parámetros acotados a [1, 30]."""
+    modo = (form.get("muestreo") or MUESTREO).strip().lower()
+    if modo not in ("fijo", "adaptativo"):
+        modo = "fijo"
+
+    def _fps(clave, defecto):
+        try:
+            return max(1.0, min(30.0, float(form.get(clave) or defecto)))
+        except Exception:
+            return defecto
+
+    fps_min, fps_max = _fps("fps_min", FPS_MIN), _fps("fps_max", FPS_MAX)
+    return {"modo": modo, "target_fps": target_fps,
+            "fps_min": min(fps_min, fps_max), "fps_max": max(fps_min, fps_max)}
+
+
+def _t_s(cap, idx: int, fps: float) -> float:
+    """Marca de tiempo real del frame recién leído (vale para VFR); idx/fps si el backend no la da."""
+    import cv2
+
+    ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if ms and ms > 0:
+        return round(ms / 1000.0, 3)
+    return round(idx / (fps or 30.0), 3)
+
+
+def frames_muestreados(cap, intervalo: int, max_lado: int = 0, rgb: bool = True, fps: float = 30.0,
+                       desde: int = 0, hasta: int = None, perf=None):
+    """
+    Genera (idx, t_s, imagen) cada `intervalo` frames: RGB reducida a `max_lado` o,
+    con rgb=False, el frame BGR original (para recortar antes de convertir).
+    Los frames que no se muestrean solo se avanzan con grab() (sin decodificar).
+    desde/hasta: rango de frames (inclusive) a recorrer; se salta al inicio con
+    un seek y, si el backend no lo admite, avanzando con grab().
+    perf: Cronometro (procesamiento/perf.py) para las etapas decodificar/convertir.
+    """
+    import cv2
+
+    intervalo = max(1, int(intervalo))
+    t0 = time.perf_counter()
+    idx = 0
+    if desde > 0 and cap.set(cv2.CAP_PROP_POS_FRAMES, desde):
+        idx = desde
+    while idx < desde:
+        if not cap.grab():
+            return
+        idx += 1
+    while hasta is None or idx <= hasta:
+        if (idx - desde) % intervalo == 0:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            t1 = time.perf_counter()
+            if rgb:
+                frame = a_rgb(frame, max_lado)
+            if perf is not None:
+                # los grab() saltados cuentan en la decodificación del frame que se entrega
+                perf.sumar("decodificar", t1 - t0)
+                if rgb:
+                    perf.sumar("convertir", time.perf_counter() - t1)
+            yield idx, _t_s(cap, idx, fps), frame
+            t0 = time.perf_counter()
+        elif not cap.grab():
+            break
+        idx += 1
+
+
+def frames_adaptativos(cap, fps: float, fps_min: float, fps_max: float, max_lado: int = 0,
+                       rgb: bool = True, umbral: float = UMBRAL_MOVIMIENTO, stats: dict = None,
+                       desde: int = 0, hasta: int = None, perf=None):
+    """
+    Como frames_muestreados, pero la tasa se adapta al movimiento: se decodifican
+    candidatos a fps_max y solo pasa a inferencia el que difiere del último
+    entregado en más de `umbral` (media |Δ| en gris, a 64 px de ancho) o el que
+    llega tras 1/fps_min s sin entregar ninguno. Las pausas quedan a fps_min y
+    el deletreo rápido a fps_max.
+    """
+    import cv2
+
+    stats = stats if stats is not None else {}
+    stats.update(candidatos=0, muestreados=0)
+    intervalo = max(1, int(round((fps or 30.0) / fps_max)))
+    max_hueco = 1.0 / fps_min - 1e-6
+    ref, t_ref = None, None
+    for idx, t_s, frame in frames_muestreados(cap, intervalo, rgb=False, fps=fps, desde=desde, hasta=hasta,
+                                              perf=perf):
+        stats["candidatos"] += 1
+        t0 = time.perf_counter()
+        h, w = frame.shape[:2]
+        chico = cv2.resize(frame, (_LADO_MOVIMIENTO, max(1, round(h * _LADO_MOVIMIENTO / w))),
+                           interpolation=cv2.INTER_AREA)
+        gris = cv2.cvtColor(chico, cv2.COLOR_BGR2GRAY)
+        quieto = (ref is not None and t_s - t_ref < max_hueco
+                  and float(cv2.absdiff(gris, ref).mean()) < umbral)
+        if perf is not None:
+            perf.sumar("movimiento", time.perf_counter() - t0)
+        if quieto:
+            continue
+        ref, t_ref = gris, t_s
+        stats["muestreados"] += 1
+        if rgb:
+            t0 = time.perf_counter()
+            frame = a_rgb(frame, max_lado)
+            if perf is not None:
+                perf.sumar("convertir", time.perf_counter() - t0)
+        yield idx, t_s, frame
+
+
+def frames(cap, fps: float, muestreo: dict, max_lado: int = 0, rgb: bool = True, stats: dict = None,
+           recorte: dict = None, perf=None):
+    """Generador según `muestreo` (ver muestreo_desde_form), limitado a `recorte` si lo hay."""
+    desde = recorte["inicio_frame"] if recorte else 0
+    hasta = recorte["fin_frame"] if recorte else None
+    if muestreo["modo"] == "adaptativo":
+        return frames_adaptativos(cap, fps, muestreo["fps_min"], muestreo["fps_max"],
+                                  max_lado=max_lado, rgb=rgb, stats=stats, desde=desde, hasta=hasta, perf=perf)
+    intervalo = max(1, int(round((fps or 30.0) / float(muestreo["target_fps"]))))
+    return frames_muestreados(cap, intervalo, max_lado=max_lado, rgb=rgb, fps=fps, desde=desde, hasta=hasta,
+                              perf=perf)
+
+
+def duracion_s(cap, fps: float) -> float:
+    """Duración según el nº de frames del contenedor (0 si no lo informa)."""
+    import cv2
+
+    try:
+        return max(0.0, float(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) / (fps or 30.0))
+    except Exception:
+        return 0.0
+
+
+def duracion_rango_s(duracion: float, fps: float, rango) -> float:
+    """
+    Segundos del intervalo que se extrae (recorte y/o reanudación, con
+    inicio_frame / fin_frame inclusivo); sin rango, la duración entera.
+    """
+    if not rango:
+        return duracion
+    fps = fps or 30.0
+    inicio = (rango.get("inicio_frame") or 0) / fps
+    fin = (rango["fin_frame"] + 1) / fps if rango.get("fin_frame") is not None else duracion
+    if duracion > 0:
+        fin = min(fin, duracion)
+    return max(0.0, fin - inicio)
+
+
+def con_presupuesto(items, estado: dict, max_frames: int = MAX_FRAMES, plazo_s: float = PRESUPUESTO_S):
+    """Deja pasar items hasta agotar frames o tiempo; el motivo del corte queda en estado["truncado"]."""
+    estado.update(max_frames=max_frames, plazo_s=plazo_s, truncado=None)
+    limite = time.monotonic() + plazo_s
+    for n, item in enumerate(items):
+        if n >= max_frames:
+            estado["truncado"] = "max_frames"
+            return
+        if time.monotonic() > limite:
+            estado["truncado"] = "tiempo"
+            return
+        yield item
@@ -1,14 +1,100 @@
-from .api import api_bp
-from .autenticacion import auth_bp
-from .historial import historial_bp  
-from .metricas import metricas_bp 
-from .subir_video import bp as subir_video_bp 
-from flask import Flask
-from .subir_video_multimodal import bp as subir_video_multimodal
-def registrar_rutas(app):
-    app.register_blueprint(api_bp, url_prefix="/api")
-    app.register_blueprint(historial_bp, url_prefix="/api")
-    app.register_blueprint(metricas_bp, url_prefix="/api")
-    app.register_blueprint(subir_video_bp, url_prefix="/api") 
-    app.register_blueprint(subir_video_multimodal, url_prefix="/api")
-    app.register_blueprint(auth_bp)
+"""
+Registro de blueprints por rol.
+
+  - "api":   autenticación, captura (HTTP/WebSocket), historial, métricas, cambios,
+             búsqueda de formas de mano
+  - "video": subida y extracción de video (/subir_video, /subir_video_multimodal,
+             /subir_lote)
+
+Roles por defecto: variable APP_ROLES ("api,video"). Un despliegue solo-API
+(APP_ROLES=api) no importa los módulos de video; y aun con "video" activo,
+cv2 / numpy / mediapipe no se cargan hasta la primera subida.
+"""
+import importlib
+import os
+import sys
+import time
+
+from bd.spool import spool_frames
+from procesamiento import calidad
+
+ROLES_VALIDOS = ("api", "video")
+
+# (rol, módulo, atributo del blueprint, url_prefix)
+_BLUEPRINTS = [
+    ("api",   "routes.api",                    "api_bp",        "/api"),
+    ("api",   "routes.historial",              "historial_bp",  "/api"),
+    ("api",   "routes.metricas",               "metricas_bp",   "/api"),
+    ("api",   "routes.cambios",                "cambios_bp",    "/api"),
+    ("api",   "routes.handshape",              "handshape_bp",  "/api"),
+    ("api",   "routes.captura_ws",             "captura_ws_bp", "/api"),
+    ("video", "routes.subir_video",            "bp",            "/api"),
+    ("video", "routes.subir_video_multimodal", "bp",            "/api"),
+    ("video", "routes.subir_lote",             "bp",            "/api"),
+    ("api",   "routes.autenticacion",          "auth_bp",       None),
+]
+
+# Librerías cuyo coste de import interesa vigilar en el arranque
+_PESADAS = ("cv2", "numpy", "mediapipe")
+
+
+def roles_desde_env():
+    raw = os.environ.get("APP_ROLES") or ",".join(ROLES_VALIDOS)
+    return normalizar_roles(raw.split(","))
+
+
+def normalizar_roles(roles):
+    """Acepta lista/tupla o cadena "api,video". Ignora roles desconocidos."""
+    if isinstance(roles, str):
+        roles = roles.split(",")
+    elegidos = {r.strip().lower() for r in roles if r and r.strip()}
+    desconocidos = elegidos - set(ROLES_VALIDOS)
+    if desconocidos:
+        print("⚠️ Roles desconocidos ignorados:", ", ".join(sorted(desconocidos)))
+    return tuple(r for r in ROLES_VALIDOS if r in elegidos)
+
+
+def registrar_rutas(app, roles=None):
+    """
+    Registra los blueprints de los roles pedidos y deja en
+    app.config["ARRANQUE"] el coste de import por módulo (ms) y qué librerías
+    pesadas quedaron cargadas.
+    """
+    roles = normalizar_roles(roles) if roles is not None else roles_desde_env()
+    pesadas_antes = {m for m in _PESADAS if m in sys.modules}
+    costes = {}
+    t_total = time.perf_counter()
+
+    for rol, modulo, atributo, prefijo in _BLUEPRINTS:
+        if rol not in roles:
+            continue
+        t0 = time.perf_counter()
+        mod = importlib.import_module(modulo)
+        costes[modulo] = round((time.perf_counter() - t0) * 1000.0, 1)
+        if modulo == "routes.captura_ws":
+            if mod.sock is None:
+                continue  # flask-sock no instalado: la captura sigue por HTTP
+            mod.sock.init_app(app)
+        if prefijo:
+            app.register_blueprint(getattr(mod, atributo), url_prefix=prefijo)
+        else:
+            app.register_blueprint(getattr(mod, atributo))
+
+    app.config["ROLES"] = roles
+    app.config["ARRANQUE"] = {
+        "roles": list(roles),
+        "import_ms": costes,
+        "total_ms": round((time.perf_counter() - t_total) * 1000.0, 1),
+        "pesadas_cargadas": sorted(m for m in _PESADAS if m in sys.modules and m not in pesadas_antes),
+    }
+    lentos = ", ".join(f"{m.split('.')[-1]}={ms}ms" for m, ms in sorted(costes.items(), key=lambda kv: -kv[1]))
+    print(f"🚀 Rutas registradas (roles={','.join(roles)}) en {app.config['ARRANQUE']['total_ms']}ms: {lentos}")
+    if app.config["ARRANQUE"]["pesadas_cargadas"]:
+        print("⚠️ Librerías pesadas cargadas en el arranque:", ", ".join(app.config["ARRANQUE"]["pesadas_cargadas"]))
+
+    # Frames que quedaron en el spool local (caída previa): drenarlos en segundo plano
+    if spool_frames.hay_pendientes_en_disco():
+        spool_frames.iniciar()
+    # Reprocesos a calidad completa encolados antes de reiniciar (necesitan la extracción de video)
+    if "video" in roles and calidad.hay_reprocesos_pendientes():
+        calidad.iniciar_reproceso()
@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
-from bd.conexion import get_connection
+from bd.pool import conexion, ejecutar
+from bd.esquema import asegurar_esquema, incrementar_version
+from bd.buffer_frames import buffer_frames, HABILITADO as WRITE_BEHIND, DUPLICADO, LLENO
+from bd.spool import spool_frames, ERRORES_BD
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
-import json, re
+import json, math, re
 from typing import Any, Tuple, Optional
 
 api_bp = Blueprint("api_bp", __name__)
@@ -85,6 +88,9 @@ def _iso_utc_z(dt):
 #   TEXTO:<string> -> fallback si no se reconoce
 NUM_RE = re.compile(r"^\s*(\d{1,3})\s*$")
 FECHA_RE = re.compile(r"^\s*(\d{4})-(\d{2})-(\d{2})\s*$")
+# Columnas INTEGER de frames (secuencia_id, num_frame): fuera de rango la BD
+# rechaza el INSERT (DataError), así que se valida al recibir el frame
+MAX_INT4 = 2**31 - 1
 CANT_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*(?:unid(?:ades)?|u|pcs|kg|g|l|ml)?\s*$", re.IGNORECASE)
 
 def _build_normalized_nombre(tipo: Optional[str], valor: Optional[str], nombre: Optional[str]) -> Tuple[str, str, str]:
@@ -192,12 +198,27 @@ def _categoria_id_por_slug(cur, slug: str | None) -> int | None:
     """Obtiene id de categoría por slug (tolera cursor tupla o dict)."""
     if not slug:
         return None
-    cur.execute("SELECT id FROM categorias WHERE slug=%s", (slug,))
+    ejecutar(cur, "categoria_por_slug", "SELECT id FROM categorias WHERE slug=%s", (slug,))
     r = cur.fetchone()
     if not r:
         return None
     return _row_field(r, 0) if isinstance(r, (list, tuple)) else _row_field(r, "id")
 
+def _punto_valido(p) -> bool:
+    """Un landmark es un dict con x,y,z numéricos y finitos (jsonb no admite NaN/Infinity)."""
+    if not isinstance(p, dict):
+        return False
+    if not all(k in p for k in ("x", "y", "z")):
+        return False
+    try:
+        return all(math.isfinite(float(p[k])) for k in ("x", "y", "z"))
+    except Exception:
+        return False
+
+def _landmarks_validos(landmarks) -> bool:
+    """Lista no vacía de puntos válidos (ver _punto_valido)."""
+    return isinstance(landmarks, list) and len(landmarks) > 0 and all(_punto_valido(p) for p in landmarks)
+
 # =========================
 # POST /api/crear_secuencia
 # =========================
@@ -230,7 +251,7 @@ def crear_secuencia():
 
         nombre_norm, tipo_final, valor_final = _build_normalized_nombre(tipo_in, valor_in, nombre_in)
 
-        with get_connection() as conn, conn.cursor() as cur:
+        with conexion() as conn, conn.cursor() as cur:
             # Inferir categoría si no viene
             try:
                 if not categoria_slug:
@@ -317,8 +338,19 @@ def guardar_frame():
       "landmarks": [ {x:..., y:..., z:...}, ... ],
       "categoria_slug": "letra|numero|palabra|expresion_facial|saludo|otro",  # opcional
       "subcategoria": "A|0|hola|...",                                        # opcional
-      "usuario_id": 1                                                         # opcional
+      "usuario_id": 1,                                                        # opcional
+      "si_existe": "ignorar|reemplazar"                                       # opcional
     }
+    (secuencia_id, frame) es la clave de idempotencia: reenviar el mismo frame no
+    duplica filas (índice único en BD). Con si_existe=reemplazar se sobrescriben
+    los landmarks existentes (siempre por la vía síncrona).
+    Con el buffer write-behind activo (FRAMES_WRITE_BEHIND, por defecto sí) el
+    frame se valida, se encola y se responde 202 sin esperar al INSERT; si el
+    buffer está lleno se responde 503 con Retry-After.
+    "duplicado" solo es la respuesta de la BD en la vía síncrona. En la
+    write-behind, true significa que este worker ya vio el frame hace poco (caché
+    del proceso) y null que aún no se sabe: un reenvío que cae en otro worker no
+    se detecta aquí, aunque el INSERT lo ignore igualmente.
     """
     try:
         data = request.get_json(silent=True) or {}
@@ -331,6 +363,7 @@ def guardar_frame():
         categoria_slug = (data.get("categoria_slug") or "").strip().lower() or None
         subcategoria   = (data.get("subcategoria") or "").strip() or None
         usuario_id     = data.get("usuario_id")
+        reemplazar     = (data.get("si_existe") or "").strip().lower() == "reemplazar"
 
         # Normaliza frame -> num_frame
         try:
@@ -339,6 +372,15 @@ def guardar_frame():
                 num_frame = 0
         except Exception:
             num_frame = 0
+        if num_frame > MAX_INT4:
+            return jsonify({"ok": False, "error": f"frame fuera de rango (máx. {MAX_INT4})"}), 400
+        if secuencia_id:
+            try:
+                secuencia_id = int(secuencia_id)
+            except Exception:
+                return jsonify({"ok": False, "error": "secuencia_id debe ser un entero"}), 400
+            if not 0 < secuencia_id <= MAX_INT4:
+                return jsonify({"ok": False, "error": "secuencia_id fuera de rango"}), 400
 
         landmarks = data.get("landmarks", [])
 
@@ -349,78 +391,125 @@ def guardar_frame():
         if not isinstance(landmarks, list) or len(landmarks) == 0:
             return jsonify({"ok": False, "error": "landmarks vacíos o inválidos"}), 400
 
-        def _p_ok(p):
-            if not isinstance(p, dict):
-                return False
-            if not all(k in p for k in ("x", "y", "z")):
-                return False
-            try:
-                float(p["x"]); float(p["y"]); float(p["z"])
-            except Exception:
-                return False
-            return True
-
-        if not all(_p_ok(p) for p in landmarks):
+        if not _landmarks_validos(landmarks):
             return jsonify({"ok": False, "error": "formato de landmarks inválido; se requieren campos numéricos x,y,z"}), 400
         # ---------------------------------------------------
 
         if not secuencia_id and not etiqueta and not valor:
             return jsonify({"ok": False, "error": "secuencia_id o (nombre/tipo+valor) requerido"}), 400
 
-        with get_connection() as conn, conn.cursor() as cur:
-            # Crear secuencia si no se envió secuencia_id
+        asegurar_esquema()
+        if WRITE_BEHIND and secuencia_id and not reemplazar:
+            return _encolar_frame(secuencia_id, num_frame, landmarks)
+        if secuencia_id and spool_frames.degradada():
+            return _frame_a_spool(secuencia_id, num_frame, landmarks)
+
+        try:
+            return _guardar_frame_sync(secuencia_id, num_frame, landmarks, etiqueta, tipo, valor,
+                                       categoria_slug, subcategoria, usuario_id, reemplazar)
+        except ERRORES_BD:
             if not secuencia_id:
-                nombre_norm, tipo_final, valor_final = _build_normalized_nombre(tipo, valor, etiqueta)
-                # Inferir categoría si no la mandaron
-                try:
-                    if not categoria_slug:
-                        categoria_slug, sub_inf = _infer_categoria_y_subcategoria(nombre_norm, tipo_final, valor_final)
-                        if not subcategoria and sub_inf:
-                            subcategoria = sub_inf
-                except Exception:
-                    categoria_slug = None
-
-                # Resolver categoria_id (tolerante)
-                categoria_id = None
-                if categoria_slug:
-                    try:
-                        categoria_id = _categoria_id_por_slug(cur, categoria_slug)
-                        if categoria_id is None:
-                            categoria_id = _categoria_id_por_slug(cur, "otro")
-                    except Exception:
-                        categoria_id = None
-
-                # Intento con columnas de categoría
+                raise  # crear la secuencia necesita la BD
+            spool_frames.marcar_degradada()
+            return _frame_a_spool(secuencia_id, num_frame, landmarks)
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+def _guardar_frame_sync(secuencia_id, num_frame, landmarks, etiqueta, tipo, valor,
+                        categoria_slug, subcategoria, usuario_id, reemplazar=False):
+    """Inserción directa (sin buffer): crea la secuencia si hace falta y el frame."""
+    with conexion() as conn, conn.cursor() as cur:
+        # Crear secuencia si no se envió secuencia_id
+        if not secuencia_id:
+            nombre_norm, tipo_final, valor_final = _build_normalized_nombre(tipo, valor, etiqueta)
+            # Inferir categoría si no la mandaron
+            try:
+                if not categoria_slug:
+                    categoria_slug, sub_inf = _infer_categoria_y_subcategoria(nombre_norm, tipo_final, valor_final)
+                    if not subcategoria and sub_inf:
+                        subcategoria = sub_inf
+            except Exception:
+                categoria_slug = None
+
+            # Resolver categoria_id (tolerante)
+            categoria_id = None
+            if categoria_slug:
                 try:
-                    cur.execute("""
-                        INSERT INTO secuencias (nombre, fecha, usuario_id, categoria_id, subcategoria)
-                        VALUES (%s, NOW(), %s, %s, %s)
-                        RETURNING id
-                    """, (nombre_norm, usuario_id, categoria_id, subcategoria))
-                    row = cur.fetchone()
-                    secuencia_id = _get_one_value(row, None)
+                    categoria_id = _categoria_id_por_slug(cur, categoria_slug)
+                    if categoria_id is None:
+                        categoria_id = _categoria_id_por_slug(cur, "otro")
                 except Exception:
-                    # Fallback a esquema viejo (sin columnas de categoría)
-                    cur.execute(
-                        "INSERT INTO secuencias (nombre) VALUES (%s) RETURNING id",
-                        (nombre_norm,)
-                    )
-                    row = cur.fetchone()
-                    secuencia_id = _get_one_value(row, None)
-
-                if not secuencia_id:
-                    return jsonify({"ok": False, "error": "no se pudo crear la secuencia"}), 500
-
-            # Insertar frame con num_frame y landmarks (JSONB)
-            cur.execute(
-                "INSERT INTO frames (secuencia_id, num_frame, landmarks) VALUES (%s, %s, %s) RETURNING id",
-                (secuencia_id, num_frame, json.dumps(landmarks, ensure_ascii=False))
-            )
-            fid_row = cur.fetchone()
-            conn.commit()
+                    categoria_id = None
 
-        fid = _get_one_value(fid_row, None)
-        return jsonify({"ok": True, "id": fid, "secuencia_id": secuencia_id, "num_frame": num_frame})
+            # Intento con columnas de categoría
+            try:
+                cur.execute("""
+                    INSERT INTO secuencias (nombre, fecha, usuario_id, categoria_id, subcategoria)
+                    VALUES (%s, NOW(), %s, %s, %s)
+                    RETURNING id
+                """, (nombre_norm, usuario_id, categoria_id, subcategoria))
+                row = cur.fetchone()
+                secuencia_id = _get_one_value(row, None)
+            except Exception:
+                # Fallback a esquema viejo (sin columnas de categoría)
+                cur.execute(
+                    "INSERT INTO secuencias (nombre) VALUES (%s) RETURNING id",
+                    (nombre_norm,)
+                )
+                row = cur.fetchone()
+                secuencia_id = _get_one_value(row, None)
 
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+            if not secuencia_id:
+                return jsonify({"ok": False, "error": "no se pudo crear la secuencia"}), 500
+
+            if WRITE_BEHIND and not reemplazar:
+                conn.commit()
+                return _encolar_frame(secuencia_id, num_frame, landmarks)
+
+        # Insertar frame con num_frame y landmarks (JSONB); (secuencia_id, num_frame) es único
+        if reemplazar:
+            nombre_sql = "reemplazar_frame"
+            conflicto = "ON CONFLICT (secuencia_id, num_frame) DO UPDATE SET landmarks = EXCLUDED.landmarks"
+        else:
+            nombre_sql = "insertar_frame"
+            conflicto = "ON CONFLICT DO NOTHING"
+        ejecutar(
+            cur, nombre_sql,
+            f"INSERT INTO frames (secuencia_id, num_frame, landmarks) VALUES (%s, %s, %s) {conflicto} "
+            "RETURNING id, (xmax <> 0) AS reemplazado",
+            (secuencia_id, num_frame, json.dumps(landmarks, ensure_ascii=False))
+        )
+        fid_row = cur.fetchone()
+        duplicado = fid_row is None or bool(_row_field(fid_row, 1))
+        if fid_row is not None:
+            incrementar_version(cur, secuencia_id)
+        conn.commit()
+
+    fid = _get_one_value(fid_row, None)
+    return jsonify({"ok": True, "id": fid, "secuencia_id": secuencia_id, "num_frame": num_frame,
+                    "duplicado": duplicado})
+
+def _encolar_frame(secuencia_id, num_frame: int, landmarks):
+    """Entrega el frame al buffer write-behind (202) o aplica backpressure (503)."""
+    estado = buffer_frames.encolar(int(secuencia_id), num_frame, landmarks)
+    if estado == DUPLICADO:
+        return jsonify({"ok": True, "id": None, "secuencia_id": secuencia_id, "num_frame": num_frame,
+                        "duplicado": True}), 200
+    if estado == LLENO:
+        # BD lenta: antes de rechazar, el frame se guarda en el spool en disco
+        try:
+            return _frame_a_spool(secuencia_id, num_frame, landmarks)
+        except Exception:
+            resp = jsonify({"ok": False, "error": "buffer_lleno", "reintentar_en_s": 1})
+            resp.headers["Retry-After"] = "1"
+            return resp, 503
+    # Sin esperar al INSERT no se sabe si ya existía (otro worker pudo guardarlo)
+    return jsonify({"ok": True, "id": None, "secuencia_id": secuencia_id, "num_frame": num_frame,
+                    "en_cola": True, "duplicado": None}), 202
+
+def _frame_a_spool(secuencia_id, num_frame: int, landmarks):
+    """Persiste el frame en el spool local; se insertará cuando la BD se recupere."""
+    spool_frames.escribir([(int(secuencia_id), num_frame, landmarks)])
+    return jsonify({"ok": True, "id": None, "secuencia_id": secuencia_id, "num_frame": num_frame,
+                    "en_cola": True, "spool": True}), 202
@@ -0,0 +1,99 @@
+# backend/routes/cambios.py
+from flask import Blueprint, request, jsonify
+from bd.conexion import get_connection
+from bd.esquema import asegurar_esquema
+from bd import feed
+from datetime import timezone
+
+cambios_bp = Blueprint("cambios_bp", __name__)
+
+MAX_LIMITE = 1000
+
+# =========================
+# Utilidades (locales)
+# =========================
+def _iso_utc_z(dt):
+    """Devuelve ISO en UTC con sufijo Z o None."""
+    if not dt:
+        return None
+    if getattr(dt, "tzinfo", None) is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _parse_normalized_nombre(nombre_norm: str):
+    """Extrae (tipo, valor) desde el nombre normalizado."""
+    if not nombre_norm:
+        return ("texto", "")
+    for pref, tipo in (("NUM:", "numero"), ("FECHA:", "fecha"), ("CANT:", "cantidad"), ("TEXTO:", "texto")):
+        if nombre_norm.startswith(pref):
+            return (tipo, nombre_norm[len(pref):])
+    return ("texto", nombre_norm)
+
+# =========================
+# GET /api/cambios?desde=<token>
+# =========================
+@cambios_bp.route("/cambios", methods=["GET"])
+def cambios():
+    """
+    GET /api/cambios?desde=<token>&limite=200
+
+    Feed incremental de secuencias creadas / actualizadas / extendidas.
+      - Sin 'desde': devuelve solo el token actual (arranque tras una carga completa).
+      - Con 'desde': secuencias cambiadas desde el token, en orden, una fila por
+        secuencia (la más reciente). 'token' es el valor a enviar en la siguiente
+        consulta (opaco: "<xid>.<id>", ver bd/feed.py); si 'mas' es true hay más
+        cambios pendientes. Solo se sirven cambios de transacciones terminadas,
+        así que un cambio que confirme tarde no queda detrás del token.
+    Cada item lleva 'cambio_id' (el id de su último cambio; sirve para descartar
+    un item más viejo que uno ya aplicado, no como cursor).
+    Un id desconocido para el cliente debe tratarse como alta aunque llegue
+    como 'extendida' (creación y primer frame pueden ir en la misma transacción).
+    """
+    try:
+        limite = min(MAX_LIMITE, max(1, int(request.args.get("limite", 200))))
+    except Exception:
+        limite = 200
+    desde = request.args.get("desde")
+
+    try:
+        asegurar_esquema()
+        with get_connection() as conn, conn.cursor() as cur:
+            if desde is None or desde == "":
+                return jsonify({"ok": True, "token": feed.token_inicial(cur), "cambios": [], "mas": False})
+
+            try:
+                feed.parsear_token(desde)
+            except Exception:
+                return jsonify({"ok": False, "error": "token 'desde' inválido"}), 400
+
+            # Índice sobre (cambio_xid, id) => el coste depende del nº de cambios, no del tamaño de la tabla
+            rows, token, mas = feed.leer_cambios(cur, desde, limite, columnas="""
+                s.id, s.nombre, s.fecha, s.subcategoria, s.cambio_id, s.ultimo_cambio,
+                c.slug AS categoria_slug, c.nombre AS categoria_nombre,
+                (SELECT COUNT(*) FROM frames f WHERE f.secuencia_id = s.id) AS frames
+            """, joins="LEFT JOIN categorias c ON c.id = s.categoria_id")
+
+        items = []
+        for r in rows:
+            if isinstance(r, (list, tuple)):
+                sid, nom, fec, subc, cid, tipo_cambio, cslg, cnom, frs = r[:9]
+            else:
+                sid, nom, fec, subc = r["id"], r["nombre"], r["fecha"], r["subcategoria"]
+                cid, tipo_cambio = r["cambio_id"], r["ultimo_cambio"]
+                cslg, cnom, frs = r["categoria_slug"], r["categoria_nombre"], r["frames"]
+            tipo, valor = _parse_normalized_nombre(nom or "")
+            items.append({
+                "id": sid,
+                "cambio": tipo_cambio or "actualizada",
+                "cambio_id": int(cid) if cid is not None else None,
+                "nombre": nom,
+                "tipo": tipo,
+                "valor": valor,
+                "fecha": _iso_utc_z(fec),
+                "frames": int(frs or 0),
+                "categoria": {"slug": cslg, "nombre": cnom, "subcategoria": subc}
+            })
+
+        return jsonify({"ok": True, "token": token, "cambios": items, "mas": mas})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
@@ -0,0 +1,146 @@
+# backend/routes/captura_ws.py
+"""
+Canal WebSocket de ingesta para la captura en vivo.
+
+Un socket por sesión de captura (una secuencia). El cliente envía frames con
+número de secuencia `seq`; el servidor los acumula y los escribe en lote
+(una transacción por lote, o al spool en disco si la BD está degradada) y
+confirma con un ack acumulativo. Reenviar un frame ya guardado (mismo
+`frame`) no duplica filas: (secuencia_id, num_frame) es único en la tabla.
+
+Protocolo (JSON por mensaje):
+  cliente -> {"tipo": "frame", "seq": 17, "frame": 17, "landmarks": [...]}
+             {"tipo": "frames", "items": [{seq, frame, landmarks}, ...]}
+             {"tipo": "fin"}
+  servidor -> {"tipo": "listo", "secuencia_id": 123, "lote": 30}
+              {"tipo": "ack", "hasta": 17, "guardados": 30}
+              {"tipo": "rechazado", "seq": 18, "error": "..."}
+              {"tipo": "error", "error": "..."}
+
+Requiere `flask-sock` (y gunicorn con hilos). Si no está instalado el canal no
+se registra y el frontend sigue usando POST /api/guardar_frame.
+"""
+import json
+import time
+
+from flask import Blueprint, request, current_app
+
+from bd.conexion import get_connection
+from bd.esquema import asegurar_esquema
+from bd.spool import guardar_frames_o_spool
+from routes.api import _landmarks_validos, MAX_INT4
+
+try:
+    from flask_sock import Sock
+    _ws_ok = True
+except Exception:
+    _ws_ok = False
+
+captura_ws_bp = Blueprint("captura_ws_bp", __name__)
+sock = Sock() if _ws_ok else None
+
+LOTE_FRAMES = 30        # flush al juntar este nº de frames
+LOTE_MS = 250           # ...o cuando el frame más viejo pendiente supere esta edad
+MAX_PENDIENTES = 2000   # cota de memoria por sesión
+
+
+def _flush(secuencia_id: int, pendientes: list) -> int:
+    """
+    Escribe los frames pendientes en una transacción (o en el spool si la BD está
+    degradada: también es durable). Devuelve el seq más alto guardado.
+    """
+    guardar_frames_o_spool(((secuencia_id, nf, lmk) for _, nf, lmk in pendientes), [secuencia_id])
+    return max(seq for seq, _, _ in pendientes)
+
+
+def _sesion_captura(ws):
+    """GET /api/ws/captura?secuencia_id=123 (upgrade a WebSocket)."""
+    origenes = current_app.config.get("ALLOWED_ORIGINS") or []
+    origin = request.headers.get("Origin")
+    if origin and origenes and origin not in origenes:
+        ws.send(json.dumps({"tipo": "error", "error": "origen no permitido"}))
+        return
+
+    try:
+        secuencia_id = int(request.args.get("secuencia_id", "0"))
+    except Exception:
+        secuencia_id = 0
+    if secuencia_id <= 0:
+        ws.send(json.dumps({"tipo": "error", "error": "secuencia_id requerido"}))
+        return
+
+    asegurar_esquema()
+    pendientes = []          # [(seq, num_frame, landmarks)]
+    primero_ts = None
+    guardados = 0
+    try:
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM secuencias WHERE id = %s", (secuencia_id,))
+                existe = cur.fetchone()
+        finally:
+            conn.close()
+        if not existe:
+            ws.send(json.dumps({"tipo": "error", "error": "secuencia no encontrada"}))
+            return
+        ws.send(json.dumps({"tipo": "listo", "secuencia_id": secuencia_id, "lote": LOTE_FRAMES}))
+
+        fin = False
+        while not fin:
+            espera = None
+            if pendientes:
+                espera = max(0.0, LOTE_MS / 1000.0 - (time.monotonic() - primero_ts))
+            raw = ws.receive(timeout=espera)
+
+            if raw is not None:
+                try:
+                    msg = json.loads(raw)
+                except Exception:
+                    ws.send(json.dumps({"tipo": "error", "error": "JSON inválido"}))
+                    continue
+                tipo = msg.get("tipo")
+                if tipo == "fin":
+                    fin = True
+                items = msg.get("items") if tipo == "frames" else ([msg] if tipo == "frame" else [])
+                for it in items:
+                    seq = it.get("seq")
+                    lmk = it.get("landmarks")
+                    if isinstance(lmk, dict):
+                        lmk = [lmk]
+                    try:
+                        seq = int(seq)
+                        num_frame = max(0, int(it.get("frame", seq)))
+                        if num_frame > MAX_INT4:
+                            raise ValueError(num_frame)
+                    except Exception:
+                        ws.send(json.dumps({"tipo": "rechazado", "seq": seq, "error": "seq/frame inválidos"}))
+                        continue
+                    if not _landmarks_validos(lmk):
+                        ws.send(json.dumps({"tipo": "rechazado", "seq": seq, "error": "landmarks inválidos"}))
+                        continue
+                    if len(pendientes) >= MAX_PENDIENTES:
+                        ws.send(json.dumps({"tipo": "rechazado", "seq": seq, "error": "saturado"}))
+                        continue
+                    if not pendientes:
+                        primero_ts = time.monotonic()
+                    pendientes.append((seq, num_frame, lmk))
+
+            vencido = pendientes and (time.monotonic() - primero_ts) * 1000.0 >= LOTE_MS
+            if pendientes and (fin or vencido or len(pendientes) >= LOTE_FRAMES):
+                hasta = _flush(secuencia_id, pendientes)
+                guardados += len(pendientes)
+                pendientes = []
+                ws.send(json.dumps({"tipo": "ack", "hasta": hasta, "guardados": guardados}))
+    except Exception as e:
+        # ConnectionClosed llega aquí también: se intenta no perder lo pendiente
+        try:
+            if pendientes:
+                _flush(secuencia_id, pendientes)
+        except Exception:
+            pass
+        current_app.logger.info("Canal de captura %s cerrado: %s", secuencia_id, e)
+
+
+if _ws_ok:
+    sock.route("/ws/captura", bp=captura_ws_bp)(_sesion_captura)
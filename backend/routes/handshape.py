@@ -0,0 +1,64 @@
+# backend/routes/handshape.py
+from flask import Blueprint, request, jsonify
+
+handshape_bp = Blueprint("handshape_bp", __name__)
+
+MAX_K = 50
+LADOS = {"left": True, "izquierda": True, "right": False, "derecha": False}
+
+
+# =========================
+# POST /api/handshape/buscar
+# =========================
+@handshape_bp.route("/handshape/buscar", methods=["POST"])
+def buscar_handshape():
+    """
+    POST /api/handshape/buscar
+    {
+      "landmarks": [{"x","y","z"} x 21],     # crudos o ya normalizados
+      "lado": "left|right",                  # opcional; left se refleja
+      "k": 5,                                # opcional
+      "categoria_slug": "letra|numero"       # opcional
+    }
+
+    Letras / números guardados cuya forma de mano se parece más (mejor frame de
+    cada secuencia) y votos por subcategoria. El índice vive en memoria
+    (procesamiento/handshape.py); mientras se construye responde 503.
+    """
+    data = request.get_json(silent=True) or {}
+    puntos = data.get("landmarks") or data.get("mano")
+    if not isinstance(puntos, list) or len(puntos) < 21:
+        return jsonify({"ok": False, "error": "landmarks debe tener 21 puntos {x, y, z}"}), 400
+    lado = str(data.get("lado") or "right").strip().lower()
+    if lado not in LADOS:
+        return jsonify({"ok": False, "error": "lado debe ser left o right"}), 400
+    categoria = (data.get("categoria_slug") or "").strip().lower() or None
+    try:
+        k = min(MAX_K, max(1, int(data.get("k") or 5)))
+    except Exception:
+        return jsonify({"ok": False, "error": "k debe ser un entero"}), 400
+
+    try:
+        # numpy y el índice solo se cargan con la primera búsqueda
+        from procesamiento import handshape
+        from procesamiento.normalizacion import a_array
+
+        if categoria and categoria not in handshape.CATEGORIAS:
+            return jsonify({"ok": False, "error": "categoria_slug debe ser letra o numero"}), 400
+        try:
+            mano = a_array(puntos[:21])
+        except Exception:
+            return jsonify({"ok": False, "error": "landmarks debe tener 21 puntos {x, y, z}"}), 400
+
+        handshape.iniciar()
+        if not handshape.indice.listo:
+            resp = jsonify({"ok": False, "error": "Índice de formas de mano en construcción",
+                            "indice": handshape.indice.estadisticas()})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = "5"
+            return resp
+
+        res = handshape.indice.buscar(mano, LADOS[lado], k, categoria)
+        return jsonify({"ok": True, "k": k, **res, "indice": handshape.indice.estadisticas()}), 200
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from bd.conexion import get_connection
+from bd.pool import conexion, ejecutar
+from bd.esquema import asegurar_esquema, version_secuencia
+from web.cache_http import etag_secuencia, no_modificado, respuesta_304, aplicar_cache
+from web.admision import admitir
 from datetime import datetime, timedelta, timezone
-import csv, io, json, re
+import csv, io, json, re, time
 from typing import Any
 
 historial_bp = Blueprint("historial_bp", __name__)
@@ -230,7 +234,8 @@ def historial_detalle(secuencia_id: int):
         sql_sec = """
             SELECT s.id, s.nombre, s.fecha,
                    COALESCE(u.usuario, u.nombre) AS usuario_nombre,
-                   s.subcategoria, c.slug AS categoria_slug, c.nombre AS categoria_nombre
+                   s.subcategoria, c.slug AS categoria_slug, c.nombre AS categoria_nombre,
+                   s.cara_indices
             FROM secuencias s
             LEFT JOIN usuarios u  ON u.id = s.usuario_id
             LEFT JOIN categorias c ON c.id = s.categoria_id
@@ -245,8 +250,17 @@ def historial_detalle(secuencia_id: int):
             LIMIT %s OFFSET %s
         """
 
-        with get_connection() as conn, conn.cursor() as cur:
-            cur.execute(sql_sec, (secuencia_id,))
+        asegurar_esquema()
+        with conexion() as conn, conn.cursor() as cur:
+            # GET condicional: una sola consulta barata antes de tocar frames
+            version = version_secuencia(cur, secuencia_id)
+            if version is None:
+                return jsonify({"ok": False, "error": "Secuencia no encontrada"}), 404
+            etag = etag_secuencia(secuencia_id, version)
+            if no_modificado(etag):
+                return respuesta_304(etag)
+
+            ejecutar(cur, "historial_secuencia", sql_sec, (secuencia_id,))
             row = cur.fetchone()
             if not row:
                 return jsonify({"ok": False, "error": "Secuencia no encontrada"}), 404
@@ -258,11 +272,12 @@ def historial_detalle(secuencia_id: int):
             s_sub = _row_field(row, 4) if isinstance(row, (list, tuple)) else _row_field(row, "subcategoria")
             s_csl = _row_field(row, 5) if isinstance(row, (list, tuple)) else _row_field(row, "categoria_slug")
             s_cno = _row_field(row, 6) if isinstance(row, (list, tuple)) else _row_field(row, "categoria_nombre")
+            s_cara = _row_field(row, 7) if isinstance(row, (list, tuple)) else _row_field(row, "cara_indices")
 
-            cur.execute(sql_total, (secuencia_id,))
+            ejecutar(cur, "historial_total_frames", sql_total, (secuencia_id,))
             total_frames = _get_one_value(cur.fetchone(), 0)
 
-            cur.execute(sql_frames, (secuencia_id, tamanio, offset))
+            ejecutar(cur, "historial_frames", sql_frames, (secuencia_id, tamanio, offset))
             rows = cur.fetchall()
 
         frames = []
@@ -275,7 +290,7 @@ def historial_detalle(secuencia_id: int):
         fecha_iso = _iso_utc_z(s_fec)
         tipo, valor = _parse_normalized_nombre(s_nom or "")
 
-        return jsonify({
+        resp = jsonify({
             "ok": True,
             "secuencia": {
                 "id": s_id,
@@ -286,11 +301,13 @@ def historial_detalle(secuencia_id: int):
                 "usuario": s_usr,
                 "total_frames": int(total_frames or 0),
                 "frames": frames,
-                "categoria": {"slug": s_csl, "nombre": s_cno, "subcategoria": s_sub}
+                "categoria": {"slug": s_csl, "nombre": s_cno, "subcategoria": s_sub},
+                "cara_indices": s_cara
             },
             "pagina": pagina,
             "tamanio": tamanio
         })
+        return aplicar_cache(resp, etag)
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
@@ -298,6 +315,7 @@ def historial_detalle(secuencia_id: int):
 # GET /api/exportar  (CSV/JSON con filtros, incluye categoría)
 # =========================
 @historial_bp.route("/exportar", methods=["GET"])
+@admitir("exportar")
 def exportar():
     """
     GET /api/exportar?formato=csv|json&secuencia_id=&nombre=&desde=&hasta=&categoria_slug=&subcategoria=
@@ -461,6 +479,7 @@ def actualizar_secuencia(secuencia_id: int):
         if not any([nombre, categoria_slug, subcategoria is not None]):
             return jsonify({"ok": False, "error": "nada_para_actualizar"}), 400
 
+        asegurar_esquema()
         with get_connection() as conn, conn.cursor() as cur:
             categoria_id = None
             if categoria_slug:
@@ -484,6 +503,10 @@ def actualizar_secuencia(secuencia_id: int):
             if not sets:
                 return jsonify({"ok": False, "error": "nada_para_actualizar"}), 400
 
+            sets.append("version = version + 1")
+            sets.append("cambio_id = nextval('secuencias_cambio_seq')")
+            sets.append("cambio_xid = txid_current()")
+            sets.append("ultimo_cambio = 'actualizada'")
             params.append(secuencia_id)
             sql = f"""
                 UPDATE secuencias
@@ -524,3 +547,256 @@ def actualizar_secuencia(secuencia_id: int):
         })
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
+
+
+# =========================
+# NUEVO: GET /api/secuencias/<id>/stream  (reproducción en streaming)
+# =========================
+STREAM_ITERSIZE = 200  # filas por viaje del cursor de servidor
+
+def _float_arg(name: str, default=None):
+    try:
+        v = request.args.get(name)
+        return float(v) if v not in (None, "") else default
+    except Exception:
+        return default
+
+@historial_bp.route("/secuencias/<int:secuencia_id>/stream", methods=["GET"])
+@admitir("stream")
+def stream_secuencia(secuencia_id: int):
+    """
+    GET /api/secuencias/<id>/stream?formato=ndjson|sse&desde_frame=&desde_t=&tiempo_real=1&velocidad=1&fps=30
+
+    Emite los frames en orden de num_frame desde un cursor de servidor, sin
+    cargar la secuencia completa. Cada evento es {"num_frame", "t_s", "landmarks"}.
+      - formato: 'ndjson' (defecto) o 'sse' (también si Accept: text/event-stream)
+      - desde_frame / desde_t: punto de inicio (num_frame o segundos de meta.t_s)
+      - tiempo_real=1: respeta el ritmo original según t_s (escalado por 'velocidad')
+      - fps: para frames sin meta.t_s, t_s = num_frame / fps
+    En SSE se admite Last-Event-ID para reanudar tras una desconexión.
+    """
+    formato = (request.args.get("formato") or "").strip().lower()
+    if not formato:
+        formato = "sse" if "text/event-stream" in (request.headers.get("Accept") or "") else "ndjson"
+    if formato not in ("ndjson", "sse"):
+        return jsonify({"ok": False, "error": "formato debe ser ndjson o sse"}), 400
+
+    try:
+        desde_frame = max(0, int(request.args.get("desde_frame", 0) or 0))
+    except Exception:
+        desde_frame = 0
+    last_event_id = request.headers.get("Last-Event-ID")
+    if formato == "sse" and last_event_id and last_event_id.isdigit():
+        desde_frame = max(desde_frame, int(last_event_id) + 1)
+
+    desde_t = _float_arg("desde_t")
+    fps = _float_arg("fps", 30.0)
+    if not fps or fps <= 0:
+        fps = 30.0
+    velocidad = _float_arg("velocidad", 1.0)
+    if not velocidad or velocidad <= 0:
+        velocidad = 1.0
+    tiempo_real = request.args.get("tiempo_real", "").lower() in ("1", "true")
+
+    t_expr = "COALESCE((landmarks->'meta'->>'t_s')::float, num_frame / %s::float)"
+    where = ["secuencia_id = %s", "num_frame >= %s"]
+    params = [fps, secuencia_id, desde_frame]
+    if desde_t is not None:
+        where.append(f"{t_expr} >= %s")
+        params += [fps, desde_t]
+    sql = f"""
+        SELECT num_frame, landmarks, {t_expr} AS t_s
+        FROM frames
+        WHERE {" AND ".join(where)}
+        ORDER BY num_frame ASC
+    """
+
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM secuencias WHERE id = %s", (secuencia_id,))
+            existe = cur.fetchone() is not None
+        conn.rollback()
+    except Exception as e:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return jsonify({"ok": False, "error": str(e)}), 500
+    if not existe:
+        conn.close()
+        return jsonify({"ok": False, "error": "Secuencia no encontrada"}), 404
+
+    def _evento(obj, nf=None, evento="frame"):
+        data = json.dumps(obj, ensure_ascii=False)
+        if formato == "ndjson":
+            return data + "\n"
+        head = f"id: {nf}\n" if nf is not None else ""
+        return f"{head}event: {evento}\ndata: {data}\n\n"
+
+    def _filas():
+        """(num_frame, landmarks, t_s) en orden de num_frame."""
+        if not tiempo_real:
+            # Cursor con nombre => cursor de servidor; trae STREAM_ITERSIZE filas por viaje
+            with conn.cursor(name=f"stream_sec_{secuencia_id}") as cur:
+                cur.itersize = STREAM_ITERSIZE
+                cur.execute(sql, params)
+                for r in cur:
+                    yield r if isinstance(r, (list, tuple)) else (r["num_frame"], r["landmarks"], r["t_s"])
+            return
+        # Tiempo real: la reproducción puede durar minutos. Por páginas (keyset por
+        # num_frame) y sin transacción abierta mientras se espera entre frames,
+        # para no frenar a VACUUM
+        siguiente = desde_frame
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(sql + " LIMIT %s", params[:2] + [siguiente] + params[3:] + [STREAM_ITERSIZE])
+                pagina = [r if isinstance(r, (list, tuple)) else (r["num_frame"], r["landmarks"], r["t_s"])
+                          for r in cur.fetchall()]
+            conn.rollback()
+            yield from pagina
+            if len(pagina) < STREAM_ITERSIZE:
+                return
+            siguiente = int(pagina[-1][0]) + 1
+
+    def generar():
+        enviados = 0
+        try:
+            t0 = base_t = None
+            for nf, lmk, t_s in _filas():
+                t_s = float(t_s or 0.0)
+                if tiempo_real:
+                    if t0 is None:
+                        t0, base_t = time.monotonic(), t_s
+                    espera = (t_s - base_t) / velocidad - (time.monotonic() - t0)
+                    if espera > 0:
+                        time.sleep(espera)
+                yield _evento({"num_frame": nf, "t_s": round(t_s, 3), "landmarks": lmk}, nf)
+                enviados += 1
+            yield _evento({"fin": True, "frames": enviados}, evento="fin")
+        except Exception as e:
+            yield _evento({"ok": False, "error": str(e)}, evento="error")
+        finally:
+            try:
+                conn.rollback()
+                conn.close()
+            except Exception:
+                pass
+
+    mimetype = "application/x-ndjson" if formato == "ndjson" else "text/event-stream"
+    return Response(
+        stream_with_context(generar()),
+        mimetype=mimetype,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# =========================
+# GET /api/secuencias/<id>/peek  y  /frames  (vista previa; antes en subir_video.py)
+# =========================
+@historial_bp.route("/secuencias/<int:secuencia_id>/peek", methods=["GET"])
+def peek_secuencia(secuencia_id: int):
+    """Último frame de la secuencia (vista previa tras subir/capturar)."""
+    try:
+        asegurar_esquema()
+        with conexion() as conn, conn.cursor() as cur:
+            version = version_secuencia(cur, secuencia_id)
+            if version is None:
+                return jsonify({"ok": True, "peek_frame": {}}), 200
+            etag = etag_secuencia(secuencia_id, version)
+            if no_modificado(etag):
+                return respuesta_304(etag)
+
+            ejecutar(cur, "peek_frame", """
+                SELECT num_frame, landmarks
+                FROM frames
+                WHERE secuencia_id=%s
+                ORDER BY num_frame DESC
+                LIMIT 1
+            """, (secuencia_id,))
+            r = cur.fetchone()
+            if not r:
+                peek = {}
+            else:
+                num_frame, landmarks = (r[0], r[1]) if isinstance(r, tuple) else (r["num_frame"], r["landmarks"])
+                peek = {"idx_frame": num_frame, "landmarks": landmarks}
+        return aplicar_cache(jsonify({"ok": True, "peek_frame": peek}), etag), 200
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
+@historial_bp.route("/secuencias/<int:secuencia_id>/frames", methods=["GET"])
+def frames_secuencia(secuencia_id: int):
+    """Devuelve hasta 'limit' frames (por defecto 50) para mostrar en el panel JSON."""
+    try:
+        limit = int(request.args.get("limit", 50))
+        limit = max(1, min(500, limit))
+        asegurar_esquema()
+        with conexion() as conn, conn.cursor() as cur:
+            version = version_secuencia(cur, secuencia_id)
+            if version is None:
+                return jsonify({"ok": True, "count": 0, "items": []}), 200
+            etag = etag_secuencia(secuencia_id, version)
+            if no_modificado(etag):
+                return respuesta_304(etag)
+
+            ejecutar(cur, "primeros_frames", """
+                SELECT num_frame, landmarks
+                FROM frames
+                WHERE secuencia_id=%s
+                ORDER BY num_frame ASC
+                LIMIT %s
+            """, (secuencia_id, limit))
+            rows = cur.fetchall() or []
+            data = [{"idx_frame": r[0], "landmarks": r[1]} if isinstance(r, tuple)
+                    else {"idx_frame": r["num_frame"], "landmarks": r["landmarks"]} for r in rows]
+        return aplicar_cache(jsonify({"ok": True, "count": len(data), "items": data}), etag), 200
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
+# =========================
+# GET /api/secuencias/<id>/similares  (búsqueda por ejemplo)
+# =========================
+MAX_SIMILARES = 100
+
+@historial_bp.route("/secuencias/<int:secuencia_id>/similares", methods=["GET"])
+@admitir("similares")
+def similares_secuencia(secuencia_id: int):
+    """
+    GET /api/secuencias/<id>/similares?k=10&candidatos=64&misma_categoria=1
+
+    Secuencias más parecidas por trayectoria de manos y pose: poda con el
+    índice de embeddings en memoria y reordena los candidatos por DTW
+    (procesamiento/similitud.py). 'distancia' menor = más parecida.
+    Mientras el índice hace la carga inicial responde 503 con Retry-After.
+    """
+    try:
+        k = min(MAX_SIMILARES, max(1, int(request.args.get("k", 10))))
+        candidatos = int(request.args["candidatos"]) if request.args.get("candidatos") else None
+    except Exception:
+        return jsonify({"ok": False, "error": "k y candidatos deben ser enteros"}), 400
+    misma_categoria = (request.args.get("misma_categoria") or "").lower() in ("1", "true", "si", "sí")
+
+    try:
+        # numpy solo se carga con la primera búsqueda (despliegues solo-API)
+        from procesamiento import similitud
+
+        similitud.iniciar()
+        if not similitud.indice.listo:
+            resp = jsonify({"ok": False, "error": "Índice de similitud en construcción",
+                            "indice": similitud.indice.estadisticas()})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = "5"
+            return resp
+
+        candidatos = min(1000, max(k, candidatos or similitud.CANDIDATOS))
+        res = similitud.buscar_similares(secuencia_id, k, candidatos, misma_categoria)
+        if res is None:
+            return jsonify({"ok": False, "error": "Secuencia no encontrada"}), 404
+        return jsonify({"ok": True, "secuencia_id": secuencia_id, "k": k, **res,
+                        "indice": similitud.indice.estadisticas()}), 200
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
@@ -4,6 +4,8 @@ from bd.conexion import get_connection
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 from psycopg2.extras import RealDictCursor
+from web.admision import admitir
+from procesamiento.perf import registro as registro_perf
 
 metricas_bp = Blueprint("metricas_bp", __name__)
 
@@ -35,6 +37,7 @@ def metrics_overview_preflight():
     return ("", 204)
 
 @metricas_bp.route("/metrics/overview", methods=["GET"])
+@admitir("metricas")
 def overview():
     """
     GET /api/metrics/overview?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&fps=30&usuario_id=&categoria_slug=
@@ -259,3 +262,14 @@ def overview():
     except Exception as e:
         # Devuelve JSON siempre, para que el frontend lo maneje sin romperse
         return jsonify({"ok": False, "error": str(e)}), 500
+
+
+@metricas_bp.route("/metrics/perf", methods=["GET"])
+def perf():
+    """
+    GET /api/metrics/perf
+    Tiempos por etapa de las extracciones de video de este proceso (ver
+    procesamiento/perf.py): por ruta, duración de la petición y de cada etapa
+    (total, p50/p95/p99/máx en ms) sobre las últimas llamadas.
+    """
+    return jsonify({"ok": True, "perf": registro_perf.estadisticas()}), 200
@@ -0,0 +1,379 @@
+# routes/subir_lote.py
+# -*- coding: utf-8 -*-
+"""
+POST /api/subir_lote — ingesta de muchos videos en una sola petición.
+
+Entrada (multipart/form-data), una de dos:
+  - `archivo`: .zip / .tar / .tar.gz / .tgz con los videos y, opcionalmente,
+    un manifest.json o manifest.csv en la raíz;
+  - `videos` (repetido): los videos sueltos, con el manifest como campo
+    `manifest` (texto JSON/CSV o fichero).
+
+Manifest: filas {archivo, titulo, categoria_slug, subcategoria, modalidades, cara}
+(JSON: lista de objetos o {archivo: {...}}; CSV: cabecera con esas columnas).
+Lo que falte se toma del form (categoria_slug, subcategoria, usuario_id,
+modalidades, cara, muestreo, target_fps, fps_min, fps_max, inferencia_px,
+recortar) y, después, de los valores por defecto de /subir_video_multimodal.
+
+Las secuencias se crean con un solo INSERT multi-fila; los videos se extraen
+en paralelo en el pool de procesos (procesamiento/lote.py) y la respuesta es
+NDJSON: una línea por video según va terminando y una línea final de resumen.
+Una secuencia cuyo video falla se borra.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from psycopg2.extras import execute_values
+from werkzeug.utils import secure_filename
+
+from bd.conexion import get_connection
+from bd.esquema import asegurar_esquema
+from bd.spool import guardar_frames_o_spool
+from bd import checkpoints
+from procesamiento import calidad
+from procesamiento import cara as subconjuntos_cara
+from procesamiento import lote
+from procesamiento.detectores import disponible as mediapipe_disponible
+from procesamiento.recorte import RECORTE
+from procesamiento.video import MAX_LADO_HOLISTIC, max_lado_desde_form, muestreo_desde_form
+from web.admision import admitir
+
+bp = Blueprint("subir_lote", __name__)
+
+ALLOWED_EXTS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
+DEFAULT_TARGET_FPS = 6
+MAX_ARCHIVOS = int(os.environ.get("LOTE_MAX_ARCHIVOS", "500") or 500)
+MAX_BYTES = int(os.environ.get("LOTE_MAX_BYTES", str(8 * 1024 ** 3)))  # descomprimido
+LOTE_INSERT = 200  # frames por INSERT al guardar cada video
+_MANIFESTS = ("manifest.json", "manifest.csv")
+_CAMPOS = ("titulo", "categoria_slug", "subcategoria", "modalidades", "cara")
+
+
+class ErrorLote(ValueError):
+    """Entrada no válida (-> 400)."""
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Entrada: archivo comprimido o ficheros sueltos + manifest
+# ──────────────────────────────────────────────────────────────────────────────
+def _es_video(nombre: str) -> bool:
+    return os.path.splitext(nombre.lower())[1] in ALLOWED_EXTS
+
+
+def _destino(destino: str, base: str) -> str:
+    """Ruta libre para `base` (dos vídeos con el mismo nombre en carpetas distintas no se pisan)."""
+    salida, n = os.path.join(destino, base), 1
+    raiz, ext = os.path.splitext(base)
+    while os.path.exists(salida):
+        salida = os.path.join(destino, f"{raiz}_{n}{ext}")
+        n += 1
+    return salida
+
+
+def _parsear_manifest(texto: str, nombre: str = "") -> dict:
+    """Texto JSON o CSV -> {archivo: {campo: valor}} (archivo por nombre base)."""
+    texto = (texto or "").strip()
+    if not texto:
+        return {}
+    if nombre.lower().endswith(".json") or texto[0] in "[{":
+        try:
+            datos = json.loads(texto)
+        except ValueError as e:
+            raise ErrorLote(f"manifest JSON inválido: {e}")
+        if isinstance(datos, dict):
+            datos = [dict(v or {}, archivo=k) for k, v in datos.items()]
+        filas = datos if isinstance(datos, list) else []
+    else:
+        filas = list(csv.DictReader(io.StringIO(texto)))
+    manifest = {}
+    for fila in filas:
+        if not isinstance(fila, dict) or not fila.get("archivo"):
+            continue
+        manifest[os.path.basename(str(fila["archivo"]).strip())] = {
+            c: str(fila[c]).strip() for c in _CAMPOS if fila.get(c) not in (None, "")
+        }
+    return manifest
+
+
+def _extraer_zip(ruta: str, destino: str):
+    """Vuelca los videos (y el manifest) del zip en `destino`; devuelve (rutas, texto_manifest)."""
+    rutas, manifest, total = [], None, 0
+    with zipfile.ZipFile(ruta) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            base = secure_filename(os.path.basename(info.filename))
+            if base.lower() in _MANIFESTS and manifest is None:
+                manifest = (base, zf.read(info).decode("utf-8-sig", "replace"))
+                continue
+            if not base or not _es_video(base):
+                continue
+            total += info.file_size
+            if total > MAX_BYTES or len(rutas) >= MAX_ARCHIVOS:
+                raise ErrorLote(f"El archivo supera el límite ({MAX_ARCHIVOS} videos / {MAX_BYTES} bytes)")
+            salida = _destino(destino, base)
+            with zf.open(info) as src, open(salida, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            rutas.append(salida)
+    return rutas, manifest
+
+
+def _extraer_tar(ruta: str, destino: str):
+    rutas, manifest, total = [], None, 0
+    with tarfile.open(ruta, "r:*") as tf:
+        for miembro in tf:
+            if not miembro.isfile():
+                continue  # ni enlaces ni dispositivos
+            base = secure_filename(os.path.basename(miembro.name))
+            if base.lower() in _MANIFESTS and manifest is None:
+                manifest = (base, tf.extractfile(miembro).read().decode("utf-8-sig", "replace"))
+                continue
+            if not base or not _es_video(base):
+                continue
+            total += miembro.size
+            if total > MAX_BYTES or len(rutas) >= MAX_ARCHIVOS:
+                raise ErrorLote(f"El archivo supera el límite ({MAX_ARCHIVOS} videos / {MAX_BYTES} bytes)")
+            salida = _destino(destino, base)
+            with tf.extractfile(miembro) as src, open(salida, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            rutas.append(salida)
+    return rutas, manifest
+
+
+def _recibir_archivos(destino: str):
+    """Guarda la entrada en `destino` -> (rutas de video, manifest {archivo: {...}})."""
+    manifest_txt = None
+    if "archivo" in request.files and request.files["archivo"].filename:
+        f = request.files["archivo"]
+        nombre = secure_filename(f.filename).lower()
+        ruta = os.path.join(destino, "_entrada" + os.path.splitext(nombre)[1])
+        f.save(ruta)
+        try:
+            if zipfile.is_zipfile(ruta):
+                rutas, manifest_txt = _extraer_zip(ruta, destino)
+            elif tarfile.is_tarfile(ruta):
+                rutas, manifest_txt = _extraer_tar(ruta, destino)
+            else:
+                raise ErrorLote("'archivo' debe ser .zip o .tar(.gz)")
+        finally:
+            os.remove(ruta)
+    else:
+        rutas = []
+        for f in request.files.getlist("videos"):
+            base = secure_filename(f.filename or "")
+            if not base or not _es_video(base):
+                continue
+            if len(rutas) >= MAX_ARCHIVOS:
+                raise ErrorLote(f"Máximo {MAX_ARCHIVOS} videos por lote")
+            salida = _destino(destino, base)
+            f.save(salida)
+            rutas.append(salida)
+
+    # El manifest del form tiene prioridad sobre el del archivo
+    if "manifest" in request.files and request.files["manifest"].filename:
+        mf = request.files["manifest"]
+        manifest_txt = (mf.filename, mf.read().decode("utf-8-sig", "replace"))
+    elif (request.form.get("manifest") or "").strip():
+        manifest_txt = ("", request.form["manifest"])
+    manifest = _parsear_manifest(manifest_txt[1], manifest_txt[0]) if manifest_txt else {}
+    if not rutas:
+        raise ErrorLote("No se recibió ningún video (campo 'archivo' o 'videos')")
+    return rutas, manifest
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# BD
+# ──────────────────────────────────────────────────────────────────────────────
+def _categorias(cur, slugs):
+    """{slug: (id, modalidades)} de los slugs pedidos, en una consulta."""
+    slugs = sorted({s for s in slugs if s})
+    if not slugs:
+        return {}
+    cur.execute("SELECT slug, id, modalidades FROM categorias WHERE slug = ANY(%s)", (slugs,))
+    out = {}
+    for r in cur.fetchall():
+        slug, cid, mods = (r if isinstance(r, (list, tuple)) else (r["slug"], r["id"], r["modalidades"]))
+        out[slug] = (cid, mods)
+    return out
+
+
+def _insertar_secuencias(cur, items, usuario_id):
+    """Un INSERT multi-fila para todas las secuencias; devuelve los ids en el orden de `items`."""
+    filas = execute_values(cur, """
+        INSERT INTO secuencias (nombre, fecha, usuario_id, categoria_id, subcategoria, cara_indices, subida)
+        VALUES %s
+        RETURNING id
+    """, [(it["titulo"], usuario_id, it["categoria_id"], it["subcategoria"],
+           json.dumps(it["cara_mapa"]) if it["cara_mapa"] else None) for it in items],
+        template="(%s, NOW(), %s, %s, %s, %s::jsonb, 'subir_lote')", page_size=max(1, len(items)), fetch=True)
+    return [r[0] if isinstance(r, (list, tuple)) else r["id"] for r in filas]
+
+
+def _borrar_secuencia(secuencia_id: int):
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM frames WHERE secuencia_id = %s", (secuencia_id,))
+            cur.execute("DELETE FROM secuencias WHERE id = %s", (secuencia_id,))
+            conn.commit()
+    except Exception as e:
+        print(f"⚠️ subir_lote: no se pudo borrar la secuencia {secuencia_id}: {e}")
+
+
+def _guardar(secuencia_id: int, frames):
+    """Inserta los frames de un video por tandas; devuelve (guardados, todo_en_bd)."""
+    from procesamiento.normalizacion import NORMALIZACION_VERSION
+
+    en_bd = True
+    for i in range(0, len(frames), LOTE_INSERT):
+        tanda = frames[i:i + LOTE_INSERT]
+        en_bd = guardar_frames_o_spool([(secuencia_id, nf, p, c, NORMALIZACION_VERSION) for nf, p, c in tanda],
+                                       [secuencia_id]) and en_bd
+    return len(frames), en_bd
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Ruta
+# ──────────────────────────────────────────────────────────────────────────────
+@bp.route("/subir_lote", methods=["POST"])
+@admitir("lote")
+def subir_lote():
+    if not mediapipe_disponible():
+        return jsonify({"ok": False, "error": "MediaPipe no está instalado"}), 500
+
+    # Imports diferidos (numpy) como en subir_video_multimodal
+    from procesamiento import modalidades as mods
+
+    form = request.form
+    try:
+        usuario_id = int(form.get("usuario_id", "").strip() or 0) or None
+    except Exception:
+        usuario_id = None
+    try:
+        target_fps = max(1, min(15, int(form.get("target_fps", "").strip() or 0) or DEFAULT_TARGET_FPS))
+    except Exception:
+        target_fps = DEFAULT_TARGET_FPS
+    base_opciones = {
+        "muestreo": muestreo_desde_form(form, target_fps),
+        "max_lado": max_lado_desde_form(form.get("inferencia_px", ""), MAX_LADO_HOLISTIC),
+        "recortar": (form.get("recortar") or ("1" if RECORTE else "0")).strip().lower() not in ("0", "false", "no"),
+    }
+
+    tmpdir = tempfile.mkdtemp(prefix="lote_")
+    try:
+        rutas, manifest = _recibir_archivos(tmpdir)
+
+        # Metadatos por video: manifest > form > defecto
+        items = []
+        for ruta in rutas:
+            archivo = os.path.basename(ruta)
+            m = manifest.get(archivo, {})
+
+            def valor(campo, m=m):
+                return m.get(campo) or (form.get(campo) or "").strip() or None
+
+            items.append({
+                "archivo": archivo, "ruta": ruta,
+                "titulo": m.get("titulo") or os.path.splitext(archivo)[0],
+                "categoria_slug": (valor("categoria_slug") or "").lower() or None,
+                "subcategoria": valor("subcategoria"),
+                "modalidades_txt": valor("modalidades"),
+                "cara_txt": valor("cara"),
+            })
+
+        asegurar_esquema()
+        checkpoints.iniciar_limpieza()   # secuencias de lotes cortados a medias
+        with get_connection() as conn, conn.cursor() as cur:
+            categorias = _categorias(cur, [it["categoria_slug"] for it in items])
+            for it in items:
+                cid, mods_cat = categorias.get(it["categoria_slug"], (None, None))
+                it["categoria_id"] = cid
+                if it["modalidades_txt"]:
+                    it["modalidades"] = mods.parsear(it["modalidades_txt"])
+                    if not it["modalidades"]:
+                        raise ErrorLote(f"{it['archivo']}: modalidades no válidas: {it['modalidades_txt']}")
+                else:
+                    it["modalidades"] = mods.por_defecto(it["categoria_slug"], mods_cat)
+                try:
+                    it["cara"], it["cara_puntos"] = subconjuntos_cara.resolver(it["cara_txt"])
+                except ValueError as e:
+                    raise ErrorLote(f"{it['archivo']}: {e}")
+                if "face" not in it["modalidades"]:
+                    it["cara"], it["cara_puntos"] = "completa", None
+                it["cara_mapa"] = subconjuntos_cara.mapa(it["cara"], it["cara_puntos"])
+            ids = _insertar_secuencias(cur, items, usuario_id)
+            conn.commit()
+        for it, sid in zip(items, ids):
+            it["secuencia_id"] = sid
+    except ErrorLote as e:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except Exception as e:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+    def generar():
+        t0 = time.perf_counter()
+        pool = lote.pool()
+        pendientes = {}
+        correctos = fallidos = 0
+        try:
+            for it in items:
+                opciones = dict(base_opciones, modalidades=it["modalidades"], cara=it["cara"],
+                                cara_puntos=it["cara_puntos"])
+                pendientes[pool.submit(lote.extraer_archivo, it["ruta"], opciones)] = it
+            yield json.dumps({"evento": "inicio", "videos": len(items), "procesos": lote.PROCESOS}) + "\n"
+
+            while pendientes:
+                hechos, _ = wait(list(pendientes), return_when=FIRST_COMPLETED)
+                for fut in hechos:
+                    it = pendientes.pop(fut)
+                    linea = {"evento": "video", "archivo": it["archivo"], "secuencia_id": it["secuencia_id"],
+                             "titulo": it["titulo"], "categoria_slug": it["categoria_slug"]}
+                    try:
+                        res = fut.result()
+                        guardados, en_bd = _guardar(it["secuencia_id"], res["frames"])
+                        # El lote es trabajo de fondo: siempre a calidad completa
+                        calidad.registrar(it["secuencia_id"], calidad.efectivos(
+                            0, None, base_opciones["max_lado"], base_opciones["muestreo"], lote=True))
+                        linea.update(ok=True, frames_guardados=guardados, spool=not en_bd,
+                                     modalidades=list(it["modalidades"]), detecciones=res["detecciones"],
+                                     duracion_segundos=res["duracion_segundos"],
+                                     muestreo=res["muestreo"], recorte=res["recorte"], presupuesto=res["presupuesto"],
+                                     perf=res["perf"])
+                        correctos += 1
+                    except Exception as e:
+                        _borrar_secuencia(it["secuencia_id"])
+                        linea.update(ok=False, secuencia_id=None, error=str(e))
+                        fallidos += 1
+                    finally:
+                        try:
+                            os.remove(it["ruta"])
+                        except Exception:
+                            pass
+                    yield json.dumps(linea, ensure_ascii=False) + "\n"
+
+            yield json.dumps({"evento": "fin", "ok": fallidos == 0, "correctos": correctos,
+                              "fallidos": fallidos, "total_s": round(time.perf_counter() - t0, 2)}) + "\n"
+        finally:
+            # Cliente desconectado: lo no empezado se cancela; lo que corre termina solo
+            for fut, it in pendientes.items():
+                if fut.cancel():
+                    _borrar_secuencia(it["secuencia_id"])
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return Response(
+        stream_with_context(generar()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -12,24 +12,30 @@ Requisitos:
 """
 from __future__ import annotations
 import os
-import math
 import time
 import tempfile
 from typing import List, Dict, Optional, Tuple
 
-import numpy as np
-import cv2
-
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 
 from bd.conexion import get_connection
-
-try:
-    import mediapipe as mp
-    _mp_ok = True
-except Exception as _e:
-    _mp_ok = False
+from bd.spool import guardar_frames_o_spool
+from bd import checkpoints
+from bd.esquema import asegurar_esquema
+from procesamiento.detectores import detectores, disponible as mediapipe_disponible, CONFIG_HANDS
+from procesamiento.pipeline import ejecutar_etapas
+from procesamiento.recorte import intervalo_activo, RECORTE
+from procesamiento import calidad
+from procesamiento import perf
+from procesamiento.video import (frames, muestreo_desde_form, a_rgb, max_lado_desde_form, MAX_LADO_MANOS,
+                                 duracion_s, duracion_rango_s, con_presupuesto,
+                                 MAX_DURACION_S)
+from web.admision import admitir
+from procesamiento.roi import RoiMano, a_frame_completo, geometria
+
+# cv2 / numpy / mediapipe se importan dentro de la ruta (primer uso): registrar
+# este blueprint no carga librerías pesadas en el worker.
 
 bp = Blueprint("subir_video", __name__)
 
@@ -38,49 +44,13 @@ bp = Blueprint("subir_video", __name__)
 # ──────────────────────────────────────────────────────────────────────────────
 ALLOWED_EXTS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
 DEFAULT_TARGET_FPS = 6  # muestreo para no saturar la BD
+LOTE_PERSISTENCIA = 60  # frames por lote normalizado + INSERT
+ROI_MANO = os.environ.get("VIDEO_ROI_MANO", "1") != "0"  # recorte alrededor de la mano previa
 
 def _allowed_file(filename: str) -> bool:
     _, ext = os.path.splitext(filename.lower())
     return ext in ALLOWED_EXTS
 
-# ──────────────────────────────────────────────────────────────────────────────
-# Normalización simple de landmarks
-# ──────────────────────────────────────────────────────────────────────────────
-def _normalize_landmarks(pts: List[Dict[str, float]]) -> List[Dict[str, float]]:
-    """
-    1) Centra en la muñeca (landmark 0)
-    2) Escala por distancia palma (0->9 aprox) o norma L2 global
-    3) Rotación a eje base (0->5) para orientar la mano
-    """
-    if not pts or len(pts) < 21:
-        return pts
-
-    arr = np.array([[p["x"], p["y"], p["z"]] for p in pts], dtype=np.float32)
-
-    # 1) centrar en la muñeca (0)
-    origin = arr[0].copy()
-    arr -= origin
-
-    # 2) escala
-    ref = arr[9] if len(arr) > 9 else None
-    scale = np.linalg.norm(ref) if ref is not None else np.linalg.norm(arr)
-    if scale > 1e-6:
-        arr /= scale
-
-    # 3) rotación: alinear vector (0->5) con eje X
-    if len(arr) > 5:
-        v = arr[5]  # índice base
-        vx, vy = v[0], v[1]
-        ang = math.atan2(vy, vx)
-        cos_a, sin_a = math.cos(-ang), math.sin(-ang)
-        rot2d = np.array([[cos_a, -sin_a],
-                          [sin_a,  cos_a]], dtype=np.float32)
-        arr[:, :2] = arr[:, :2] @ rot2d.T
-
-    # devolver como dicts
-    out = [{"x": float(x), "y": float(y), "z": float(z)} for x, y, z in arr]
-    return out
-
 # ──────────────────────────────────────────────────────────────────────────────
 # DB helpers
 # ──────────────────────────────────────────────────────────────────────────────
@@ -98,28 +68,20 @@ def _insert_secuencia(cur, nombre: str, categoria_slug: Optional[str], subcatego
             categoria_id = None
 
     cur.execute("""
-        INSERT INTO secuencias (nombre, fecha, usuario_id, categoria_id, subcategoria)
-        VALUES (COALESCE(%s,''), NOW(), %s, %s, %s)
+        INSERT INTO secuencias (nombre, fecha, usuario_id, categoria_id, subcategoria, subida)
+        VALUES (COALESCE(%s,''), NOW(), %s, %s, %s, 'subir_video')
         RETURNING id
     """, (nombre, usuario_id, categoria_id, subcategoria))
     row = cur.fetchone()
     return row[0] if isinstance(row, tuple) else row.get("id")
 
-def _insert_frame(cur, secuencia_id: int, num_frame: int, landmarks_json) -> int:
-    import json
-    cur.execute("""
-        INSERT INTO frames (secuencia_id, num_frame, landmarks)
-        VALUES (%s, %s, %s) RETURNING id
-    """, (secuencia_id, num_frame, json.dumps(landmarks_json, ensure_ascii=False)))
-    r = cur.fetchone()
-    return r[0] if isinstance(r, tuple) else r.get("id")
-
 # ──────────────────────────────────────────────────────────────────────────────
 # Ruta principal
 # ──────────────────────────────────────────────────────────────────────────────
 @bp.route("/subir_video", methods=["POST"])
+@admitir("video")
 def subir_video():
-    if not _mp_ok:
+    if not mediapipe_disponible():
         return jsonify({"ok": False, "error": "MediaPipe no está instalado"}), 500
     if "video" not in request.files:
         return jsonify({"ok": False, "error": "Falta 'video' en el form-data"}), 400
@@ -144,73 +106,185 @@ def subir_video():
         target_fps = max(1, min(15, target_fps))
     except Exception:
         target_fps = DEFAULT_TARGET_FPS
+    muestreo = muestreo_desde_form(request.form, target_fps)
+    # Pre-pasada que descarta el tramo inicial/final sin manos (form recortar=0 la desactiva)
+    recortar = (request.form.get("recortar") or ("1" if RECORTE else "0")).strip().lower() not in ("0", "false", "no")
+    stats_muestreo = {}
+    cron = perf.Cronometro()
+    presupuesto = {}
+    # Resolución de inferencia (lado mayor, px; 0 = original) y recorte ROI de la mano
+    max_lado = max_lado_desde_form(request.form.get("inferencia_px", ""), MAX_LADO_MANOS)
+    usar_roi = (request.form.get("roi") or ("1" if ROI_MANO else "0")).strip().lower() not in ("0", "false", "no")
+    # Reanudar desde el checkpoint si es un reintento del mismo video (form reanudar=0 lo desactiva)
+    reanudar = checkpoints.REANUDAR and (request.form.get("reanudar") or "1").strip().lower() not in ("0", "false", "no")
+    roi = RoiMano()
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp:
         file.save(tmp.name)
         tmp_path = tmp.name
 
     cap = None
+    nivel = None   # turno del gobernador de calidad (None = aún no tomado)
+    secuencia_id = None
     frames_guardados = 0
-    manos_detectadas = 0
     peek_frame = None
+    en_bd = True
+    lote = []     # (num_frame, t_s, mano, array (21, 3)) sin normalizar, pendientes de guardar
 
     try:
-        with get_connection() as conn, conn.cursor() as cur:
-            # 1) crea secuencia
-            secuencia_id = _insert_secuencia(cur, titulo, categoria_slug, subcategoria, usuario_id)
-            conn.commit()
-
-            # 2) abre video y configura muestreo
-            cap = cv2.VideoCapture(tmp_path)
-            if not cap.isOpened():
-                raise RuntimeError("No se pudo abrir el video")
-            native_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-            frame_interval = max(1, int(round((native_fps / float(target_fps)))))
-
-            # 3) MediaPipe
-            mp_hands = mp.solutions.hands
-            hands = mp_hands.Hands(
-                static_image_mode=False,
-                max_num_hands=1,
-                model_complexity=1,
-                min_detection_confidence=0.5,
-                min_tracking_confidence=0.5,
+        import cv2
+        from procesamiento.normalizacion import (a_array, apilar, a_dicts, normalizar_manos, crudos_mano,
+                                                 NORMALIZACION_VERSION)
+
+        # 1) abre el video y comprueba el presupuesto antes de crear nada en la BD
+        cap = cv2.VideoCapture(tmp_path)
+        if not cap.isOpened():
+            raise RuntimeError("No se pudo abrir el video")
+        native_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if duracion_s(cap, native_fps) > MAX_DURACION_S:
+            return jsonify({"ok": False, "error": f"Video demasiado largo (máx. {MAX_DURACION_S:.0f} s)"}), 413
+
+        asegurar_esquema()
+        checkpoints.iniciar_limpieza()
+
+        # 2) ¿Reintento de una extracción interrumpida? (mismo archivo y mismo form)
+        ck = None
+        if reanudar:
+            hash_origen = checkpoints.hash_archivo(tmp_path)
+            clave_ck = checkpoints.clave_parametros({
+                "titulo": titulo, "categoria_slug": categoria_slug, "subcategoria": subcategoria,
+                "usuario_id": usuario_id, "muestreo": muestreo, "max_lado": max_lado, "roi": usar_roi,
+                "recortar": recortar})
+            ck = checkpoints.buscar(hash_origen, "subir_video", clave_ck)
+
+        # Nivel de calidad según la carga: puede bajar complejidad, resolución y fps
+        nivel = calidad.gobernador.entrar()
+        if ck:
+            # Se sigue con la secuencia y los ajustes efectivos del intento anterior
+            secuencia_id = ck["secuencia_id"]
+            efectivos = ck["parametros"]
+            nivel_aplicado, complejidad = efectivos["nivel"], efectivos["model_complexity"]
+            max_lado, muestreo, recorte = efectivos["max_lado"], efectivos["muestreo"], efectivos["recorte"]
+            frames_guardados = ck["frames_guardados"]
+        else:
+            nivel_aplicado = nivel
+            complejidad, max_lado, muestreo = calidad.aplicar(nivel, max_lado, muestreo)
+            recorte = None
+            if recortar:
+                with cron.medir("recorte"):
+                    recorte = intervalo_activo(tmp_path, native_fps)
+            with get_connection() as conn, conn.cursor() as cur:
+                # 3) crea secuencia
+                secuencia_id = _insert_secuencia(cur, titulo, categoria_slug, subcategoria, usuario_id)
+                conn.commit()
+            if reanudar:
+                checkpoints.crear(hash_origen, "subir_video", clave_ck, secuencia_id, {
+                    "nivel": nivel, "model_complexity": complejidad, "max_lado": max_lado,
+                    "muestreo": muestreo, "recorte": recorte})
+        frames_previos = frames_guardados
+
+        # 4) Etapas: decodificar (hilo) -> MediaPipe (este hilo) -> normalizar+guardar (hilo)
+        # El decodificador entrega BGR a resolución original: se recorta (ROI) y
+        # se reduce antes de convertir a RGB, así solo se convierten los píxeles útiles.
+        geometria_previa = [None]
+
+        def _procesar(rgb, region):
+            # Tracking de MediaPipe: la región de la llamada anterior solo vale si la
+            # geometría (ventana ROI o frame completo) no cambió; si cambió, se resetea
+            g = geometria(region)
+            if geometria_previa[0] is not None and g != geometria_previa[0]:
+                hands.reset()
+            geometria_previa[0] = g
+            with cron.medir("mediapipe"):
+                return hands.process(rgb)
+
+        def _inferir(item):
+            idx, t_s, bgr = item
+            alto, ancho = bgr.shape[:2]
+            pts, res = None, None
+            region = roi.region(ancho, alto) if usar_roi else None
+            if region is not None:
+                x0, y0, x1, y1 = region
+                with cron.medir("convertir"):
+                    rgb = a_rgb(bgr[y0:y1, x0:x1], max_lado)
+                res = _procesar(rgb, region)
+                if res.multi_hand_landmarks:
+                    pts = a_frame_completo(a_array(res.multi_hand_landmarks[0].landmark), region, ancho, alto)
+                    roi.stats["roi"] += 1
+                else:
+                    roi.stats["perdidas"] += 1
+            if pts is None:
+                # Sin caja previa o mano perdida en el recorte: frame completo
+                with cron.medir("convertir"):
+                    rgb = a_rgb(bgr, max_lado)
+                res = _procesar(rgb, None)
+                if res.multi_hand_landmarks:
+                    pts = a_array(res.multi_hand_landmarks[0].landmark)
+                    roi.stats["completo"] += 1
+            roi.actualizar(pts, ancho, alto)
+            if pts is None:
+                return None
+            return (
+                idx,
+                t_s,
+                (res.multi_handedness[0].classification[0].label
+                 if getattr(res, "multi_handedness", None) else "unknown"),
+                pts,
             )
 
-            idx = 0
-            num_frame = 0
-            ok, frame = cap.read()
-            while ok:
-                if idx % frame_interval == 0:
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    res = hands.process(rgb)
-                    if res.multi_hand_landmarks:
-                        lm = res.multi_hand_landmarks[0]
-                        pts = [{"x": float(p.x), "y": float(p.y), "z": float(p.z)} for p in lm.landmark]
-                        pts_norm = _normalize_landmarks(pts)
-
-                        _insert_frame(cur, secuencia_id, num_frame=num_frame, landmarks_json=pts_norm)
-                        frames_guardados += 1
-                        manos_detectadas += 1
-
-                        # guarda el último “peek”
-                        peek_frame = {
-                            "t_s": round(float(idx / (native_fps or 30.0)), 3),
-                            "mano": (res.multi_handedness[0].classification[0].label
-                                     if getattr(res, "multi_handedness", None) else "unknown"),
-                            "idx_frame": num_frame,
-                            "landmarks": pts_norm
-                        }
-                idx += 1
-                num_frame += 1
-                ok, frame = cap.read()
-
-            conn.commit()
+        def _volcar():
+            # Normalización por lote (T, 21, 3) + un INSERT multi-fila con los
+            # crudos al lado; si la BD está degradada el lote va al spool
+            nonlocal frames_guardados, peek_frame, en_bd
+            if not lote:
+                return
+            with cron.medir("normalizar"):
+                normalizados = a_dicts(normalizar_manos(apilar(c[3] for c in lote)))
+                filas = [(secuencia_id, c[0], pts, crudos_mano(c[3]), NORMALIZACION_VERSION)
+                         for c, pts in zip(lote, normalizados)]
+            en_bd = guardar_frames_o_spool(filas, [secuencia_id], perf=cron) and en_bd
+            frames_guardados += len(filas)
+            nf, t_s, mano, _ = lote[-1]
+            peek_frame = {"t_s": t_s, "mano": mano, "idx_frame": nf, "landmarks": normalizados[-1]}
+            lote.clear()
+            if reanudar and en_bd:
+                # Solo con todo confirmado en la BD (lo del spool aún podría perderse)
+                checkpoints.avanzar(secuencia_id, nf, t_s, frames_guardados)
+
+        def _persistir(crudo):
+            lote.append(crudo)
+            if len(lote) >= LOTE_PERSISTENCIA:
+                _volcar()
+
+        # Intervalo a extraer: el recorte, o lo que falta tras el último checkpoint
+        rango = checkpoints.rango(recorte, ck)
+        # Modo tracking también con ROI: la ventana de RoiMano se mantiene fija
+        # mientras la mano quepa y _procesar resetea el detector al cambiarla
+        config_hands = dict(CONFIG_HANDS, model_complexity=min(complejidad, 1))
+        with detectores.prestar("hands", **config_hands) as hands:
+            etapas = ejecutar_etapas(lambda: con_presupuesto(frames(cap, native_fps, muestreo, rgb=False,
+                                                                    stats=stats_muestreo,
+                                                                    recorte=rango,
+                                                                    perf=cron),
+                                                             presupuesto),
+                                     _inferir, _persistir, al_terminar=_volcar)
+        manos_detectadas = frames_guardados
 
         try:
             duracion = cap.get(cv2.CAP_PROP_FRAME_COUNT) / (native_fps or 30.0)
         except Exception:
             duracion = 0.0
+        # Frames muestreados / segundos del intervalo extraído (no del clip entero)
+        duracion_extraida = duracion_rango_s(duracion, native_fps, rango)
+        sampled_fps = (muestreo["target_fps"] if muestreo["modo"] == "fijo" or duracion_extraida <= 0
+                       else round(etapas["items"] / duracion_extraida, 2))
+        ajustes = calidad.efectivos(nivel_aplicado, complejidad, max_lado, muestreo, roi=usar_roi)
+        calidad.registrar(secuencia_id, ajustes)
+        # Cortada por presupuesto: el checkpoint queda para continuar con un reintento
+        reanudable = reanudar and bool(presupuesto.get("truncado"))
+        if reanudar and not reanudable:
+            checkpoints.terminar(secuencia_id)
+        resumen_perf = perf.finalizar("subir_video", cron, etapas, f" #{secuencia_id}")
 
         return jsonify({
             "ok": True,
@@ -221,62 +295,32 @@ def subir_video():
             "frames_guardados": frames_guardados,
             "manos_detectadas": manos_detectadas,
             "duracion_segundos": round(float(duracion), 2),
-            "sampled_fps": target_fps,
-            "peek_frame": peek_frame or {}
+            "sampled_fps": sampled_fps,
+            "muestreo": {**muestreo, "muestreados": etapas["items"], **stats_muestreo},
+            "recorte": recorte or {"aplicado": False},
+            "peek_frame": peek_frame or {},
+            "spool": not en_bd,
+            "inferencia": {"max_lado": max_lado, "roi": usar_roi, **roi.stats},
+            "calidad": ajustes,
+            "presupuesto": presupuesto,
+            "perf": resumen_perf,
+            "reanudada": ({"desde_frame": ck["ultimo_frame"] + 1, "frames_previos": frames_previos}
+                          if ck and ck["ultimo_frame"] is not None else False),
+            "reanudable": reanudable,
         }), 200
 
     except Exception as e:
         current_app.logger.exception("Error en /subir_video")
-        return jsonify({"ok": False, "error": str(e)}), 500
+        # Sin frames guardados la secuencia se borra; con frames queda para reanudar
+        reanudable = secuencia_id is not None and checkpoints.abandonar(secuencia_id, frames_guardados) and reanudar
+        return jsonify({"ok": False, "error": str(e), "secuencia_id": secuencia_id if reanudable else None,
+                        "reanudable": reanudable}), 500
     finally:
+        if nivel is not None:
+            calidad.gobernador.salir()
         try:
             if cap is not None: cap.release()
         except Exception: pass
         try:
             if tmp_path and os.path.exists(tmp_path): os.remove(tmp_path)
         except Exception: pass
-
-# ──────────────────────────────────────────────────────────────────────────────
-
-@bp.route("/secuencias/<int:secuencia_id>/peek", methods=["GET"])
-def peek_secuencia(secuencia_id: int):
-    try:
-        with get_connection() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT num_frame, landmarks
-                FROM frames
-                WHERE secuencia_id=%s
-                ORDER BY num_frame DESC
-                LIMIT 1
-            """, (secuencia_id,))
-            r = cur.fetchone()
-            if not r:
-                return jsonify({"ok": True, "peek_frame": {}}), 200
-            num_frame, landmarks = r[0], r[1]
-            return jsonify({"ok": True, "peek_frame": {
-                "idx_frame": num_frame,
-                "landmarks": landmarks
-            }}), 200
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
-
-
-@bp.route("/secuencias/<int:secuencia_id>/frames", methods=["GET"])
-def frames_secuencia(secuencia_id: int):
-    """Devuelve hasta 'limit' frames (por defecto 50) para mostrar en el panel JSON."""
-    try:
-        limit = int(request.args.get("limit", 50))
-        limit = max(1, min(500, limit))
-        with get_connection() as conn, conn.cursor() as cur:
-            cur.execute("""
-                SELECT num_frame, landmarks
-                FROM frames
-                WHERE secuencia_id=%s
-                ORDER BY num_frame ASC
-                LIMIT %s
-            """, (secuencia_id, limit))
-            rows = cur.fetchall() or []
-            data = [{"idx_frame": r[0], "landmarks": r[1]} for r in rows]
-            return jsonify({"ok": True, "count": len(data), "items": data}), 200
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
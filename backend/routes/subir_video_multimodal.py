@@ -1,100 +1,35 @@
 from __future__ import annotations
-import os, math, json, tempfile
+import os, json, tempfile
 from typing import List, Dict, Optional, Tuple
-import numpy as np
-import cv2
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 from bd.conexion import get_connection
-
-try:
-    import mediapipe as mp
-    _mp_ok = True
-except Exception:
-    _mp_ok = False
+from bd.spool import guardar_frames_o_spool
+from bd import checkpoints
+from bd.esquema import asegurar_esquema
+from procesamiento.detectores import disponible as mediapipe_disponible
+from procesamiento.pipeline import ejecutar_etapas
+from procesamiento.recorte import intervalo_activo, RECORTE
+from procesamiento.video import (frames, muestreo_desde_form, max_lado_desde_form, MAX_LADO_HOLISTIC,
+                                 duracion_s, duracion_rango_s, con_presupuesto,
+                                 MAX_DURACION_S)
+from web.admision import admitir
+from procesamiento import cara as subconjuntos_cara
+from procesamiento import calidad
+from procesamiento import perf
+
+# cv2 / numpy / mediapipe (y procesamiento.modalidades, que trae numpy): import
+# diferido dentro de la ruta (ver subir_video.py)
 
 bp = Blueprint("subir_video_multimodal", __name__)
 
 ALLOWED_EXTS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
 DEFAULT_TARGET_FPS = 6
+LOTE_PERSISTENCIA = 30  # frames por lote normalizado + INSERT (payloads con cara: ~30 KB/frame)
 
 def _allowed_file(filename: str) -> bool:
     return os.path.splitext(filename.lower())[1] in ALLOWED_EXTS
 
-# ---------- helpers de normalización ----------
-def _to_np(landmarks):
-    """Convierte lista de landmarks MediaPipe a np.array (N,3)."""
-    return np.array([[p.x, p.y, getattr(p, "z", 0.0)] for p in landmarks], dtype=np.float32)
-
-def _to_dict(arr: np.ndarray) -> List[Dict[str, float]]:
-    return [{"x": float(x), "y": float(y), "z": float(z)} for x, y, z in arr]
-
-def _rot2d(theta: float) -> np.ndarray:
-    c, s = math.cos(theta), math.sin(theta)
-    return np.array([[c, -s],[s, c]], dtype=np.float32)
-
-def _normalize_pose(arr: np.ndarray) -> np.ndarray:
-    """
-    Centro: mid-hips (avg de 23 y 24)
-    Escala: ancho de hombros (distancia 11-12)
-    Rotación: alinear línea de hombros con eje X.
-    """
-    if arr.shape[0] < 25:  # Pose tiene 33; por si vienen menos
-        return arr
-    # Centro en cadera media
-    mid_hips = (arr[23, :3] + arr[24, :3]) / 2.0
-    arr = arr - mid_hips
-
-    # Escala por hombros
-    shoulder_vec = arr[12, :3] - arr[11, :3]
-    scale = np.linalg.norm(shoulder_vec[:2]) or np.linalg.norm(arr[:, :2])
-    if scale > 1e-6:
-        arr = arr / scale
-
-    # Rotación 2D (xy)
-    ang = math.atan2(shoulder_vec[1], shoulder_vec[0] + 1e-9)
-    R = _rot2d(-ang)
-    arr[:, :2] = arr[:, :2] @ R.T
-    return arr
-
-def _normalize_face(arr: np.ndarray) -> np.ndarray:
-    """
-    Centro: nariz (0)
-    Escala: distancia inter-ocular (33-263)
-    Rotación opcional: NO, se deja como está (mejor para detalle fino).
-    """
-    if arr.shape[0] == 0:
-        return arr
-    origin = arr[0, :3].copy()
-    arr = arr - origin
-    # dist inter-ocular (puntos comunes de FaceMesh)
-    idx_l, idx_r = 33, 263
-    if max(idx_l, idx_r) < arr.shape[0]:
-        scale = np.linalg.norm(arr[idx_r, :2] - arr[idx_l, :2])
-    else:
-        scale = np.linalg.norm(arr[:, :2])
-    if scale > 1e-6:
-        arr = arr / scale
-    return arr
-
-def _normalize_hand(arr: np.ndarray) -> np.ndarray:
-    """
-    Igual a tu idea: centro en 0 (wrist), escala por norma o palma, rota alineando 0->5 al eje X.
-    """
-    if arr.shape[0] < 21:
-        return arr
-    origin = arr[0, :3].copy()
-    arr = arr - origin
-    ref = arr[9, :3]
-    scale = np.linalg.norm(ref) or np.linalg.norm(arr)
-    if scale > 1e-6:
-        arr = arr / scale
-    v = arr[5, :2]
-    ang = math.atan2(v[1], v[0] + 1e-9)
-    R = _rot2d(-ang)
-    arr[:, :2] = arr[:, :2] @ R.T
-    return arr
-
 def _insert_secuencia(cur, nombre: str, categoria_slug: Optional[str], subcategoria: Optional[str],
                       usuario_id: Optional[int]) -> int:
     categoria_id = None
@@ -103,33 +38,47 @@ def _insert_secuencia(cur, nombre: str, categoria_slug: Optional[str], subcatego
         r = cur.fetchone()
         if r: categoria_id = r[0] if isinstance(r, tuple) else r.get("id")
     cur.execute("""
-        INSERT INTO secuencias (nombre, fecha, usuario_id, categoria_id, subcategoria)
-        VALUES (COALESCE(%s,''), NOW(), %s, %s, %s)
+        INSERT INTO secuencias (nombre, fecha, usuario_id, categoria_id, subcategoria, subida)
+        VALUES (COALESCE(%s,''), NOW(), %s, %s, %s, 'subir_video_multimodal')
         RETURNING id
     """, (nombre, usuario_id, categoria_id, subcategoria))
     row = cur.fetchone()
     return row[0] if isinstance(row, tuple) else row.get("id")
 
-def _insert_frame(cur, secuencia_id: int, num_frame: int, payload_json) -> int:
-    cur.execute("""
-        INSERT INTO frames (secuencia_id, num_frame, landmarks)
-        VALUES (%s, %s, %s) RETURNING id
-    """, (secuencia_id, num_frame, json.dumps(payload_json, ensure_ascii=False)))
-    r = cur.fetchone()
-    return r[0] if isinstance(r, tuple) else r.get("id")
+def _modalidades_categoria(conn, categoria_slug: Optional[str]) -> Optional[str]:
+    """categorias.modalidades del slug (None si no hay o la columna no existe)."""
+    if not categoria_slug:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT modalidades FROM categorias WHERE slug=%s LIMIT 1", (categoria_slug,))
+            r = cur.fetchone()
+        if not r:
+            return None
+        return r[0] if isinstance(r, tuple) else r.get("modalidades")
+    except Exception:
+        conn.rollback()
+        return None
 
 @bp.route("/subir_video_multimodal", methods=["POST"])
+@admitir("video")
 def subir_video_multimodal():
     """
-    Extrae: pose(33), face(468), left_hand(21), right_hand(21) con normalización por modalidad.
+    Extrae: pose(33), face(468), left_hand(21), right_hand(21) con normalización por modalidad
+    (por lotes de frames, ver procesamiento/normalizacion.py).
+    Form `modalidades` ("manos" | "manos_pose" | "completo" | lista "pose,manos,...")
+    elige los modelos a ejecutar; sin él se usan los de la categoría
+    (ver procesamiento/modalidades.py). Las no pedidas quedan como [].
+    Form `cara`: subconjunto de la malla facial a guardar ("lse_nmf" por defecto,
+    "completa" = 468/478); el mapa de índices queda en secuencias.cara_indices.
     Guarda en frames.landmarks un JSON:
     {
       "pose": [...], "face": [...],
       "left_hand": [...], "right_hand": [...],
-      "meta": {"t_s": float, "fps_native": float}
+      "meta": {"t_s": float, "fps_native": float, "modalidades": [...], "cara": str}
     }
     """
-    if not _mp_ok:
+    if not mediapipe_disponible():
         return jsonify({"ok": False, "error": "MediaPipe no está instalado"}), 500
     if "video" not in request.files:
         return jsonify({"ok": False, "error": "Falta 'video' en el form-data"}), 400
@@ -154,103 +103,182 @@ def subir_video_multimodal():
         target_fps = max(1, min(15, target_fps))
     except Exception:
         target_fps = DEFAULT_TARGET_FPS
+    muestreo = muestreo_desde_form(request.form, target_fps)
+    # Pre-pasada que descarta el tramo inicial/final sin manos (form recortar=0 la desactiva)
+    recortar = (request.form.get("recortar") or ("1" if RECORTE else "0")).strip().lower() not in ("0", "false", "no")
+    stats_muestreo = {}
+    cron = perf.Cronometro()
+    presupuesto = {}
+    # Resolución de inferencia (lado mayor, px; 0 = original). Holistic recorta
+    # cara y manos de esta imagen, por eso el valor por defecto es mayor que en manos.
+    max_lado = max_lado_desde_form(request.form.get("inferencia_px", ""), MAX_LADO_HOLISTIC)
+    modalidades_form = (request.form.get("modalidades") or "").strip()
+    # Reanudar desde el checkpoint si es un reintento del mismo video (form reanudar=0 lo desactiva)
+    reanudar = checkpoints.REANUDAR and (request.form.get("reanudar") or "1").strip().lower() not in ("0", "false", "no")
+    try:
+        cara_nombre, cara_puntos = subconjuntos_cara.resolver(request.form.get("cara"))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp:
         file.save(tmp.name)
         tmp_path = tmp.name
 
     cap = None
+    nivel = None   # turno del gobernador de calidad (None = aún no tomado)
+    secuencia_id = None
     frames_guardados = 0
     detecciones = {"pose":0, "face":0, "hands":0}
     peek_frame = None
+    en_bd = True
+    lote = []     # (num_frame, meta, {modalidad: array (K, 3)}) pendientes de guardar
 
     try:
-        with get_connection() as conn, conn.cursor() as cur:
-            secuencia_id = _insert_secuencia(cur, titulo, categoria_slug, subcategoria, usuario_id)
-            conn.commit()
-
-            cap = cv2.VideoCapture(tmp_path)
-            if not cap.isOpened():
-                raise RuntimeError("No se pudo abrir el video")
-            native_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-            frame_interval = max(1, int(round((native_fps / float(target_fps)))))  # muestreo
-
-            mp_holistic = mp.solutions.holistic
-            holistic = mp_holistic.Holistic(
-                static_image_mode=False,
-                model_complexity=1,
-                refine_face_landmarks=True,
-                enable_segmentation=False,
-                min_detection_confidence=0.5,
-                min_tracking_confidence=0.5
-            )
-
-            idx = 0
-            num_frame = 0
-            ok, frame = cap.read()
-            while ok:
-                if idx % frame_interval == 0:
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    res = holistic.process(rgb)
-
-                    pose_json = face_json = lhand_json = rhand_json = []
-                    any_modality = False
-
-                    # Pose / torso
-                    if res.pose_landmarks:
-                        arr = _to_np(res.pose_landmarks.landmark)
-                        arr = _normalize_pose(arr)
-                        pose_json = _to_dict(arr)
-                        detecciones["pose"] += 1
-                        any_modality = True
-
-                    # Face
-                    if res.face_landmarks:
-                        arr = _to_np(res.face_landmarks.landmark)
-                        arr = _normalize_face(arr)
-                        face_json = _to_dict(arr)
-                        detecciones["face"] += 1
-                        any_modality = True
-
-                    # Left hand
-                    if res.left_hand_landmarks:
-                        arr = _to_np(res.left_hand_landmarks.landmark)
-                        arr = _normalize_hand(arr)
-                        lhand_json = _to_dict(arr)
-                        any_modality = True
-
-                    # Right hand
-                    if res.right_hand_landmarks:
-                        arr = _to_np(res.right_hand_landmarks.landmark)
-                        arr = _normalize_hand(arr)
-                        rhand_json = _to_dict(arr)
-                        any_modality = True
-
-                    if any_modality:
-                        payload = {
-                            "pose": pose_json,
-                            "face": face_json,
-                            "left_hand": lhand_json,
-                            "right_hand": rhand_json,
-                            "meta": {"t_s": round(float(idx/(native_fps or 30.0)), 3),
-                                     "fps_native": float(native_fps)}
-                        }
-                        _insert_frame(cur, secuencia_id, num_frame=num_frame, payload_json=payload)
-                        frames_guardados += 1
-
-                        # último peek
-                        peek_frame = payload
-
-                idx += 1
-                num_frame += 1
-                ok, frame = cap.read()
-
-            conn.commit()
+        import cv2
+        from procesamiento.normalizacion import normalizar_multimodal, a_crudos, NORMALIZACION_VERSION
+        from procesamiento import modalidades as mods
+
+        if modalidades_form:
+            modalidades = mods.parsear(modalidades_form)
+            if not modalidades:
+                return jsonify({"ok": False, "error": f"modalidades no válidas: {modalidades_form}"}), 400
+
+        # Presupuesto antes de crear nada en la BD
+        cap = cv2.VideoCapture(tmp_path)
+        if not cap.isOpened():
+            raise RuntimeError("No se pudo abrir el video")
+        native_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if duracion_s(cap, native_fps) > MAX_DURACION_S:
+            return jsonify({"ok": False, "error": f"Video demasiado largo (máx. {MAX_DURACION_S:.0f} s)"}), 413
+
+        asegurar_esquema()
+        checkpoints.iniciar_limpieza()
+
+        # ¿Reintento de una extracción interrumpida? (mismo archivo y mismo form)
+        ck = None
+        if reanudar:
+            hash_origen = checkpoints.hash_archivo(tmp_path)
+            clave_ck = checkpoints.clave_parametros({
+                "titulo": titulo, "categoria_slug": categoria_slug, "subcategoria": subcategoria,
+                "usuario_id": usuario_id, "muestreo": muestreo, "max_lado": max_lado, "recortar": recortar,
+                "modalidades": modalidades_form, "cara": cara_nombre})
+            ck = checkpoints.buscar(hash_origen, "subir_video_multimodal", clave_ck)
+
+        # Nivel de calidad según la carga; lo pedido se guarda para un posible reproceso
+        nivel = calidad.gobernador.entrar()
+        if ck:
+            # Se sigue con la secuencia y los ajustes efectivos del intento anterior
+            secuencia_id = ck["secuencia_id"]
+            efectivos = ck["parametros"]
+            pedido = efectivos["pedido"]
+            modalidades, cara_nombre = tuple(pedido["modalidades"]), pedido["cara"]
+            cara_puntos = tuple(pedido["cara_puntos"]) if pedido["cara_puntos"] else None
+            nivel_aplicado, complejidad = efectivos["nivel"], efectivos["model_complexity"]
+            max_lado, muestreo, recorte = efectivos["max_lado"], efectivos["muestreo"], efectivos["recorte"]
+            frames_guardados = ck["frames_guardados"]
+        else:
+            with get_connection() as conn:
+                if not modalidades_form:
+                    modalidades = mods.por_defecto(categoria_slug, _modalidades_categoria(conn, categoria_slug))
+                if "face" not in modalidades:
+                    cara_nombre, cara_puntos = "completa", None
+                with conn.cursor() as cur:
+                    secuencia_id = _insert_secuencia(cur, titulo, categoria_slug, subcategoria, usuario_id)
+                    cara_mapa = subconjuntos_cara.mapa(cara_nombre, cara_puntos)
+                    if cara_mapa:
+                        cur.execute("UPDATE secuencias SET cara_indices = %s WHERE id = %s",
+                                    (json.dumps(cara_mapa), secuencia_id))
+                conn.commit()
+            pedido = {"modalidades": modalidades, "cara": cara_nombre, "cara_puntos": cara_puntos,
+                      "muestreo": muestreo, "max_lado": max_lado, "recortar": recortar}
+            nivel_aplicado = nivel
+            complejidad, max_lado, muestreo = calidad.aplicar(nivel, max_lado, muestreo)
+            recorte = None
+            if recortar:
+                with cron.medir("recorte"):
+                    recorte = intervalo_activo(tmp_path, native_fps)
+            if reanudar:
+                checkpoints.crear(hash_origen, "subir_video_multimodal", clave_ck, secuencia_id, {
+                    "nivel": nivel, "model_complexity": complejidad, "max_lado": max_lado,
+                    "muestreo": muestreo, "recorte": recorte,
+                    "pedido": dict(pedido, modalidades=list(modalidades),
+                                   cara_puntos=list(cara_puntos) if cara_puntos else None)})
+        frames_previos = frames_guardados
+        cara_crudos = subconjuntos_cara.indices_crudos(cara_puntos)
+
+        # Etapas: decodificar (hilo) -> MediaPipe (este hilo) -> normalizar+guardar (hilo)
+        def _inferir(item):
+            idx, t_s, rgb = item
+            # Arrays crudos por modalidad; se normalizan por lotes en la etapa de persistencia
+            with cron.medir("mediapipe"):
+                crudo = procesar(rgb)
+            if "pose" in crudo:
+                detecciones["pose"] += 1
+            if "face" in crudo:
+                detecciones["face"] += 1
+            if "left_hand" in crudo or "right_hand" in crudo:
+                detecciones["hands"] += 1
+            if not crudo:
+                return None
+            meta = {"t_s": t_s,
+                    "fps_native": float(native_fps),
+                    "modalidades": list(modalidades),
+                    "cara": cara_nombre}
+            return idx, meta, crudo
+
+        def _volcar():
+            # Normalización vectorizada por modalidad (T, K, 3) + un INSERT multi-fila
+            # con los crudos al lado (o spool si la BD está degradada)
+            nonlocal frames_guardados, peek_frame, en_bd
+            if not lote:
+                return
+            with cron.medir("normalizar"):
+                payloads = normalizar_multimodal([crudo for _, _, crudo in lote], cara_puntos)
+                for (_, meta, _), payload in zip(lote, payloads):
+                    payload["meta"] = meta
+                filas = [(secuencia_id, nf, payload, a_crudos(crudo, cara_crudos), NORMALIZACION_VERSION)
+                         for (nf, _, crudo), payload in zip(lote, payloads)]
+            en_bd = guardar_frames_o_spool(filas, [secuencia_id], perf=cron) and en_bd
+            frames_guardados += len(filas)
+            peek_frame = payloads[-1]
+            nf, meta, _ = lote[-1]
+            lote.clear()
+            if reanudar and en_bd:
+                # Solo con todo confirmado en la BD (lo del spool aún podría perderse)
+                checkpoints.avanzar(secuencia_id, nf, meta["t_s"], frames_guardados)
+
+        def _persistir(capturado):
+            lote.append(capturado)
+            if len(lote) >= LOTE_PERSISTENCIA:
+                _volcar()
+
+        # Intervalo a extraer: el recorte, o lo que falta tras el último checkpoint
+        rango = checkpoints.rango(recorte, ck)
+        with mods.extractor(modalidades, complejidad) as procesar:
+            etapas = ejecutar_etapas(lambda: con_presupuesto(frames(cap, native_fps, muestreo, max_lado,
+                                                                    stats=stats_muestreo,
+                                                                    recorte=rango,
+                                                                    perf=cron),
+                                                             presupuesto),
+                                     _inferir, _persistir, al_terminar=_volcar)
 
         try:
             duracion = cap.get(cv2.CAP_PROP_FRAME_COUNT) / (native_fps or 30.0)
         except Exception:
             duracion = 0.0
+        # Frames muestreados / segundos del intervalo extraído (no del clip entero)
+        duracion_extraida = duracion_rango_s(duracion, native_fps, rango)
+        sampled_fps = (muestreo["target_fps"] if muestreo["modo"] == "fijo" or duracion_extraida <= 0
+                       else round(etapas["items"] / duracion_extraida, 2))
+        # Cortada por presupuesto: el checkpoint queda para continuar con un reintento
+        reanudable = reanudar and bool(presupuesto.get("truncado"))
+        if reanudar and not reanudable:
+            checkpoints.terminar(secuencia_id)
+        reproceso = (bool(nivel_aplicado) and not reanudable
+                     and calidad.encolar_reproceso(tmp_path, secuencia_id, pedido))
+        ajustes = calidad.efectivos(nivel_aplicado, complejidad, max_lado, muestreo, reproceso_pendiente=reproceso)
+        calidad.registrar(secuencia_id, ajustes)
+        resumen_perf = perf.finalizar("subir_video_multimodal", cron, etapas, f" #{secuencia_id}")
 
         return jsonify({
             "ok": True,
@@ -260,15 +288,33 @@ def subir_video_multimodal():
             "subcategoria": subcategoria,
             "frames_guardados": frames_guardados,
             "detecciones": detecciones,
+            "modalidades": list(modalidades),
+            "extractor": mods.nombre_extractor(modalidades),
+            "cara": subconjuntos_cara.mapa(cara_nombre, cara_puntos) or {"subconjunto": cara_nombre},
             "duracion_segundos": round(float(duracion), 2),
-            "sampled_fps": target_fps,
-            "peek_frame": peek_frame or {}
+            "sampled_fps": sampled_fps,
+            "muestreo": {**muestreo, "muestreados": etapas["items"], **stats_muestreo},
+            "recorte": recorte or {"aplicado": False},
+            "peek_frame": peek_frame or {},
+            "spool": not en_bd,
+            "inferencia": {"max_lado": max_lado},
+            "calidad": ajustes,
+            "presupuesto": presupuesto,
+            "perf": resumen_perf,
+            "reanudada": ({"desde_frame": ck["ultimo_frame"] + 1, "frames_previos": frames_previos}
+                          if ck and ck["ultimo_frame"] is not None else False),
+            "reanudable": reanudable,
         }), 200
 
     except Exception as e:
         current_app.logger.exception("Error en /subir_video_multimodal")
-        return jsonify({"ok": False, "error": str(e)}), 500
+        # Sin frames guardados la secuencia se borra; con frames queda para reanudar
+        reanudable = secuencia_id is not None and checkpoints.abandonar(secuencia_id, frames_guardados) and reanudar
+        return jsonify({"ok": False, "error": str(e), "secuencia_id": secuencia_id if reanudable else None,
+                        "reanudable": reanudable}), 500
     finally:
+        if nivel is not None:
+            calidad.gobernador.salir()
         try:
             if cap is not None: cap.release()
         except Exception: pass
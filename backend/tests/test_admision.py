@@ -0,0 +1,136 @@
+# backend/tests/test_admision.py
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from web import admision
+from web.admision import ControlAdmision, Rechazo, _Clase
+
+
+def _control(max_pesados=8, **clases):
+    ctl = ControlAdmision(max_pesados)
+    for nombre, (maximo, cola, espera_s) in clases.items():
+        ctl._clases[nombre] = _Clase(nombre, maximo, cola, espera_s)
+    return ctl
+
+
+def _esperar(condicion, limite_s=2.0):
+    fin = time.monotonic() + limite_s
+    while not condicion():
+        assert time.monotonic() < fin, "la condición no llegó a cumplirse"
+        time.sleep(0.005)
+
+
+def _entrar_en_hilo(ctl, clase):
+    resultado = {}
+
+    def correr():
+        try:
+            resultado["desde"] = ctl.entrar(clase)
+        except Rechazo as r:
+            resultado["rechazo"] = r
+    hilo = threading.Thread(target=correr, daemon=True)
+    hilo.start()
+    return hilo, resultado
+
+
+def test_encola_y_entra_al_liberarse_el_hueco():
+    ctl = _control(video=(1, 2, 5.0))
+    desde = ctl.entrar("video")
+    hilo, resultado = _entrar_en_hilo(ctl, "video")
+    _esperar(lambda: ctl.estadisticas()["esperando"] == 1)
+    ctl.salir("video", desde)
+    hilo.join(2)
+    assert "desde" in resultado
+    stats = ctl.estadisticas()
+    assert stats["pesados"] == 1 and stats["esperando"] == 0
+    assert stats["clases"]["video"]["encoladas"] == 1 and stats["clases"]["video"]["admitidas"] == 2
+
+
+def test_cola_llena_429():
+    ctl = _control(video=(1, 1, 5.0))
+    desde = ctl.entrar("video")
+    hilo, _ = _entrar_en_hilo(ctl, "video")
+    _esperar(lambda: ctl.estadisticas()["esperando"] == 1)
+    with pytest.raises(Rechazo) as exc:
+        ctl.entrar("video")
+    assert exc.value.status == 429 and exc.value.reintentar_s >= 1
+    ctl.salir("video", desde)
+    hilo.join(2)
+    assert ctl.estadisticas()["clases"]["video"]["rechazadas_429"] == 1
+
+
+def test_sin_cola_rechaza_enseguida():
+    ctl = _control(lote=(1, 0, 0.0))
+    ctl.entrar("lote")
+    with pytest.raises(Rechazo) as exc:
+        ctl.entrar("lote")
+    assert exc.value.status == 429
+
+
+def test_espera_agotada_503_y_libera_la_cola():
+    ctl = _control(video=(1, 2, 0.05))
+    ctl.entrar("video")
+    with pytest.raises(Rechazo) as exc:
+        ctl.entrar("video")
+    assert exc.value.status == 503
+    stats = ctl.estadisticas()
+    assert stats["esperando"] == 0 and stats["clases"]["video"]["esperando"] == 0
+    assert stats["clases"]["video"]["rechazadas_503"] == 1
+
+
+def test_tope_de_hilos_entre_clases():
+    ctl = _control(max_pesados=2, video=(4, 4, 5.0), exportar=(4, 4, 5.0))
+    a = ctl.entrar("video")
+    ctl.entrar("exportar")
+    # Ninguna clase está en su máximo, pero las pesadas ya ocupan todos sus hilos
+    with pytest.raises(Rechazo) as exc:
+        ctl.entrar("video")
+    assert exc.value.status == 429
+    ctl.salir("video", a)
+    ctl.entrar("video")
+    assert ctl.estadisticas()["pesados"] == 2
+
+
+def test_las_encoladas_cuentan_para_el_tope():
+    ctl = _control(max_pesados=3, video=(2, 4, 5.0), exportar=(1, 4, 5.0))
+    a = ctl.entrar("video")
+    ctl.entrar("video")
+    hilo, resultado = _entrar_en_hilo(ctl, "video")     # cola de video, retiene un hilo
+    _esperar(lambda: ctl.estadisticas()["esperando"] == 1)
+    ctl.entrar("exportar")                               # tercer hilo pesado
+    with pytest.raises(Rechazo) as exc:
+        ctl.entrar("exportar")                           # 3 admitidas + 1 encolada >= 3
+    assert exc.value.status == 429
+    ctl.salir("video", a)                                # la encolada hereda el hueco
+    hilo.join(2)
+    stats = ctl.estadisticas()
+    assert "desde" in resultado and stats["pesados"] == 3 and stats["esperando"] == 0
+
+
+def test_decorador_responde_429_con_retry_after(monkeypatch):
+    ctl = _control(lote=(1, 0, 0.0))
+    monkeypatch.setattr(admision, "control", ctl)
+    app = Flask(__name__)
+    dentro = threading.Event()
+    soltar = threading.Event()
+
+    @app.route("/lento")
+    @admision.admitir("lote")
+    def lento():
+        dentro.set()
+        soltar.wait(2)
+        return {"ok": True}
+
+    hilo = threading.Thread(target=lambda: app.test_client().get("/lento"), daemon=True)
+    hilo.start()
+    assert dentro.wait(2)
+    resp = app.test_client().get("/lento")
+    assert resp.status_code == 429 and resp.headers["Retry-After"].isdigit()
+    assert resp.get_json()["ok"] is False
+    soltar.set()
+    hilo.join(2)
+    assert ctl.estadisticas()["pesados"] == 0
+    assert app.test_client().get("/lento").status_code == 200
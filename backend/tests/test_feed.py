@@ -0,0 +1,83 @@
+# backend/tests/test_feed.py
+import pytest
+
+from bd import feed
+
+
+class _Cursor:
+    """Cursor falso sobre filas {id, cambio_id, cambio_xid}: aplica el filtro y orden de leer_cambios."""
+
+    def __init__(self, filas, xmin):
+        self.filas, self.xmin = filas, xmin
+        self._resultado = []
+
+    def execute(self, sql, params=None):
+        if "txid_current_snapshot" in sql:
+            self._resultado = [{"xmin": self.xmin}]
+            return
+        xmin, *resto, limite = params
+        visibles = [f for f in self.filas if (f["cambio_xid"] or 0) < xmin]
+        if "(s.cambio_xid, s.id) >" in sql:
+            xid, sid = resto
+            sel = sorted((f for f in visibles if (f["cambio_xid"], f["id"]) > (xid, sid)),
+                         key=lambda f: (f["cambio_xid"], f["id"]))
+        else:
+            (desde,) = resto
+            sel = sorted((f for f in visibles if f["cambio_id"] > desde), key=lambda f: f["cambio_id"])
+        self._resultado = [dict(f, _cambio_id=f["cambio_id"], _cambio_xid=f["cambio_xid"]) for f in sel[:limite]]
+
+    def fetchone(self):
+        return self._resultado[0]
+
+    def fetchall(self):
+        return self._resultado
+
+
+def _fila(sid, cambio_id, xid):
+    return {"id": sid, "cambio_id": cambio_id, "cambio_xid": xid}
+
+
+@pytest.mark.parametrize("token,esperado", [
+    ("120.7", ("xid", 120, 7)),
+    (" 5.0 ", ("xid", 5, 0)),
+    ("42", ("cambio_id", 42, 0)),
+    ("-3", ("cambio_id", 0, 0)),
+])
+def test_parsear_token(token, esperado):
+    assert feed.parsear_token(token) == esperado
+
+
+@pytest.mark.parametrize("token", ["", "abc", "1.x", "1.2.3"])
+def test_parsear_token_invalido(token):
+    with pytest.raises(ValueError):
+        feed.parsear_token(token)
+
+
+def test_leer_cambios_ordena_por_xid_e_id_y_pagina():
+    filas = [_fila(3, 10, 101), _fila(1, 12, 100), _fila(2, 11, 101), _fila(4, 13, 102)]
+    cur = _Cursor(filas, xmin=200)
+    vistas, token, mas = feed.leer_cambios(cur, "0.0", 3)
+    assert [f["id"] for f in vistas] == [1, 2, 3] and mas and token == "101.3"
+    vistas, token, mas = feed.leer_cambios(cur, token, 3)
+    assert [f["id"] for f in vistas] == [4] and not mas and token == "200.0"
+
+
+def test_leer_cambios_no_se_salta_un_commit_tardio():
+    # La transacción 105 (cambio_id menor) sigue abierta: xmin = 105
+    filas = [_fila(1, 20, 104), _fila(2, 19, 105)]
+    cur = _Cursor(filas, xmin=105)
+    vistas, token, _ = feed.leer_cambios(cur, "0.0", 10)
+    assert [f["id"] for f in vistas] == [1] and token == "105.0"
+    # Confirma: ya es visible por debajo de xmin y el token anterior no lo deja atrás
+    cur.xmin = 106
+    vistas, token, _ = feed.leer_cambios(cur, token, 10)
+    assert [f["id"] for f in vistas] == [2] and token == "106.0"
+
+
+def test_leer_cambios_token_antiguo_devuelve_token_nuevo_al_agotar():
+    filas = [_fila(1, 5, 100), _fila(2, 6, 100), _fila(3, 7, 101)]
+    cur = _Cursor(filas, xmin=150)
+    vistas, token, mas = feed.leer_cambios(cur, "5", 1)
+    assert [f["id"] for f in vistas] == [2] and mas and token == "6"
+    vistas, token, mas = feed.leer_cambios(cur, token, 10)
+    assert [f["id"] for f in vistas] == [3] and not mas and token == "150.0"
@@ -0,0 +1,93 @@
+# backend/tests/test_normalizacion.py
+"""Las versiones en lote frente a las funciones frame a frame que sustituyeron."""
+import numpy as np
+import pytest
+
+from procesamiento.normalizacion import (
+    a_array, a_dicts, normalizar_caras, normalizar_lista, normalizar_manos, normalizar_poses,
+)
+
+
+def _rotar(arr, v, eps=0.0):
+    ang = np.arctan2(v[1], v[0] + eps)
+    rot2d = np.array([[np.cos(-ang), -np.sin(-ang)], [np.sin(-ang), np.cos(-ang)]])
+    arr[:, :2] = arr[:, :2] @ rot2d.T
+    return arr
+
+
+def _mano_por_frame(arr):
+    # subir_video._normalize_landmarks / multimodal._normalize_hand
+    arr = arr.astype(np.float64) - arr[0]
+    escala = np.linalg.norm(arr[9]) or np.linalg.norm(arr)
+    arr = arr / escala
+    return _rotar(arr, arr[5])
+
+
+def _pose_por_frame(arr):
+    # multimodal._normalize_pose
+    arr = arr.astype(np.float64) - (arr[23] + arr[24]) / 2.0
+    hombros = arr[12] - arr[11]
+    escala = np.linalg.norm(hombros[:2]) or np.linalg.norm(arr[:, :2])
+    arr = arr / escala
+    return _rotar(arr, hombros, eps=1e-9)
+
+
+def _cara_por_frame(arr):
+    # multimodal._normalize_face
+    arr = arr.astype(np.float64) - arr[0]
+    if arr.shape[0] > 263:
+        escala = np.linalg.norm(arr[263, :2] - arr[33, :2])
+    else:
+        escala = np.linalg.norm(arr[:, :2])
+    return arr / escala
+
+
+def _aleatorio(t, k, semilla):
+    return np.random.default_rng(semilla).uniform(0.1, 0.9, size=(t, k, 3)).astype(np.float32)
+
+
+@pytest.mark.parametrize("lote,por_frame,k", [
+    (normalizar_manos, _mano_por_frame, 21),
+    (normalizar_poses, _pose_por_frame, 33),
+    (normalizar_caras, _cara_por_frame, 468),
+    (normalizar_caras, _cara_por_frame, 478),
+    (normalizar_caras, _cara_por_frame, 120),
+])
+def test_lote_igual_que_por_frame(lote, por_frame, k):
+    arr = _aleatorio(16, k, k)
+    esperado = np.stack([por_frame(f) for f in arr])
+    np.testing.assert_allclose(lote(arr), esperado, atol=1e-5)
+
+
+def test_escala_cero_usa_la_norma_del_frame():
+    arr = _aleatorio(3, 21, 7)
+    arr[:, 9] = arr[:, 0]                      # palma degenerada
+    esperado = np.stack([_mano_por_frame(f) for f in arr])
+    np.testing.assert_allclose(normalizar_manos(arr), esperado, atol=1e-5)
+    # frame entero en un punto: solo se centra, sin NaN
+    assert np.all(normalizar_manos(np.ones((2, 21, 3), dtype=np.float32)) == 0)
+
+
+def test_pocos_puntos_se_devuelven_igual():
+    arr = _aleatorio(2, 10, 3)
+    assert normalizar_manos(arr) is arr and normalizar_poses(arr) is arr
+
+
+def test_normalizar_lista_agrupa_por_tamanio_y_conserva_el_orden():
+    frames = [_aleatorio(1, 468, 1)[0], _aleatorio(1, 478, 2)[0], _aleatorio(1, 468, 3)[0]]
+    salida = normalizar_lista(frames, "face")
+    assert [len(f) for f in salida] == [468, 478, 468]
+    for f, pts in zip(frames, salida):
+        np.testing.assert_allclose(a_array(pts), _cara_por_frame(f), atol=1e-5)
+
+
+def test_normalizar_lista_subconjunto_desalineado():
+    frames = [_aleatorio(1, 120, 1)[0]]
+    assert len(normalizar_lista(frames, "face", puntos=[0, 5, 119])[0]) == 3
+    with pytest.raises(ValueError):
+        normalizar_lista(frames, "face", puntos=[0, 300])
+
+
+def test_a_dicts_ida_y_vuelta():
+    arr = _aleatorio(2, 4, 5)
+    assert np.array_equal(np.stack([a_array(f) for f in a_dicts(arr)]), arr)
@@ -0,0 +1,43 @@
+# backend/tests/test_similitud.py
+import numpy as np
+import pytest
+
+from procesamiento.similitud import dtw_lote
+
+
+def _dtw_ingenuo(q, c, banda):
+    """DTW de referencia, celda a celda, con la misma banda que dtw_lote."""
+    n, m = len(q), len(c)
+    radio = max(1, int(round(banda * max(n, m))), abs(n - m))
+    D = np.full((n + 1, m + 1), np.inf)
+    D[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if abs(i - j) > radio:
+                continue
+            costo = float(np.linalg.norm(q[i - 1].astype(np.float64) - c[j - 1].astype(np.float64)))
+            D[i, j] = costo + min(D[i - 1, j], D[i, j - 1], D[i - 1, j - 1])
+    return D[n, m] / (n + m)
+
+
+@pytest.mark.parametrize("n,m,banda", [(12, 12, 0.15), (10, 17, 0.15), (17, 10, 0.1), (8, 8, 0.0), (5, 9, 0.5)])
+def test_dtw_lote_coincide_con_el_ingenuo(n, m, banda):
+    rng = np.random.default_rng(n * 100 + m)
+    q = rng.normal(size=(n, 6)).astype(np.float32)
+    C = rng.normal(size=(4, m, 6)).astype(np.float32)
+    esperado = [_dtw_ingenuo(q, c, banda) for c in C]
+    np.testing.assert_allclose(dtw_lote(q, C, banda), esperado, rtol=1e-4, atol=1e-5)
+
+
+def test_dtw_lote_banda_minima_alcanza_la_esquina():
+    # Con N != M la banda se ensancha hasta |N - M|: siempre hay camino a (N, M)
+    q = np.zeros((4, 3), dtype=np.float32)
+    C = np.zeros((1, 11, 3), dtype=np.float32)
+    d = dtw_lote(q, C, banda=0.0)
+    assert np.isfinite(d).all() and d[0] == pytest.approx(0.0)
+
+
+def test_dtw_lote_identica_es_cero_y_lote_vacio():
+    q = np.random.default_rng(1).normal(size=(9, 4)).astype(np.float16)
+    assert dtw_lote(q, q[None])[0] == pytest.approx(0.0, abs=1e-3)
+    assert dtw_lote(q, np.zeros((0, 9, 4), dtype=np.float16)).shape == (0,)
@@ -0,0 +1,46 @@
+# backend/tests/test_spool.py
+import json
+import struct
+import zlib
+
+from bd.spool import leer_segmento, _registro
+
+
+def _escribir(ruta, *registros):
+    with open(ruta, "wb") as fh:
+        for r in registros:
+            fh.write(r)
+
+
+def test_lee_todos_los_registros(tmp_path):
+    ruta = tmp_path / "seg-1-1-1.listo"
+    _escribir(ruta, _registro([[1, 0, [{"x": 1}]]]), _registro([[1, 1, []], [2, 0, []]]))
+    filas, ok, rota = leer_segmento(str(ruta))
+    assert [f[:2] for f in filas] == [[1, 0], [1, 1], [2, 0]] and ok == 2 and not rota
+
+
+def test_cola_rota_corta_la_lectura(tmp_path):
+    ruta = tmp_path / "seg-1-1-1.listo"
+    bueno = _registro([[1, 0, []]])
+    _escribir(ruta, bueno, _registro([[1, 1, []]])[:-3])           # datos incompletos
+    filas, ok, rota = leer_segmento(str(ruta))
+    assert [f[:2] for f in filas] == [[1, 0]] and ok == 1 and rota
+    _escribir(ruta, bueno, bueno[:5])                                # cabecera incompleta
+    assert leer_segmento(str(ruta))[1:] == (1, True)
+
+
+def test_crc_invalido_corta_la_lectura(tmp_path):
+    ruta = tmp_path / "seg-1-1-1.listo"
+    datos = json.dumps([[9, 9, []]]).encode("utf-8")
+    malo = struct.pack("<2sII", b"SF", len(datos), (zlib.crc32(datos) + 1) & 0xFFFFFFFF) + datos
+    _escribir(ruta, _registro([[1, 0, []]]), malo, _registro([[2, 0, []]]))
+    filas, ok, rota = leer_segmento(str(ruta))
+    assert [f[:2] for f in filas] == [[1, 0]] and ok == 1 and rota
+
+
+def test_magic_invalido_y_segmento_vacio(tmp_path):
+    ruta = tmp_path / "seg-1-1-1.listo"
+    _escribir(ruta, b"XX" + _registro([[1, 0, []]])[2:])
+    assert leer_segmento(str(ruta)) == ([], 0, True)
+    _escribir(ruta)
+    assert leer_segmento(str(ruta)) == ([], 0, False)
@@ -0,0 +1,171 @@
+# backend/web/admision.py
+"""
+Control de admisión para las rutas pesadas del worker.
+
+Cada ruta pesada pertenece a una clase (video, lote, exportar, metricas,
+stream, similares) con su límite de peticiones simultáneas y una cola de
+espera acotada:
+
+    @bp.route("/subir_video", methods=["POST"])
+    @admitir("video")
+    def subir_video(): ...
+
+- Con hueco libre la petición entra; si no, espera en la cola hasta ESPERA_S.
+- Cola llena -> 429; espera agotada -> 503. Ambas con Retry-After estimado a
+  partir de la duración media de la clase.
+- La ingesta en vivo (guardar_frame, crear_secuencia, WebSocket) no pasa por
+  aquí. Para protegerla, entre todas las clases pesadas nunca se ocupan más de
+  ADMISION_HILOS - ADMISION_RESERVA_VIVO hilos del worker (gthread, --threads).
+  Una petición en cola también ocupa su hilo mientras espera, así que cuentan
+  las admitidas más las encoladas: si ya suman ese tope, 429 aunque la cola de
+  la clase tenga sitio.
+- Si la respuesta es un stream, el hueco se libera al cerrarse la respuesta,
+  no al volver de la vista.
+
+Límites por clase con ADMISION_<CLASE>_MAX / _COLA / _ESPERA_S.
+"""
+from __future__ import annotations
+
+import functools
+import math
+import os
+import threading
+import time
+
+from flask import jsonify, make_response
+
+HILOS = int(os.environ.get("ADMISION_HILOS") or os.environ.get("GUNICORN_THREADS") or 8)
+RESERVA_VIVO = int(os.environ.get("ADMISION_RESERVA_VIVO", "2") or 2)
+MAX_PESADOS = max(1, HILOS - RESERVA_VIVO)
+
+# clase: (máx. simultáneas, tamaño de cola, espera máx. en cola en s)
+_POR_DEFECTO = {
+    "video":     (2, 4, 30.0),
+    "lote":      (1, 0, 0.0),
+    "exportar":  (2, 4, 10.0),
+    "metricas":  (4, 8, 5.0),
+    "stream":    (4, 4, 5.0),
+    "similares": (4, 8, 5.0),
+}
+
+
+def _env(clase: str, campo: str, defecto):
+    valor = os.environ.get(f"ADMISION_{clase.upper()}_{campo}")
+    try:
+        return type(defecto)(valor) if valor not in (None, "") else defecto
+    except ValueError:
+        return defecto
+
+
+class Rechazo(Exception):
+    def __init__(self, status: int, mensaje: str, reintentar_s: int):
+        super().__init__(mensaje)
+        self.status, self.mensaje, self.reintentar_s = status, mensaje, reintentar_s
+
+
+class _Clase:
+    def __init__(self, nombre, maximo, cola, espera_s):
+        self.nombre, self.maximo, self.cola, self.espera_s = nombre, max(1, maximo), max(0, cola), espera_s
+        self.activos = 0
+        self.esperando = 0
+        self.duracion_media_s = 1.0
+        self.stats = {"admitidas": 0, "encoladas": 0, "rechazadas_429": 0, "rechazadas_503": 0}
+
+
+class ControlAdmision:
+    def __init__(self, max_pesados: int = MAX_PESADOS):
+        self.max_pesados = max_pesados
+        self._cond = threading.Condition()
+        self._pesados = 0
+        self._esperando = 0   # encoladas de todas las clases (cada una retiene un hilo)
+        self._clases = {n: _Clase(n, _env(n, "MAX", m), _env(n, "COLA", c), _env(n, "ESPERA_S", e))
+                        for n, (m, c, e) in _POR_DEFECTO.items()}
+
+    def _hay_hueco(self, c: _Clase) -> bool:
+        return c.activos < c.maximo and self._pesados < self.max_pesados
+
+    def _reintentar_s(self, c: _Clase) -> int:
+        # Tiempo aproximado hasta que se vacíe lo que hay delante
+        return max(1, math.ceil(c.duracion_media_s * (c.esperando + 1) / c.maximo))
+
+    def entrar(self, clase: str) -> float:
+        """Ocupa un hueco de la clase o lanza Rechazo. Devuelve el instante de entrada."""
+        c = self._clases[clase]
+        with self._cond:
+            if not self._hay_hueco(c):
+                if c.esperando >= c.cola or self._pesados + self._esperando >= self.max_pesados:
+                    c.stats["rechazadas_429"] += 1
+                    raise Rechazo(429, f"Demasiadas peticiones de {clase} en curso", self._reintentar_s(c))
+                c.esperando += 1
+                self._esperando += 1
+                c.stats["encoladas"] += 1
+                limite = time.monotonic() + c.espera_s
+                try:
+                    while not self._hay_hueco(c):
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            c.stats["rechazadas_503"] += 1
+                            raise Rechazo(503, f"Servidor ocupado ({clase}); reintenta más tarde",
+                                          self._reintentar_s(c))
+                        self._cond.wait(restante)
+                finally:
+                    c.esperando -= 1
+                    self._esperando -= 1
+            c.activos += 1
+            self._pesados += 1
+            c.stats["admitidas"] += 1
+        return time.monotonic()
+
+    def salir(self, clase: str, desde: float):
+        c = self._clases[clase]
+        with self._cond:
+            c.activos -= 1
+            self._pesados -= 1
+            # media móvil exponencial de la duración (para Retry-After)
+            c.duracion_media_s = 0.8 * c.duracion_media_s + 0.2 * (time.monotonic() - desde)
+            self._cond.notify_all()
+
+    def estadisticas(self) -> dict:
+        with self._cond:
+            return {
+                "max_pesados": self.max_pesados,
+                "pesados": self._pesados,
+                "esperando": self._esperando,
+                "clases": {n: {**c.stats, "activos": c.activos, "esperando": c.esperando,
+                               "max": c.maximo, "cola": c.cola,
+                               "duracion_media_s": round(c.duracion_media_s, 2)}
+                           for n, c in self._clases.items()},
+            }
+
+
+control = ControlAdmision()
+
+
+def respuesta_rechazo(r: Rechazo):
+    resp = jsonify({"ok": False, "error": r.mensaje, "reintentar_en_s": r.reintentar_s})
+    resp.status_code = r.status
+    resp.headers["Retry-After"] = str(r.reintentar_s)
+    return resp
+
+
+def admitir(clase: str):
+    """Decorador de vista: aplica el control de admisión de `clase`."""
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            try:
+                desde = control.entrar(clase)
+            except Rechazo as r:
+                return respuesta_rechazo(r)
+            try:
+                resp = make_response(vista(*args, **kwargs))
+            except BaseException:
+                control.salir(clase, desde)
+                raise
+            if resp.is_streamed:
+                resp.call_on_close(lambda: control.salir(clase, desde))
+            else:
+                control.salir(clase, desde)
+            return resp
+        return envoltura
+    return decorador
@@ -0,0 +1,42 @@
+# backend/web/cache_http.py
+"""
+GET condicional para datos de secuencias.
+
+El ETag se deriva de (secuencia_id, version, ruta+query), de modo que cada
+página / límite tiene su propio validador y todos caducan juntos cuando la
+secuencia cambia de versión.
+"""
+import os
+import zlib
+
+from flask import request, make_response
+
+# max-age en segundos para el navegador. 0 => siempre revalidar (304 barato).
+# Siempre `private`: la app usa cookies de sesión, así que una caché compartida
+# (proxy, CDN) no debe guardar estas respuestas.
+CACHE_MAX_AGE = int(os.environ.get("CACHE_SECUENCIAS_MAX_AGE", "0") or 0)
+
+
+def etag_secuencia(secuencia_id: int, version) -> str:
+    """ETag fuerte (sin comillas; werkzeug las añade) para la petición actual."""
+    variante = zlib.crc32(request.full_path.encode("utf-8")) & 0xFFFFFFFF
+    return f"s{secuencia_id}-v{version}-{variante:08x}"
+
+
+def no_modificado(etag: str) -> bool:
+    """True si el cliente ya tiene esta representación (If-None-Match)."""
+    return request.if_none_match.contains(etag)
+
+
+def respuesta_304(etag: str):
+    resp = make_response("", 304)
+    return aplicar_cache(resp, etag)
+
+
+def aplicar_cache(resp, etag: str):
+    """Añade ETag y Cache-Control a una respuesta 200/304."""
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = (f"private, max-age={CACHE_MAX_AGE}, must-revalidate" if CACHE_MAX_AGE
+                                     else "private, no-cache")
+    resp.vary.add("Cookie")
+    return resp
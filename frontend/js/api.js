@@ -79,6 +79,10 @@ export async function crearSecuencia({
 /**
  * Guardar frame. Si NO envías secuencia_id, el backend creará la secuencia
  * implícitamente usando nombre/tipo/valor y/o categoria_slug/subcategoria.
+ * Idempotente por (secuencia_id, frame): reintentar con el mismo número de frame
+ * no duplica filas, así que es seguro reenviar tras un error de red o un 5xx.
+ * `duplicado: true` solo se garantiza en la vía síncrona; con el buffer
+ * write-behind (202) puede ser `null` (desconocido) aunque el frame ya exista.
  * @param {Object} params
  * @param {number} [params.secuencia_id]
  * @param {number} params.frame
@@ -89,12 +93,14 @@ export async function crearSecuencia({
  * @param {string} [params.categoria_slug]
  * @param {string} [params.subcategoria]
  * @param {number} [params.usuario_id]
+ * @param {"ignorar"|"reemplazar"} [params.si_existe] qué hacer si el frame ya existe
  * @returns {Promise<{ok:boolean,status:number,data:any,raw:string}>}
  */
 export async function guardarFrame({
-    secuencia_id, frame, landmarks, nombre, tipo, valor, categoria_slug, subcategoria, usuario_id,
+    secuencia_id, frame, landmarks, nombre, tipo, valor, categoria_slug, subcategoria, usuario_id, si_existe,
 }) {
     const body = { secuencia_id, frame, landmarks };
+    if (si_existe) body.si_existe = si_existe;
 
     // Si no hay secuencia_id, permitir creación implícita
     if (!secuencia_id) {
@@ -121,6 +127,71 @@ export async function guardarFrame({
     return { ok: r.ok && data?.ok, status: r.status, data, raw };
 }
 
+/**
+ * Canal WebSocket de captura (una sesión por secuencia). Los frames se envían con
+ * número de secuencia y el servidor los guarda en lote y confirma con acks
+ * acumulativos. Los no confirmados se conservan (hasta `ventana`) para reenviarlos
+ * por HTTP si el canal se cierra.
+ * @param {number} secuencia_id
+ * @param {Object} [opts]
+ * @param {number} [opts.ventana=600] máx. frames sin ack retenidos
+ * @returns {Promise<{enviar:(frame:number, landmarks:any)=>boolean, cerrar:()=>Promise<Array>, abierto:()=>boolean, pendientes:()=>number}>}
+ */
+export function abrirCanalCaptura(secuencia_id, { ventana = 600 } = {}) {
+    const wsUrl = BACKEND_URL.replace(/^http/, "ws") + `/api/ws/captura?secuencia_id=${encodeURIComponent(secuencia_id)}`;
+    return new Promise((resolve, reject) => {
+        let ws;
+        try { ws = new WebSocket(wsUrl); } catch (e) { reject(e); return; }
+
+        let seq = 0;
+        const sinAck = new Map(); // seq -> {frame, landmarks}
+        let listo = false;
+        let onCerrado = null;
+
+        const canal = {
+            abierto: () => listo && ws.readyState === WebSocket.OPEN,
+            pendientes: () => sinAck.size,
+            enviar(frame, landmarks) {
+                if (!canal.abierto() || sinAck.size >= ventana) return false;
+                const s = seq++;
+                sinAck.set(s, { frame, landmarks });
+                ws.send(JSON.stringify({ tipo: "frame", seq: s, frame, landmarks }));
+                return true;
+            },
+            /** Cierra el canal y devuelve los frames que quedaron sin confirmar. */
+            cerrar() {
+                return new Promise((res) => {
+                    const fin = () => res([...sinAck.values()]);
+                    if (ws.readyState !== WebSocket.OPEN) { fin(); return; }
+                    onCerrado = fin;
+                    ws.send(JSON.stringify({ tipo: "fin" }));
+                    setTimeout(() => { try { ws.close(); } catch { } }, 3000);
+                });
+            },
+        };
+
+        ws.onmessage = (ev) => {
+            let msg;
+            try { msg = JSON.parse(ev.data); } catch { return; }
+            if (msg.tipo === "listo") { listo = true; resolve(canal); }
+            else if (msg.tipo === "ack") {
+                for (const k of sinAck.keys()) if (k <= msg.hasta) sinAck.delete(k);
+            } else if (msg.tipo === "rechazado") {
+                sinAck.delete(msg.seq);
+                console.warn("frame rechazado", msg);
+            } else if (msg.tipo === "error") {
+                console.warn("canal de captura:", msg.error);
+                if (!listo) reject(new Error(msg.error));
+            }
+        };
+        ws.onerror = () => { if (!listo) reject(new Error("WebSocket no disponible")); };
+        ws.onclose = () => {
+            listo = false;
+            if (onCerrado) onCerrado();
+        };
+    });
+}
+
 /**
  * Listado del historial con filtros (incluye categoría/subcategoría).
  */
@@ -144,15 +215,64 @@ export async function historialListado({
     return r.json();
 }
 
-/** Detalle de una secuencia con frames. */
+/** Detalle de una secuencia con frames (revalida con ETag: 304 si no cambió). */
 export async function historialDetalle(secuencia_id) {
     const r = await fetch(`${BACKEND_URL}/api/historial/${secuencia_id}`, {
         credentials: "include",
-        cache: "no-store",
+        cache: "no-cache",
     });
     return r.json();
 }
 
+/**
+ * Reproduce una secuencia en streaming (NDJSON): llama a onFrame en cuanto llega
+ * cada frame, sin esperar a la secuencia completa.
+ * @param {number} secuencia_id
+ * @param {(frame:{num_frame:number,t_s:number,landmarks:any}) => void} onFrame
+ * @param {Object} [opts]
+ * @param {number} [opts.desde_frame]
+ * @param {number} [opts.desde_t]      // segundos (meta.t_s)
+ * @param {boolean} [opts.tiempo_real] // el servidor respeta el ritmo original
+ * @param {AbortSignal} [opts.signal]
+ * @returns {Promise<number>} frames recibidos
+ */
+export async function streamSecuencia(secuencia_id, onFrame, {
+    desde_frame, desde_t, tiempo_real = false, signal,
+} = {}) {
+    const q = new URLSearchParams({ formato: "ndjson" });
+    if (desde_frame != null) q.set("desde_frame", String(desde_frame));
+    if (desde_t != null) q.set("desde_t", String(desde_t));
+    if (tiempo_real) q.set("tiempo_real", "1");
+
+    const r = await fetch(`${BACKEND_URL}/api/secuencias/${secuencia_id}/stream?${q.toString()}`, {
+        credentials: "include",
+        cache: "no-store",
+        signal,
+    });
+    if (!r.ok || !r.body) throw new Error(`stream ${r.status}`);
+
+    const reader = r.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buf = "";
+    let n = 0;
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += value;
+        let nl;
+        while ((nl = buf.indexOf("\n")) >= 0) {
+            const line = buf.slice(0, nl).trim();
+            buf = buf.slice(nl + 1);
+            if (!line) continue;
+            const msg = JSON.parse(line);
+            if (msg.error) throw new Error(msg.error);
+            if (msg.fin) return n;
+            onFrame(msg);
+            n++;
+        }
+    }
+    return n;
+}
+
 /**
  * Construir URL de exportación (CSV o JSON) con filtros, incl. categoría.
  */
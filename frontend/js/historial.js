@@ -23,6 +23,8 @@ let tamanio = 10;
 let debounceTimer = null;
 let filtroInicialAplicado = false;
 let _categoriasCache = null;
+let cambiosToken = null;      // token del feed /api/cambios
+const CAMBIOS_POLL_MS = 10000;
 
 // ===== Utils =====
 function toLocal(dt) {
@@ -216,11 +218,12 @@ async function cargarHistorial() {
                 : "";
 
             const tr = document.createElement("tr");
+            tr.dataset.id = String(item.id);
             tr.innerHTML = `
         <td>${toLocal(item.fecha)}</td>
         <td>${item.nombre ?? "-"} ${catBadge}</td>
         <td>${item.usuario ?? "-"}</td>
-        <td>${item.frames}</td>
+        <td class="col-frames">${item.frames}</td>
         <td class="text-end">
           <div class="btn-group">
             <button class="btn btn-sm btn-outline-info btn-ver" data-id="${item.id}" title="Ver detalle" data-bs-toggle="tooltip">
@@ -259,51 +262,115 @@ async function cargarHistorial() {
     }
 }
 
+// ===== Feed de cambios (parcheo incremental) =====
+// Solo se piden las secuencias que cambiaron desde el último token: si alguna
+// está en la página visible se actualiza su contador de frames; si hay altas
+// y estamos en la primera página se recarga el listado.
+async function sincronizarCambios() {
+    if (document.hidden) return;
+    try {
+        const q = cambiosToken !== null ? `?desde=${encodeURIComponent(cambiosToken)}` : "";
+        const data = await fetchJSON(`${BACKEND_BASE}/api/cambios${q}`);
+        const primera = cambiosToken === null;
+        cambiosToken = data.token;
+        if (primera) return;
+
+        let altas = 0;
+        for (const c of data.cambios || []) {
+            const tr = document.querySelector(`#historialBody tr[data-id="${c.id}"]`);
+            if (!tr) { altas++; continue; }
+            const td = tr.querySelector(".col-frames");
+            if (td) td.textContent = c.frames;
+            if (c.cambio === "actualizada") altas++; // nombre/categoría: repintar
+        }
+        if (altas > 0 && pagina === 1) cargarHistorial();
+        if (data.mas) setTimeout(sincronizarCambios, 0);
+    } catch (e) {
+        console.warn("Feed de cambios:", e);
+    }
+}
+
 // ===== Detalle =====
+let detalleAbort = null;      // stream de frames del detalle abierto
+
+function filaFrame(fr) {
+    const count = Array.isArray(fr.landmarks)
+        ? fr.landmarks.length
+        : (fr.landmarks?.length ?? 0);
+    const tr = document.createElement("tr");
+    tr.innerHTML = `<td>${fr.num_frame}</td><td>${count} puntos</td>`;
+    return tr;
+}
+
 async function verDetalle(id, nombre, fecha, framesTotal, usuario) {
     const detalleBody = document.getElementById("detalleBody");
     const detalleInfo = document.getElementById("detalleInfo");
     const detalleMeta = document.getElementById("detalleMeta");
+    const modalEl = document.getElementById("modalDetalle");
 
     detalleBody.innerHTML = `<tr><td colspan="2" class="text-center text-muted py-3">Cargando...</td></tr>`;
     detalleInfo.textContent = "";
-    detalleMeta.textContent = `Secuencia #${id} • Etiqueta: ${nombre || "-"} • Usuario: ${usuario || "-"} • Fecha: ${toLocal(fecha)} • Frames: ${framesTotal}`;
-
-    try {
-        const data = await fetchJSON(`${BACKEND_BASE}/api/historial/${id}?pagina=1&tamanio=200`);
-
-        const catSlug = data?.secuencia?.categoria?.slug || "";
-        const catNom = data?.secuencia?.categoria?.nombre || "";
-        const sub = data?.secuencia?.categoria?.subcategoria || "";
-        if (catSlug || sub) {
-            const base = `Secuencia #${id} • Etiqueta: ${nombre || "-"} • Usuario: ${usuario || "-"} • Fecha: ${toLocal(fecha)} • Frames: ${framesTotal}`;
-            const catTxt = ` • Categoría: ${catNom || catSlug}${sub ? ` • Subcategoría: ${sub}` : ""}`;
-            detalleMeta.textContent = base + catTxt;
+    const base = `Secuencia #${id} • Etiqueta: ${nombre || "-"} • Usuario: ${usuario || "-"} • Fecha: ${toLocal(fecha)} • Frames: ${framesTotal}`;
+    detalleMeta.textContent = base;
+
+    // Un solo stream a la vez; se corta al cerrar el modal
+    if (detalleAbort) detalleAbort.abort();
+    const abort = detalleAbort = new AbortController();
+    modalEl.addEventListener("hidden.bs.modal", () => abort.abort(), { once: true });
+    bootstrap.Modal.getOrCreateInstance(modalEl).show();
+
+    // Categoría: una página mínima del detalle (revalida con ETag -> 304), en paralelo al stream
+    fetchJSON(`${BACKEND_BASE}/api/historial/${id}?pagina=1&tamanio=1`, { cache: "no-cache", signal: abort.signal })
+        .then((data) => {
+            const catSlug = data?.secuencia?.categoria?.slug || "";
+            const catNom = data?.secuencia?.categoria?.nombre || "";
+            const sub = data?.secuencia?.categoria?.subcategoria || "";
+            if (catSlug || sub) {
+                detalleMeta.textContent = base + ` • Categoría: ${catNom || catSlug}${sub ? ` • Subcategoría: ${sub}` : ""}`;
+            }
+        })
+        .catch(() => {});
+
+    // Frames por streaming (NDJSON): se pintan según llegan, sin esperar a la secuencia completa
+    let pendientes = [];
+    let programado = false;
+    const pintar = () => {
+        programado = false;
+        if (abort.signal.aborted || pendientes.length === 0) return;
+        if (detalleBody.dataset.secuencia !== String(id)) {
+            detalleBody.innerHTML = "";
+            detalleBody.dataset.secuencia = String(id);
         }
+        const frag = document.createDocumentFragment();
+        pendientes.forEach((fr) => frag.appendChild(filaFrame(fr)));
+        pendientes = [];
+        detalleBody.appendChild(frag);
+        detalleInfo.textContent = `Recibidos ${detalleBody.rows.length} de ${framesTotal} frames...`;
+    };
+    delete detalleBody.dataset.secuencia;
 
-        const rows = data.secuencia?.frames || [];
-        if (rows.length === 0) {
+    try {
+        const { streamSecuencia } = await import("./api.js");
+        const n = await streamSecuencia(id, (fr) => {
+            pendientes.push(fr);
+            if (!programado) {
+                programado = true;
+                requestAnimationFrame(pintar);
+            }
+        }, { signal: abort.signal });
+        pintar();
+        if (abort.signal.aborted) return;
+        if (n === 0) {
             detalleBody.innerHTML = `<tr><td colspan="2" class="text-center text-muted py-3">Sin frames</td></tr>`;
         } else {
-            detalleBody.innerHTML = "";
-            rows.forEach((fr) => {
-                const count = Array.isArray(fr.landmarks)
-                    ? fr.landmarks.length
-                    : (fr.landmarks?.length ?? 0);
-                const tr = document.createElement("tr");
-                tr.innerHTML = `<td>${fr.num_frame}</td><td>${count} puntos</td>`;
-                detalleBody.appendChild(tr);
-            });
-            detalleInfo.textContent = `Mostrando ${rows.length} de ${data.secuencia.total_frames} frames.`;
+            detalleInfo.textContent = `Mostrando ${n} de ${framesTotal} frames.`;
         }
     } catch (e) {
+        if (abort.signal.aborted) return;
         detalleBody.innerHTML = `<tr><td colspan="2" class="text-center text-danger py-3">Error cargando detalle</td></tr>`;
         console.error("Error detalle secuencia:", e);
         showToast("Error cargando detalle de la secuencia", "danger", 4000);
     }
-
-    const modal = new bootstrap.Modal(document.getElementById("modalDetalle"));
-    modal.show();
 }
 
 // ===== Edición =====
@@ -410,7 +477,8 @@ function initHistorial() {
 
     poblarCategoriasFiltro().finally(() => {
         tamanio = parseInt(document.getElementById("fTam")?.value || "10", 10);
-        cargarHistorial();
+        sincronizarCambios().finally(cargarHistorial);
+        setInterval(sincronizarCambios, CAMBIOS_POLL_MS);
     });
 }
 
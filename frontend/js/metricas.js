@@ -134,6 +134,25 @@ const BACKEND = LS_OVERRIDE || GLOBAL_OVERRIDE || computeDefaultBackend();
         }
     }
 
+    // ------------- FEED DE CAMBIOS -------------
+    // El auto-refresh consulta /api/cambios (barato) y solo recarga el overview
+    // completo si hubo secuencias nuevas/actualizadas desde el último token.
+    let cambiosToken = null;
+
+    async function hayCambios() {
+        try {
+            const q = cambiosToken !== null ? `?desde=${encodeURIComponent(cambiosToken)}` : "";
+            const r = await fetch(`${BACKEND}/api/cambios${q}`, { credentials: "include", cache: "no-store" });
+            const j = await r.json();
+            if (!j.ok) return true;
+            const primera = cambiosToken === null;
+            cambiosToken = j.token;
+            return primera || (j.cambios || []).length > 0;
+        } catch {
+            return true; // ante la duda, recargar
+        }
+    }
+
     // ------------- AUTO REFRESH -------------
     function clearAutoTimer() {
         if (autoTimer) { clearInterval(autoTimer); autoTimer = null; }
@@ -142,7 +161,10 @@ const BACKEND = LS_OVERRIDE || GLOBAL_OVERRIDE || computeDefaultBackend();
     function scheduleAuto() {
         clearAutoTimer();
         const sec = Math.max(3, parseInt(autoSec?.value || "10", 10));
-        autoTimer = setInterval(() => { cargar().catch(e => console.warn("Auto-refresh error:", e)); }, sec * 1000);
+        autoTimer = setInterval(async () => {
+            if (!(await hayCambios())) return;
+            cargar().catch(e => console.warn("Auto-refresh error:", e));
+        }, sec * 1000);
     }
 
     function setAutoRefresh(enabled) {
@@ -171,8 +193,8 @@ const BACKEND = LS_OVERRIDE || GLOBAL_OVERRIDE || computeDefaultBackend();
     if (el("fHasta")) el("fHasta").valueAsDate = hoy;
     if (el("fDesde")) el("fDesde").valueAsDate = d14;
 
-    // Primera carga
-    cargar().catch(e => alert(e.message));
+    // Primera carga (toma el token del feed antes, para no perder cambios intermedios)
+    hayCambios().finally(() => cargar().catch(e => alert(e.message)));
 
     // (Opcional) activar auto al abrir:
     // setAutoRefresh(true);
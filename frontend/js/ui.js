@@ -3,7 +3,7 @@
 // UI principal para captura LSE con optimizaciones de rendimiento
 // Mantiene TODAS las funcionalidades, rutas y atajos existentes
 // ---------------------------------------------------------
-import { crearSecuencia, guardarFrame, exportarUrl, logout } from "./api.js";
+import { crearSecuencia, guardarFrame, abrirCanalCaptura, exportarUrl, logout } from "./api.js";
 import { mostrarAlertaBootstrap, showToast, inferirTipoValor, setEstado } from "./utils.js";
 
 document.addEventListener("DOMContentLoaded", () => {
@@ -62,6 +62,9 @@ document.addEventListener("DOMContentLoaded", () => {
     let capturing = false;
     let frameCounter = 0;
     let inflight = 0;       // peticiones guardar_frame en curso
+    const MAX_INFLIGHT = 4; // guardar_frame es idempotente por (secuencia, frame): se puede solapar
+    const REINTENTOS_FRAME = 3;
+    let canal = null;       // canal WebSocket de captura (si el backend lo ofrece)
     let inFlightMP = false; // inferencia mpHands en curso
 
     // Procesamiento a baja resolución para MediaPipe (mejor FPS)
@@ -471,10 +474,10 @@ document.addEventListener("DOMContentLoaded", () => {
             drawHandLandmarks(list[0]);
         }
 
-        // Envío al backend (throttle)
+        // Envío al backend (throttle solo por HTTP; con WebSocket va a tasa completa)
         if (!capturing) return;
         const now = performance.now();
-        if (now - lastSentMs < MIN_INTERVAL_MS) return;
+        if (!canal?.abierto() && now - lastSentMs < MIN_INTERVAL_MS) return;
 
         const pts = (list[0] || []).map((p) => ({
             x: Math.round(p.x * 1000) / 1000,
@@ -573,21 +576,57 @@ document.addEventListener("DOMContentLoaded", () => {
         }
 
         secuenciaId = data.secuencia_id;
+        frameCounter = 0; // la numeración solo se reinicia con una secuencia nueva
         return secuenciaId;
     }
 
+    async function abrirCanal() {
+        if (canal?.abierto()) return;
+        try {
+            canal = await abrirCanalCaptura(secuenciaId);
+        } catch (e) {
+            canal = null; // sin WebSocket: se usa POST /api/guardar_frame
+            console.info("Canal WebSocket no disponible, usando HTTP:", e?.message || e);
+        }
+    }
+
+    async function cerrarCanal() {
+        if (!canal) return;
+        const c = canal;
+        canal = null;
+        const restos = await c.cerrar();
+        // Lo que no llegó a confirmarse se reenvía por HTTP
+        for (const f of restos) {
+            try { await guardarFrame({ secuencia_id: secuenciaId, frame: f.frame, landmarks: f.landmarks }); }
+            catch (e) { console.error("guardar_frame (reenvío)", e); }
+        }
+    }
+
     async function sendFrame(pts) {
-        if (!secuenciaId || inflight >= 1) return; // 1 vuelo concurrente máximo
+        if (!secuenciaId) return;
+        if (canal?.abierto()) {
+            if (canal.enviar(frameCounter, pts)) frameCounter++;
+            return;
+        }
+        if (inflight >= MAX_INFLIGHT) return;
+        const sid = secuenciaId;
+        const n = frameCounter++; // número fijo: los reintentos reutilizan la misma clave
         inflight++;
         try {
-            await guardarFrame({
-                secuencia_id: secuenciaId,
-                frame: frameCounter,
-                landmarks: pts,
-            });
-            frameCounter++;
-        } catch (e) {
-            console.error("guardar_frame", e);
+            for (let intento = 0; ; intento++) {
+                let status = 0;
+                try {
+                    ({ status } = await guardarFrame({ secuencia_id: sid, frame: n, landmarks: pts }));
+                } catch (e) {
+                    status = 0; // error de red
+                }
+                const reintentable = status === 0 || status >= 500;
+                if (!reintentable || intento >= REINTENTOS_FRAME) {
+                    if (status < 200 || status >= 300) console.error("guardar_frame", n, status);
+                    break;
+                }
+                await new Promise((res) => setTimeout(res, 250 * 2 ** intento));
+            }
         } finally {
             inflight--;
         }
@@ -661,7 +700,7 @@ document.addEventListener("DOMContentLoaded", () => {
         await ensureSecuencia();
         initMP();
         await Cam.start(Cam.facing);
-        frameCounter = 0;
+        await abrirCanal();
         lastSentMs = 0;
         capturing = true;
         startLoop();
@@ -675,6 +714,7 @@ document.addEventListener("DOMContentLoaded", () => {
         capturing = false;
         stopLoop();
         Cam.shutdown();
+        cerrarCanal().catch(console.error);
         setEstado("🔴 Detenido", true);
         indicadorGrabando?.classList?.add("d-none");
         mostrarAlertaBootstrap("⛔ Captura detenida", "danger");